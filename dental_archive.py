@@ -0,0 +1,52 @@
+# dental_archive.py
+
+import os
+import threading
+from collections import OrderedDict
+
+# --- Archive Configuration ---
+ARCHIVE_CACHE_YEARS = 4  # Archived years kept in memory once loaded; the least recently used one is dropped first
+
+
+def archive_path_for(csv_path, year):
+    """The file holding one year of a table's archived rows, e.g. dental_appointments_2019.csv."""
+    root, extension = os.path.splitext(csv_path)
+    return f'{root}_{year}{extension}'
+
+
+class ArchiveCache:
+    """Archived year files loaded on demand and kept in memory, least recently used first out.
+
+    Each entry remembers the stamp (size, mtime) of the file it was read from and is read again if the file has
+    changed since, so a year rewritten by another workstation is never served stale. Safe to share between the
+    Tk thread and a report thread.
+    """
+
+    def __init__(self, max_entries=ARCHIVE_CACHE_YEARS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # path -> (file stamp, value)
+        self._lock = threading.Lock()
+        self.loads = 0  # Files read so far, for diagnostics
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, stamp, load):
+        """The value ``load()`` built from ``path``, reused while the file's ``stamp`` is unchanged."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                return entry[1]
+        value = load()
+        with self._lock:
+            self.loads += 1
+            self._entries[path] = (stamp, value)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def discard(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
@@ -0,0 +1,345 @@
+# dental_bench.py
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from dental_core import DentalPractice
+from dental_store import (APPOINTMENTS_FILE, CLINICAL_RECORDS_FILE, JOURNAL_FILE, LOCK_FILE, PATIENTS_FILE,
+                          SEQUENCE_FILE, SQLITE_FILE, USE_BINARY_SNAPSHOTS, CsvStore, SqliteStore,
+                          migrate_csv_to_sqlite)
+from dental_synthetic import DEFAULT_SEED, FUTURE_DAYS, parse_size, write_dataset
+
+# --- Benchmark Configuration ---
+DEFAULT_SIZES = ['1k', '10k', '100k']  # 1M takes minutes per run; ask for it explicitly
+BENCH_DIR = 'bench_data'  # Generated datasets (reused while seed and date match) and scratch copies
+REPEATS = 5  # Timed runs of the whole-table operations (load, save)
+CALLS = 50  # Timed calls of each interactive operation
+PATIENT_PAGE_ROWS = 25  # What the patient list fetches on a refresh: the viewport plus its overscan
+PATIENT_LIST_SORT = 'Name'  # The heading sorted by most often, and the dearest to sort
+
+# --- Regression Thresholds ---
+# An operation regresses when its median is slower than the baseline's by more than REGRESSION_TOLERANCE
+# and by more than REGRESSION_FLOOR_SECONDS, so timer noise on sub-millisecond calls is not reported.
+REGRESSION_TOLERANCE = 0.25
+REGRESSION_FLOOR_SECONDS = 0.002
+# Medians the interactive operations must stay under at every size, with or without a baseline
+INTERACTIVE_BUDGET_SECONDS = {
+    'add_patient': 0.05,
+    'schedule_appointment': 0.05,
+    'search_patient': 0.25,
+    'refresh_patient_list': 0.1,
+    'populate_clinical_tab': 0.05,
+}
+
+
+def summarize(samples):
+    """Timings in seconds -> the statistics kept in the report."""
+    ordered = sorted(samples)
+    return {'runs': len(ordered),
+            'median': round(statistics.median(ordered), 6),
+            'p95': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 6),
+            'min': round(ordered[0], 6),
+            'max': round(ordered[-1], 6)}
+
+
+def _timed(action, *args, **kwargs):
+    started = time.perf_counter()
+    result = action(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+class Benchmark:
+    """Times the app's hot paths on synthetic data folders of increasing size.
+
+    Each size gets a dataset from dental_synthetic (rows per table), generated once into BENCH_DIR and copied to
+    a scratch folder for every run, so the timed edits never touch the generated files. Operations go through
+    ``DentalPractice`` exactly as the app's handlers do; with ``use_tk`` the list refreshes are timed through
+    the real ``DentalPracticeApp`` widgets on a withdrawn Tk root, including Tk's own redraw work.
+    """
+
+    def __init__(self, backend='csv', repeats=REPEATS, calls=CALLS, use_tk=False, seed=DEFAULT_SEED,
+                 anchor=None, bench_dir=BENCH_DIR):
+        self.backend = backend
+        self.repeats = repeats
+        self.calls = calls
+        self.use_tk = use_tk
+        self.seed = seed
+        self.anchor = anchor or datetime.now().strftime('%Y-%m-%d')
+        self.bench_dir = bench_dir
+        self.app = None
+
+    def run(self, sizes):
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'backend': self.backend,
+            'mode': 'tk' if self.use_tk else 'headless',
+            'binary_snapshots': USE_BINARY_SNAPSHOTS,
+            'seed': self.seed,
+            'anchor': self.anchor,
+            'thresholds': {'regression_tolerance': REGRESSION_TOLERANCE,
+                           'regression_floor_seconds': REGRESSION_FLOOR_SECONDS,
+                           'interactive_budget_seconds': INTERACTIVE_BUDGET_SECONDS},
+            'results': {},
+        }
+        if self.use_tk:
+            self._start_tk()
+        try:
+            for size in sizes:
+                rows = parse_size(size)
+                print(f"{size}: {rows} rows per table...", flush=True)
+                report['results'][size] = {'rows': rows, 'operations': self.run_size(rows)}
+        finally:
+            if self.app is not None:
+                self.app.root.destroy()
+        return report
+
+    def run_size(self, rows):
+        work_dir = self._fresh_copy(self._dataset(rows))
+        timings = {}
+
+        samples = []
+        for _ in range(self.repeats):
+            practice = self._open(work_dir)
+            seconds, _ = _timed(practice.load)
+            samples.append(seconds)
+            practice.close()
+        timings['load_data'] = samples
+
+        practice = self._open(work_dir)
+        practice.load()
+        patients = practice.store.all_patients()
+        if self.app is not None:
+            self.app.practice = practice
+            self.app.patients_loaded = True
+            self.app.patient_list.sort_column = PATIENT_LIST_SORT
+
+        # Adding a patient is followed by a patient list refresh in the app, and so it is here
+        timings['add_patient'], timings['refresh_patient_list'] = [], []
+        for call in range(self.calls):
+            seconds, _ = _timed(practice.add_patient, f'Bench Patient {call}', f'555-000-{call:04d}', '')
+            timings['add_patient'].append(seconds)
+            timings['refresh_patient_list'].append(self._refresh_patient_list(practice))
+
+        # Days past the generated bookings, so no booking is refused as a double booking
+        first_day = datetime.strptime(self.anchor, '%Y-%m-%d') + timedelta(days=FUTURE_DAYS + 7)
+        timings['schedule_appointment'] = []
+        for call in range(self.calls):
+            patient_id = int(patients['PatientID'].iloc[(call * 7919) % len(patients)])
+            date = (first_day + timedelta(days=call // 8)).strftime('%Y-%m-%d')
+            seconds, _ = _timed(practice.schedule_appointment, patient_id, date, f'{9 + call % 8:02d}:00', 'Checkup')
+            timings['schedule_appointment'].append(seconds)
+
+        terms = self._search_terms(patients)
+        timings['search_patient'] = [self._search_patient(practice, terms[call % len(terms)])
+                                     for call in range(self.calls)]
+
+        timings['populate_clinical_tab'] = []
+        for call in range(self.calls):
+            patient = patients.iloc[(call * 104729) % len(patients)]
+            timings['populate_clinical_tab'].append(self._populate_clinical_tab(practice, patient))
+
+        # Synchronous here; in the app the same snapshot write runs on the background writer thread
+        timings['save_data'] = [_timed(practice.save)[0] for _ in range(self.repeats)]
+        practice.close()
+        if self.app is not None:
+            self.app.practice = None
+            self.app.patients_loaded = False
+
+        if self.backend == 'csv' and USE_BINARY_SNAPSHOTS:
+            # The saves above left .feather snapshots newer than the CSVs, which is what a restart reads
+            samples = []
+            for _ in range(self.repeats):
+                practice = self._open(work_dir)
+                samples.append(_timed(practice.load)[0])
+                practice.close()
+            timings['load_data_snapshot'] = samples
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return {operation: summarize(samples) for operation, samples in timings.items()}
+
+    # --- Operations as the app performs them ---
+
+    def _refresh_patient_list(self, practice):
+        if self.app is not None:
+            return _timed(self._tk_call, self.app.refresh_patient_list)[0]
+        started = time.perf_counter()
+        practice.patient_count()
+        practice.patients_page(0, PATIENT_PAGE_ROWS, PATIENT_LIST_SORT)
+        return time.perf_counter() - started
+
+    def _search_patient(self, practice, term):
+        if self.app is not None:
+            # Typing debounce aside: the snapshot, the search (on the search worker in the app) and showing the matches
+            return _timed(lambda: self._tk_call(self.app.show_patient_search_results, self.app.search_patients(
+                self.app.patient_search_snapshot(), term, lambda: False)))[0]
+        return _timed(practice.find_patients, term)[0]
+
+    def _populate_clinical_tab(self, practice, patient):
+        if self.app is not None:
+            self.app.selected_patient_id = int(patient['PatientID'])
+            self.app.selected_patient_name = patient['Name']
+            return _timed(self._tk_call, self.app.populate_clinical_tab)[0]
+        return _timed(practice.patient_records, int(patient['PatientID']))[0]
+
+    def _tk_call(self, method, *args, **kwargs):
+        method(*args, **kwargs)
+        self.app.root.update_idletasks()
+
+    @staticmethod
+    def _search_terms(patients):
+        """A mix of what the front desk types: a surname, a name prefix, a misspelling, a phone number, an ID."""
+        sample = patients.iloc[len(patients) // 3]
+        first_name, last_name = str(sample['Name']).split(' ', 1)
+        return [last_name, first_name[:3], last_name[:-2] + last_name[-1] + last_name[-2], str(sample['Phone']),
+                str(sample['PatientID'])]
+
+    # --- Data folders ---
+
+    def _dataset(self, rows):
+        """The generated folder for this size, regenerated only when the seed or the anchor date changed."""
+        directory = os.path.join(self.bench_dir, f'dataset_{rows}')
+        marker_path = os.path.join(directory, 'dataset.json')
+        marker = {'rows': rows, 'seed': self.seed, 'anchor': self.anchor}
+        try:
+            with open(marker_path, encoding='utf-8') as marker_file:
+                if json.load(marker_file) == marker:
+                    return directory
+        except (OSError, ValueError):
+            pass
+        write_dataset(directory, rows, self.seed, self.anchor)
+        with open(marker_path, 'w', encoding='utf-8') as marker_file:
+            json.dump(marker, marker_file)
+        return directory
+
+    def _fresh_copy(self, dataset_dir):
+        work_dir = os.path.join(self.bench_dir, f'run_{self.backend}')
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+        for name in (PATIENTS_FILE, APPOINTMENTS_FILE, CLINICAL_RECORDS_FILE):
+            shutil.copy(os.path.join(dataset_dir, name), work_dir)
+        if self.backend == 'sqlite':
+            # Migrating is part of preparing the folder, not of any timed operation
+            target = SqliteStore(os.path.join(work_dir, SQLITE_FILE))
+            target.connect()
+            migrate_csv_to_sqlite(self._csv_store(work_dir), target)
+            target.close()
+        return work_dir
+
+    def _open(self, work_dir):
+        if self.backend == 'sqlite':
+            store = SqliteStore(os.path.join(work_dir, SQLITE_FILE))
+        else:
+            store = self._csv_store(work_dir)
+        practice = DentalPractice(store)
+        practice.setup()
+        return practice
+
+    @staticmethod
+    def _csv_store(work_dir):
+        return CsvStore(*(os.path.join(work_dir, name) for name in (PATIENTS_FILE, APPOINTMENTS_FILE,
+                                                                    CLINICAL_RECORDS_FILE, JOURNAL_FILE,
+                                                                    SEQUENCE_FILE, LOCK_FILE)))
+
+    def _start_tk(self):
+        import tkinter as tk
+        from dentalapp import DentalPracticeApp
+
+        class BenchApp(DentalPracticeApp):
+            def staged_startup(self):
+                pass  # The benchmark hands the app its practice; nothing is loaded from the working folder
+
+        try:
+            root = tk.Tk()
+        except tk.TclError as error:
+            raise RuntimeError(f"no display for the hidden Tk window ({error})") from None
+        root.withdraw()
+        self.app = BenchApp(root)
+        root.update_idletasks()
+
+
+def check_thresholds(report, baseline=None):
+    """Failures as (size, operation, kind, median, limit): interactive budgets, and regressions against a
+    baseline report for every operation and size both reports have."""
+    failures = []
+    for size, result in report['results'].items():
+        for operation, stats in result['operations'].items():
+            budget = INTERACTIVE_BUDGET_SECONDS.get(operation)
+            if budget is not None and stats['median'] > budget:
+                failures.append((size, operation, 'budget', stats['median'], budget))
+            base = (baseline or {}).get('results', {}).get(size, {}).get('operations', {}).get(operation)
+            if base:
+                limit = max(base['median'] * (1 + REGRESSION_TOLERANCE), base['median'] + REGRESSION_FLOOR_SECONDS)
+                if stats['median'] > limit:
+                    failures.append((size, operation, 'regression', stats['median'], round(limit, 6)))
+    return failures
+
+
+def print_report(report, baseline=None):
+    for size, result in report['results'].items():
+        print(f"\n{size} ({result['rows']} rows per table, {report['backend']}, {report['mode']})")
+        print(f"  {'operation':<24}{'median ms':>11}{'p95 ms':>10}{'max ms':>10}" + ('  vs baseline' if baseline else ''))
+        for operation, stats in result['operations'].items():
+            line = (f"  {operation:<24}{stats['median'] * 1000:>11.2f}{stats['p95'] * 1000:>10.2f}"
+                    f"{stats['max'] * 1000:>10.2f}")
+            base = (baseline or {}).get('results', {}).get(size, {}).get('operations', {}).get(operation)
+            if base and base['median']:
+                line += f"  {stats['median'] / base['median']:>10.2f}x"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading, saving, editing, searching and list "
+                                                 "refreshes on synthetic data folders.")
+    parser.add_argument('sizes', nargs='*', default=DEFAULT_SIZES, help="rows per table (default: 1k 10k 100k)")
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--tk', action='store_true', help="time list refreshes through the app's widgets "
+                                                          "on a hidden Tk window (needs a display)")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="runs of each load and save")
+    parser.add_argument('--calls', type=int, default=CALLS, help="calls of each interactive operation")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--anchor', help="YYYY-MM-DD the generated dates are placed around (default: today)")
+    parser.add_argument('--out', default='bench_report.json', help="where to write the JSON report")
+    parser.add_argument('--baseline', help="a report from an earlier version to check for regressions")
+    args = parser.parse_args()
+
+    baseline_report = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as baseline_file:
+                baseline_report = json.load(baseline_file)
+        except (OSError, ValueError) as error:
+            sys.exit(f"Cannot read the baseline report: {error}")
+    try:
+        for size_name in args.sizes:
+            parse_size(size_name)
+    except ValueError:
+        sys.exit("Sizes must be 1k, 10k, 100k, 1M or numbers.")
+
+    benchmark = Benchmark(args.backend, args.repeats, args.calls, args.tk, args.seed, args.anchor)
+    try:
+        results = benchmark.run(args.sizes)
+    except (ImportError, RuntimeError) as error:
+        sys.exit(f"Cannot time through the app's widgets: {error}")
+    failed = check_thresholds(results, baseline_report)
+    results['failures'] = [{'size': size, 'operation': operation, 'kind': kind, 'median': median, 'limit': limit}
+                           for size, operation, kind, median, limit in failed]
+    with open(args.out, 'w', encoding='utf-8') as report_file:
+        json.dump(results, report_file, indent=2)
+
+    print_report(results, baseline_report)
+    print(f"\nReport written to {args.out}")
+    for size, operation, kind, median, limit in failed:
+        print(f"FAIL {size} {operation}: median {median * 1000:.2f} ms over the {kind} limit of {limit * 1000:.2f} ms")
+    sys.exit(1 if failed else 0)
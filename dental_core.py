@@ -0,0 +1,368 @@
+# dental_core.py
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from dental_schedule import parse_minutes
+
+# --- Core Configuration ---
+FREE_SLOT_SUGGESTIONS = 5  # Free slots offered with a double-booking warning
+DELETED_RETENTION_DAYS = 7  # Deleted rows can be restored for this long before they are purged for good
+ARCHIVE_HORIZON_DAYS = 2 * 365  # Appointments and clinical records older than this leave the working set
+
+
+class ValidationError(ValueError):
+    """Input that fails the checks the entry forms apply (required fields, date and time formats)."""
+
+
+class NotFoundError(LookupError):
+    """The patient, appointment or clinical record does not exist (any more)."""
+
+
+class DoubleBookingError(Exception):
+    """The proposed slot overlaps booked appointments. Retry with ``allow_double_booking=True`` to book anyway."""
+
+    def __init__(self, date, time, conflicts, free_slots):
+        self.date = date
+        self.time = time
+        self.conflicts = conflicts  # Appointment rows (dicts) the slot overlaps
+        self.free_slots = free_slots  # (date, 'HH:MM') pairs that are free
+        clashes = "\n".join(f"  {row['Time']}  {row['Name']} ({row['Procedure']})" for row in conflicts)
+        suggestions = "\n".join(f"  {slot_date} {slot_time}" for slot_date, slot_time in free_slots)
+        super().__init__(f"{date} {time} overlaps with:\n{clashes}\n\n"
+                         f"Next free slots:\n{suggestions or '  (none found)'}")
+
+
+def validate_date(date):
+    try:
+        datetime.strptime(str(date), "%Y-%m-%d")
+    except ValueError:
+        raise ValidationError("Date must be in YYYY-MM-DD format.") from None
+    return str(date)
+
+
+def validate_time(time):
+    if parse_minutes(time) is None:
+        raise ValidationError("Time must be in HH:MM format.")
+    return str(time)
+
+
+def validate_month(month):
+    try:
+        datetime.strptime(str(month), "%Y-%m")
+    except ValueError:
+        raise ValidationError("Month must be in YYYY-MM format.") from None
+    return str(month)
+
+
+def _deletion_time():
+    # Microseconds keep two deletes in the same second apart, since a restore matches on the exact time
+    return datetime.now().isoformat(sep=' ', timespec='microseconds')
+
+
+def _required(value, label):
+    value = '' if value is None else str(value).strip()
+    if not value:
+        raise ValidationError(f"{label} is required.")
+    return value
+
+
+class DentalPractice:
+    """The practice's operations, with their validation and cascading rules, independent of any user interface.
+
+    Wraps a storage backend from ``dental_store.open_store``. The Tk app, the local HTTP service
+    (dental_service) and scripts all go through this class, and ``dental_service.PracticeClient`` offers the same
+    methods over HTTP. Edits take the ``expected_version`` the caller last saw (see ``CsvStore.commit``) and
+    return the row as stored; deletes return the row as it was.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._reports = None
+
+    # --- Lifecycle ---
+
+    def setup(self):
+        self.store.setup()
+
+    def load(self, tables=None):
+        if tables is None:
+            self.store.load()
+        else:
+            self.store.load(tables)
+
+    def start_background_writer(self, on_error=None):
+        self.store.start_background_writer(on_error=on_error)
+
+    @property
+    def pending_changes(self):
+        return self.store.pending_changes
+
+    def save(self):
+        self.store.save()
+
+    def close(self):
+        self.store.close()
+
+    def poll_changes(self):
+        return self.store.poll_changes()
+
+    # --- Patients ---
+
+    def get_patient(self, patient_id):
+        return self.store.get_patient(patient_id)
+
+    def patient_count(self):
+        return self.store.patient_count()
+
+    def patients_page(self, offset, limit, sort_column=None, descending=False):
+        return self.store.patients_page(offset, limit, sort_column, descending)
+
+    def all_patients(self):
+        return self.store.all_patients()
+
+    def patients_registered_between(self, first_date, last_date):
+        return self.store.patients_registered_between(first_date, last_date)
+
+    def find_patients(self, search_term):
+        return self.store.find_patients(search_term)
+
+    def add_patient(self, name, phone, notes=''):
+        name, phone = _required(name, "Patient Name"), _required(phone, "Phone")
+        new_id = self.store.next_id('patients')
+        key = self.store.commit('insert', 'patients', {'PatientID': new_id},
+                                {'PatientID': new_id, 'Name': name, 'Phone': phone, 'MedicalNotes': notes or '',
+                                 'Registered': datetime.now().strftime("%Y-%m-%d")})
+        return self.store.get_patient(key['PatientID'])
+
+    def update_patient(self, patient_id, name, phone, notes='', expected_version=None):
+        name, phone = _required(name, "Name"), _required(phone, "Phone")
+        self._existing('patients', patient_id)
+        self.store.commit('update', 'patients', {'PatientID': int(patient_id)},
+                          {'Name': name, 'Phone': phone, 'MedicalNotes': notes or ''},
+                          expected_version=expected_version)
+        return self.store.get_patient(patient_id)
+
+    def delete_patient(self, patient_id, expected_version=None):
+        """Delete a patient together with all their appointments and clinical records; returns the patient row.
+
+        It is one commit: the store deletes the appointments and records with the same deletion time (see
+        dental_store.cascaded), so ``restore_deleted`` brings them back together.
+        """
+        patient = self._existing('patients', patient_id)
+        self.store.commit('delete', 'patients', {'PatientID': int(patient_id)}, {'Deleted': _deletion_time()},
+                          expected_version=expected_version)
+        return patient
+
+    # --- Appointments ---
+
+    def get_appointment(self, appointment_id):
+        return self.store.get_appointment(appointment_id)
+
+    def appointments_on(self, date):
+        return self.store.appointments_on(date)
+
+    def appointments_between(self, first_date, last_date):
+        return self.store.appointments_between(first_date, last_date)
+
+    def free_slots(self, date, procedure, count=FREE_SLOT_SUGGESTIONS, after_time=None):
+        return self.store.free_slots(validate_date(date), procedure, count, after_time)
+
+    def booking_conflicts(self, date, time, procedure, exclude_id=None):
+        """The appointment rows a proposed slot overlaps."""
+        appointment_ids = self.store.booking_conflicts(date, time, procedure, exclude_id)
+        return [row for row in map(self.store.get_appointment, appointment_ids) if row is not None]
+
+    def schedule_appointment(self, patient_id, date, time, procedure, allow_double_booking=False):
+        date, time = validate_date(date), validate_time(time)
+        if self.store.get_patient(patient_id) is None:
+            raise NotFoundError(f"Patient with ID {patient_id} not found.")
+        if not allow_double_booking:
+            self._check_slot(date, time, procedure)
+        new_id = self.store.next_id('appointments')
+        key = self.store.commit('insert', 'appointments', {'AppointmentID': new_id},
+                                {'AppointmentID': new_id, 'PatientID': int(patient_id), 'Date': date, 'Time': time,
+                                 'Procedure': procedure})
+        return self.store.get_appointment(key['AppointmentID'])
+
+    def update_appointment(self, appointment_id, date, time, procedure, expected_version=None,
+                           allow_double_booking=False):
+        date, time = validate_date(date), validate_time(time)
+        self._existing('appointments', appointment_id)
+        if not allow_double_booking:
+            self._check_slot(date, time, procedure, exclude_id=int(appointment_id))
+        self.store.commit('update', 'appointments', {'AppointmentID': int(appointment_id)},
+                          {'Date': date, 'Time': time, 'Procedure': procedure}, expected_version=expected_version)
+        return self.store.get_appointment(appointment_id)
+
+    def delete_appointment(self, appointment_id, expected_version=None):
+        appointment = self._existing('appointments', appointment_id)
+        self.store.commit('delete', 'appointments', {'AppointmentID': int(appointment_id)},
+                          {'Deleted': _deletion_time()}, expected_version=expected_version)
+        return appointment
+
+    def _check_slot(self, date, time, procedure, exclude_id=None):
+        conflicts = self.booking_conflicts(date, time, procedure, exclude_id)
+        if conflicts:
+            raise DoubleBookingError(date, time, conflicts,
+                                     self.store.free_slots(date, procedure, FREE_SLOT_SUGGESTIONS, after_time=time))
+
+    # --- Clinical Records ---
+
+    def get_record(self, record_id):
+        return self.store.get_record(record_id)
+
+    def patient_records(self, patient_id, include_archive=False):
+        """A patient's clinical records, newest first; ``include_archive`` adds those older than the horizon."""
+        return self.store.patient_records(patient_id, include_archive)
+
+    def records_between(self, first_date, last_date):
+        """RecordID, PatientID, Date and TreatmentPlan of the records dated ``first_date`` to ``last_date``, streamed
+        like the reports, so a table not yet in memory is not loaded for it."""
+        columns = ['RecordID', 'PatientID', 'Date', 'TreatmentPlan']
+        chunks = list(self.store.iter_chunks('clinical', columns, (first_date, last_date)))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+    def add_clinical_record(self, patient_id, problem, treatment='', medications='', date=None):
+        problem = _required(problem, "The 'Problem / Diagnosis' field")
+        date = validate_date(date) if date else datetime.now().strftime("%Y-%m-%d")
+        self._existing('patients', patient_id)
+        new_id = self.store.next_id('clinical')
+        key = self.store.commit('insert', 'clinical', {'RecordID': new_id},
+                                {'RecordID': new_id, 'PatientID': int(patient_id), 'Date': date, 'Problem': problem,
+                                 'TreatmentPlan': treatment or '', 'Medications': medications or ''})
+        return self.store.get_record(key['RecordID'])
+
+    def update_clinical_record(self, record_id, problem, treatment='', medications='', expected_version=None):
+        problem = _required(problem, "The 'Problem / Diagnosis' field")
+        self._existing('clinical', record_id)
+        self.store.commit('update', 'clinical', {'RecordID': int(record_id)},
+                          {'Problem': problem, 'TreatmentPlan': treatment or '', 'Medications': medications or ''},
+                          expected_version=expected_version)
+        return self.store.get_record(record_id)
+
+    def delete_clinical_record(self, record_id, expected_version=None):
+        record = self._existing('clinical', record_id)
+        self.store.commit('delete', 'clinical', {'RecordID': int(record_id)}, {'Deleted': _deletion_time()},
+                          expected_version=expected_version)
+        return record
+
+    def search_records(self, query, first_date=None, last_date=None):
+        """Clinical records whose Problem, TreatmentPlan or Medications match ``query`` (words, "a phrase" or
+        prefix*), best first, optionally between two dates; with the patient's Name and a Score."""
+        query = _required(query, "Search text")
+        first_date = validate_date(first_date) if first_date else None
+        last_date = validate_date(last_date) if last_date else None
+        records = self.store.search_records(query, first_date, last_date)
+        names = {}
+        for patient_id in records['PatientID'].dropna().astype(int).unique().tolist():
+            patient = self.store.get_patient(patient_id)
+            names[patient_id] = patient['Name'] if patient else ''
+        records.insert(2, 'Name', records['PatientID'].map(names).fillna(''))
+        return records
+
+    # --- Recently Deleted ---
+
+    def recently_deleted(self):
+        """Deleted patients, appointments and clinical records that can still be restored, most recent first.
+
+        One row per restorable item (Table, ID, PatientID, Description, Deleted). Appointments and records deleted
+        along with their patient come back with the patient, so they are counted in its entry instead.
+        """
+        patients = self.store.deleted_rows('patients')
+        cascades = {(int(row.PatientID), row.Deleted): [0, 0] for row in patients.itertuples(index=False)}
+        entries = []
+        for position, (table, id_column, describe) in enumerate([
+                ('appointments', 'AppointmentID', lambda row: f"Appointment {row.Date} {row.Time} {row.Procedure}"),
+                ('clinical', 'RecordID', lambda row: f"Record {row.Date}: {row.Problem}")]):
+            for row in self.store.deleted_rows(table).itertuples(index=False):
+                cascade = cascades.get((int(row.PatientID), row.Deleted))
+                if cascade is not None:
+                    cascade[position] += 1
+                    continue
+                patient = self.store.get_patient(row.PatientID)
+                owner = patient['Name'] if patient else f"deleted patient {int(row.PatientID)}"
+                entries.append((table, int(getattr(row, id_column)), int(row.PatientID),
+                                f"{describe(row)} ({owner})", row.Deleted))
+        for row in patients.itertuples(index=False):
+            appointments, records = cascades[(int(row.PatientID), row.Deleted)]
+            entries.append(('patients', int(row.PatientID), int(row.PatientID),
+                            f"Patient {row.Name} ({row.Phone}) with {appointments} appointment(s) and "
+                            f"{records} record(s)", row.Deleted))
+        deleted = pd.DataFrame(entries, columns=['Table', 'ID', 'PatientID', 'Description', 'Deleted'])
+        return deleted.sort_values('Deleted', ascending=False, kind='stable').reset_index(drop=True)
+
+    def restore_deleted(self, table, item_id, allow_double_booking=False):
+        """Undo a delete listed by ``recently_deleted``; returns the restored row.
+
+        A patient comes back with the appointments and records deleted with them. An appointment or record needs
+        its patient to exist, and restored appointments are checked for double bookings like new ones.
+        """
+        id_column = {'patients': 'PatientID', 'appointments': 'AppointmentID', 'clinical': 'RecordID'}[table]
+        rows = self.store.deleted_rows(table)
+        rows = rows[rows[id_column] == int(item_id)]
+        if rows.empty:
+            label = {'patients': 'Patient', 'appointments': 'Appointment', 'clinical': 'Record'}[table]
+            raise NotFoundError(f"{label} {item_id} can no longer be restored (restored already, or purged).")
+        entry = rows.iloc[0]
+        restore = {'Deleted': entry['Deleted']}
+        if table == 'patients':
+            if not allow_double_booking:
+                appointments = self.store.deleted_rows('appointments')
+                cascade = appointments[(appointments['PatientID'] == int(item_id))
+                                       & (appointments['Deleted'] == entry['Deleted'])]
+                for appointment in cascade.itertuples(index=False):
+                    self._check_slot(appointment.Date, appointment.Time, appointment.Procedure)
+            self.store.commit('restore', 'patients', {'PatientID': int(item_id)}, restore)
+            return self.store.get_patient(item_id)
+        if self.store.get_patient(entry['PatientID']) is None:
+            raise NotFoundError(f"Patient {int(entry['PatientID'])} was deleted as well; restore the patient first.")
+        if table == 'appointments' and not allow_double_booking:
+            self._check_slot(entry['Date'], entry['Time'], entry['Procedure'])
+        self.store.commit('restore', table, {id_column: int(item_id)}, restore)
+        return self._existing(table, item_id)
+
+    def purge_deleted(self):
+        """Remove for good one batch of the rows deleted more than DELETED_RETENTION_DAYS ago; returns how many.
+
+        Meant to be called now and then in the background until it returns 0.
+        """
+        before = datetime.now() - timedelta(days=DELETED_RETENTION_DAYS)
+        return self.store.purge_deleted(before.isoformat(sep=' ', timespec='microseconds'))
+
+    # --- Archive ---
+
+    def archive_old_history(self):
+        """Move one batch of appointments and records dated more than ARCHIVE_HORIZON_DAYS ago out of the working set
+        into per-year archive files, which are read back on demand; returns how many rows moved.
+
+        Meant to be called now and then in the background, like ``purge_deleted``.
+        """
+        before = datetime.now() - timedelta(days=ARCHIVE_HORIZON_DAYS)
+        return self.store.archive_old_rows(before.strftime("%Y-%m-%d"))
+
+    # --- Reports ---
+
+    def monthly_report(self, month=None):
+        """{report name: DataFrame} for a month ('YYYY-MM') or all dates; see dental_reports.ReportEngine."""
+        if self._reports is None:
+            from dental_reports import ReportEngine
+            self._reports = ReportEngine(self.store)
+        return self._reports.monthly_report(validate_month(month) if month else None)
+
+    def call_lists(self, date=None):
+        """{'reminders': the next day's appointments, 'recall': patients due for recall} as of ``date`` (default
+        today), each with the patient's phone number; see dental_recall.
+        """
+        from dental_recall import call_lists
+        return call_lists(self.store, validate_date(date) if date else datetime.now().strftime("%Y-%m-%d"))
+
+    def _existing(self, table, row_id):
+        lookup = {'patients': self.store.get_patient, 'appointments': self.store.get_appointment,
+                  'clinical': self.store.get_record}[table]
+        row = lookup(row_id)
+        if row is None:
+            label = {'patients': 'Patient', 'appointments': 'Appointment', 'clinical': 'Record'}[table]
+            raise NotFoundError(f"{label} {row_id} no longer exists (deleted on another workstation?).")
+        return row
@@ -0,0 +1,188 @@
+# dental_import.py
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from dental_lock import LockTimeout
+from dental_store import open_store
+
+# --- Import Configuration ---
+IMPORT_CHUNK_ROWS = 50000  # Rows read and validated at a time
+ERROR_FILE_SUFFIX = '.errors.csv'  # patients.csv -> patients.errors.csv
+
+# Source ID column per table: checked for integrity, then replaced by newly assigned IDs
+SOURCE_ID_COLUMNS = {'patients': 'PatientID', 'appointments': 'AppointmentID', 'clinical': 'RecordID'}
+REQUIRED_COLUMNS = {'patients': ['Name', 'Phone'],
+                    'appointments': ['PatientID', 'Date', 'Time'],
+                    'clinical': ['PatientID', 'Date', 'Problem']}
+OPTIONAL_COLUMNS = {'patients': ['MedicalNotes'],
+                    'appointments': ['Procedure'],
+                    'clinical': ['TreatmentPlan', 'Medications']}
+TIME_PATTERN = r'^(?:[01]?\d|2[0-3]):[0-5]\d$'
+
+
+def _flag(errors, bad, message):
+    """Add ``message`` to the error text of every row where ``bad`` is True."""
+    return errors.mask(bad, errors + message + '; ')
+
+
+def _whole_numbers(values):
+    """Text column -> nullable integers; anything that is not a whole number becomes <NA>."""
+    numbers = pd.to_numeric(values.str.strip(), errors='coerce')
+    return numbers.where(numbers % 1 == 0).astype('Int64')
+
+
+class BulkImporter:
+    """Streams patients, appointments and clinical records from CSV files into the store with one commit.
+
+    Each file is read IMPORT_CHUNK_ROWS rows at a time and every check is a column operation on the whole chunk:
+    required fields, YYYY-MM-DD dates, HH:MM times, whole-number IDs that are unique within the file, and patient
+    references that resolve. Rows that fail go to an error file next to the input, with their row number and
+    the reasons, and are left out.
+
+    New IDs are numbered in one block per table. The PatientIDs in the appointment and clinical files are the
+    source system's IDs from the patients file; when no patients file is imported, they must be IDs of patients
+    already on file. Nothing reaches the store until every file has been read; then all rows go in with a single
+    ``bulk_insert``.
+    """
+
+    def __init__(self, store, chunk_rows=IMPORT_CHUNK_ROWS):
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self.frames = {}
+        self.summary = {}  # table -> (rows imported, rows rejected, error file or None)
+        self._patient_ids = None  # Source PatientID -> new PatientID, for the patients being imported
+
+    def run(self, patients_file=None, appointments_file=None, clinical_file=None, commit=True):
+        """Import the given files (any of them may be left out). ``commit=False`` only validates."""
+        if patients_file:
+            self._read('patients', patients_file)
+        if appointments_file or clinical_file:
+            self._resolve_patients()
+        if appointments_file:
+            self._read('appointments', appointments_file)
+        if clinical_file:
+            self._read('clinical', clinical_file)
+        if commit and any(not df.empty for df in self.frames.values()):
+            self.frames = self.store.bulk_insert(self.frames)
+        return self.summary
+
+    def _read(self, table, path):
+        id_column = SOURCE_ID_COLUMNS[table]
+        error_path = os.path.splitext(path)[0] + ERROR_FILE_SUFFIX
+        if os.path.exists(error_path):
+            os.remove(error_path)  # Left over from an earlier run of the same file
+        next_id = self.store.next_id(table)
+        seen_ids = set()
+        valid_chunks, source_ids = [], []
+        imported = rejected = 0
+        # Everything is read as text, so phone numbers keep their leading zeros and nothing is guessed
+        reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=self.chunk_rows)
+        for chunk_number, chunk in enumerate(reader):
+            chunk.index = pd.RangeIndex(chunk_number * self.chunk_rows + 1,
+                                        chunk_number * self.chunk_rows + 1 + len(chunk), name='Row')
+            missing = [column for column in REQUIRED_COLUMNS[table] if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"{path} has no {', '.join(missing)} column")
+            for column in OPTIONAL_COLUMNS[table]:
+                if column not in chunk.columns:
+                    chunk[column] = ''
+
+            errors = pd.Series('', index=chunk.index)
+            normalized = {}  # Cleaned-up columns for the rows that are kept; rejects are written as they were read
+            for column in REQUIRED_COLUMNS[table]:
+                errors = _flag(errors, chunk[column].str.strip() == '', f'{column} is required')
+            if id_column in chunk.columns:
+                ids = _whole_numbers(chunk[id_column])
+                errors = _flag(errors, ids.isna(), f'{id_column} is not a whole number')
+                errors = _flag(errors, ids.notna() & (ids.duplicated() | ids.isin(seen_ids)),
+                               f'{id_column} appears more than once')
+            if 'Date' in REQUIRED_COLUMNS[table]:
+                dates = pd.to_datetime(chunk['Date'].str.strip(), format='%Y-%m-%d', errors='coerce')
+                errors = _flag(errors, dates.isna() & (chunk['Date'].str.strip() != ''),
+                               'Date is not in YYYY-MM-DD format')
+                normalized['Date'] = dates.dt.strftime('%Y-%m-%d')
+            if 'Time' in REQUIRED_COLUMNS[table]:
+                times = chunk['Time'].str.strip()
+                errors = _flag(errors, ~times.str.match(TIME_PATTERN) & (times != ''), 'Time is not in HH:MM format')
+                normalized['Time'] = times.str.zfill(5)  # '9:30' -> '09:30', so times sort as text
+            if table != 'patients':
+                patient_ids = self._new_patient_ids(_whole_numbers(chunk['PatientID']))
+                errors = _flag(errors, patient_ids.isna() & (chunk['PatientID'].str.strip() != ''),
+                               'PatientID does not match any patient')
+                normalized['PatientID'] = patient_ids
+
+            bad = errors != ''
+            if bad.any():
+                rejects = chunk[bad].assign(Error=errors[bad].str.rstrip('; '))
+                rejects.to_csv(error_path, mode='a', header=not os.path.exists(error_path))
+                rejected += int(bad.sum())
+            good = chunk[~bad].assign(**{column: values[~bad] for column, values in normalized.items()})
+            if id_column in chunk.columns:
+                seen_ids.update(ids[~bad].tolist())
+                if table == 'patients':
+                    source_ids.append(ids[~bad])
+            # IDs are handed out as one consecutive block; the store moves it if they were taken meanwhile
+            good[id_column] = range(next_id + imported, next_id + imported + len(good))
+            valid_chunks.append(good)
+            imported += len(good)
+
+        columns = [id_column] + [column for column in REQUIRED_COLUMNS[table] + OPTIONAL_COLUMNS[table]
+                                 if column != id_column]
+        df = pd.concat(valid_chunks, ignore_index=True)[columns] if valid_chunks else pd.DataFrame(columns=columns)
+        df[id_column] = df[id_column].astype('int64')
+        if table == 'patients':
+            if source_ids:
+                self._patient_ids = pd.Series(df['PatientID'].to_numpy(),
+                                              index=pd.concat(source_ids, ignore_index=True).astype('int64'))
+            else:
+                self._patient_ids = pd.Series(dtype='int64')
+        else:
+            df['PatientID'] = df['PatientID'].astype('int64')
+        self.frames[table] = df
+        self.summary[table] = (imported, rejected, error_path if rejected else None)
+
+    def _resolve_patients(self):
+        """Decide what the PatientIDs in the appointment and clinical files refer to."""
+        if self._patient_ids is not None and not self._patient_ids.empty:
+            return
+        # No patients imported (or none with a source ID): refer to the patients already on file
+        existing = self.store.all_patients()
+        existing_ids = existing['PatientID'].astype('int64')
+        self._patient_ids = pd.Series(existing_ids.to_numpy(), index=existing_ids.to_numpy())
+
+    def _new_patient_ids(self, source_ids):
+        return source_ids.map(self._patient_ids).astype('Int64')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import patients, appointments and clinical records from CSV files. "
+                    "Uses the storage backend named by DENTAL_STORAGE, like the app.")
+    parser.add_argument('--patients', help="CSV with Name, Phone[, PatientID, MedicalNotes]")
+    parser.add_argument('--appointments', help="CSV with PatientID, Date, Time[, Procedure, AppointmentID]")
+    parser.add_argument('--clinical', help="CSV with PatientID, Date, Problem[, TreatmentPlan, Medications, RecordID]")
+    parser.add_argument('--chunk-rows', type=int, default=IMPORT_CHUNK_ROWS, help="rows validated at a time")
+    parser.add_argument('--dry-run', action='store_true', help="validate and write the error files only")
+    args = parser.parse_args()
+    if not (args.patients or args.appointments or args.clinical):
+        parser.error("nothing to import; give --patients, --appointments and/or --clinical")
+
+    started = time.perf_counter()
+    store = open_store(os.environ.get('DENTAL_STORAGE', 'csv'))
+    store.setup()
+    importer = BulkImporter(store, chunk_rows=args.chunk_rows)
+    try:
+        summary = importer.run(args.patients, args.appointments, args.clinical, commit=not args.dry_run)
+    except (OSError, ValueError, LockTimeout) as error:
+        sys.exit(f"Import failed, nothing was imported: {error}")
+    finally:
+        store.close()
+    for table, (imported, rejected, error_path) in summary.items():
+        note = f" (see {error_path})" if error_path else ""
+        print(f"{table}: {imported} {'valid' if args.dry_run else 'imported'}, {rejected} rejected{note}")
+    print(f"Finished in {time.perf_counter() - started:.1f} s")
@@ -0,0 +1,220 @@
+# dental_journal.py
+
+import json
+import os
+import uuid
+
+from dental_metrics import add_bytes
+
+
+def _json_default(value):
+    # numpy / pandas scalars (e.g. the result of df['ID'].max() + 1) know how to become plain Python values
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ChangeJournal:
+    """Append-only log of the row-level changes made since the CSV files were last written.
+
+    Each line is one JSON object: {"op": "insert" | "update" | "delete", "table": ..., "key": {...}, "row": {...}}.
+    When the journal is emptied after a snapshot it starts with a {"generation": ...} line, so a workstation that
+    is following the journal can tell it was compacted by someone else and must reload the data files.
+
+    ``offset`` is how far (in bytes) this workstation has read; ``read_new`` continues from there.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entry_count = 0
+        self.offset = 0
+        self.generation = None
+        self._seen = None  # (size, mtime) of the file when it was last read to the end
+
+    @staticmethod
+    def make_entry(op, table, key, row=None):
+        entry = {'op': op, 'table': table, 'key': key}
+        if row is not None:
+            entry['row'] = row
+        return entry
+
+    def append(self, op, table, key, row=None):
+        self.append_many([self.make_entry(op, table, key, row)])
+
+    def append_many(self, entries):
+        """Append a batch of entries with a single write and fsync. Call with the data lock held, once caught up."""
+        data = ''.join(json.dumps(entry, default=_json_default) + '\n' for entry in entries).encode('utf-8')
+        with open(self.path, 'a+b') as journal_file:
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() > 0:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b'\n':
+                    # A workstation crashed mid-append: end its torn line so it cannot swallow this entry
+                    data = b'\n' + data
+            journal_file.write(data)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+            self.offset = journal_file.tell()
+        self.entry_count += len(entries)
+        add_bytes(len(data))
+
+    def replay(self):
+        """Yield the journal entries in the order they were written."""
+        self.entry_count = 0
+        self.offset = 0
+        self.generation = None
+        self._seen = None
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as journal_file:
+            yield from self._read_lines(journal_file)
+
+    def has_changed(self):
+        """Cheap check (one stat) for anything written since the journal was last read to the end."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.offset > 0
+        return (stat.st_size, stat.st_mtime_ns) != self._seen
+
+    def read_new(self):
+        """Entries appended since the last read, or None if the journal has been compacted since then."""
+        try:
+            journal_file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return [] if self.offset == 0 else None
+        with journal_file:
+            if self._header_generation(journal_file.readline()) != self.generation:
+                return None
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() < self.offset:
+                return None
+            journal_file.seek(self.offset)
+            return list(self._read_lines(journal_file))
+
+    def is_unchanged_since(self, offset, generation):
+        """True if nothing has been written to the journal since it stood at ``offset`` in ``generation``."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return offset == 0
+        return size == offset and generation == self.generation
+
+    def truncate(self):
+        """Empty the journal once its changes are safely in the CSV files, starting a new generation."""
+        self.generation = uuid.uuid4().hex
+        header = (json.dumps({'generation': self.generation}) + '\n').encode('utf-8')
+        with open(self.path, 'wb') as journal_file:
+            journal_file.write(header)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self.offset = len(header)
+        self.entry_count = 0
+        self._seen = None
+
+    def close(self):
+        # Every append opens and closes the file, so there is no handle left to release
+        pass
+
+    def _read_lines(self, journal_file):
+        for line in iter(journal_file.readline, b''):
+            if not line.endswith(b'\n'):
+                # A torn last line means a crash (or another workstation) mid-append; read it again next time
+                break
+            self.offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The remains of a torn append, closed off by the next writer
+                continue
+            if 'op' not in entry:
+                self.generation = entry.get('generation')
+                continue
+            self.entry_count += 1
+            yield entry
+        stat = os.fstat(journal_file.fileno())
+        if self.offset == stat.st_size:
+            self._seen = (stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _header_generation(line):
+        try:
+            header = json.loads(line)
+        except ValueError:
+            return None
+        return header.get('generation') if isinstance(header, dict) and 'op' not in header else None
+
+
+class JournalOverlay:
+    """The net effect of a table's journal entries, so its data file can be streamed without loading it.
+
+    ``rows`` holds the final state of the rows the journal inserted or deleted (None once deleted), ``updates``
+    the changed columns of rows that are only in the file, and ``deleted_patients`` the PatientIDs whose rows were
+    deleted wholesale (the cascade when a patient is deleted). ``complete`` is False if an entry is keyed in any
+    other way; the table then has to be loaded instead.
+    """
+
+    def __init__(self, id_column, entries):
+        self.id_column = id_column
+        self.rows = {}
+        self.updates = {}
+        self.deleted_patients = set()
+        self.complete = True
+        for entry in entries:
+            self._add(entry['op'], entry['key'], entry.get('row'))
+
+    def _add(self, op, key, row):
+        if op in ('purge', 'archive'):
+            # Purged rows were tombstoned in the file or deleted in the journal already; either way they are gone.
+            # Archived rows are streamed from the archive files instead.
+            for row_id in key[self.id_column]:
+                self.rows[int(row_id)] = None
+                self.updates.pop(int(row_id), None)
+        elif op == 'restore':
+            self.complete = False
+        elif list(key) == [self.id_column]:
+            row_id = int(key[self.id_column])
+            if op in ('insert', 'unarchive'):
+                # A row brought back from the archive keeps the Version it had there
+                self.rows[row_id] = dict(row, Version=1) if op == 'insert' else dict(row)
+                self.updates.pop(row_id, None)
+            elif op == 'delete':
+                self.rows[row_id] = None
+                self.updates.pop(row_id, None)
+            elif self.rows.get(row_id) is not None:
+                current = self.rows[row_id]
+                current.update(row, Version=current.get('Version', 1) + 1)
+            elif row_id not in self.rows:
+                self.updates.setdefault(row_id, {}).update(row)
+        elif op == 'delete' and list(key) == ['PatientID']:
+            patient_id = int(key['PatientID'])
+            self.deleted_patients.add(patient_id)
+            for row_id, current in self.rows.items():
+                if current is not None and int(current['PatientID']) == patient_id:
+                    self.rows[row_id] = None
+        else:
+            self.complete = False
+
+    def apply(self, chunk):
+        """A chunk of rows read from the data file, with the journal's changes and deletions applied."""
+        ids = chunk[self.id_column]
+        keep = ~ids.isin(list(self.rows))
+        if self.deleted_patients and 'PatientID' in chunk.columns:
+            keep &= ~chunk['PatientID'].isin(list(self.deleted_patients))
+        chunk = chunk[keep]
+        if self.updates:
+            chunk = chunk.copy()
+            ids = chunk[self.id_column]
+            for column in chunk.columns:
+                values = {row_id: change[column] for row_id, change in self.updates.items() if column in change}
+                if values:
+                    changed = ids.isin(list(values))
+                    chunk.loc[changed, column] = ids[changed].map(values)
+        return chunk
+
+    def final_rows(self):
+        """Rows inserted through the journal and still present, in the order they were inserted."""
+        return [row for row in self.rows.values() if row is not None]
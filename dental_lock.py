@@ -0,0 +1,94 @@
+# dental_lock.py
+
+import threading
+import time
+
+try:
+    import msvcrt
+except ImportError:  # Not Windows
+    msvcrt = None
+    import fcntl
+
+# --- Locking Configuration ---
+LOCK_TIMEOUT_SECONDS = 10  # Give up (and tell the user) if another workstation holds the lock this long
+LOCK_RETRY_SECONDS = 0.05
+
+
+class LockTimeout(Exception):
+    """Another workstation held the data lock for longer than LOCK_TIMEOUT_SECONDS."""
+
+
+class ConflictError(Exception):
+    """The row was changed or deleted on another workstation after it was read."""
+
+
+class FileLock:
+    """Exclusive lock shared by every workstation using the same data folder.
+
+    The lock is an OS lock on a small file next to the data (msvcrt on Windows, flock elsewhere), so it is released
+    automatically if a workstation crashes. A thread lock is taken first, because OS file locks do not always
+    exclude other threads of the same process.
+    """
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT_SECONDS):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.Lock()
+        self._handle = None
+
+    def acquire(self, blocking=True):
+        """Take the lock; with ``blocking=False`` return False at once instead of waiting for it."""
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(blocking, self.timeout if blocking else -1):
+            if not blocking:
+                return False
+            raise LockTimeout(f"Timed out waiting for {self.path}")
+        handle = None
+        try:
+            handle = open(self.path, 'a+b')
+            while not self._try_lock(handle):
+                if not blocking:
+                    handle.close()
+                    self._thread_lock.release()
+                    return False
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Another workstation is holding {self.path}")
+                time.sleep(LOCK_RETRY_SECONDS)
+        except BaseException:
+            if handle is not None:
+                handle.close()
+            self._thread_lock.release()
+            raise
+        self._handle = handle
+        return True
+
+    def release(self):
+        handle, self._handle = self._handle, None
+        try:
+            if msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            handle.close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    @staticmethod
+    def _try_lock(handle):
+        try:
+            if msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
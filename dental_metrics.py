@@ -0,0 +1,214 @@
+# dental_metrics.py
+
+import contextlib
+import functools
+import logging
+import logging.handlers
+import os
+import platform
+import threading
+import time
+from collections import deque
+
+# --- Instrumentation Configuration ---
+SLOW_OPERATION_SECONDS = float(os.environ.get('DENTAL_SLOW_SECONDS', '0.25'))  # Blocking the window this long is SLOW
+# One log per workstation, so PCs sharing a data folder never rotate each other's file
+METRICS_LOG_FILE = f"dental_performance_{platform.node() or 'local'}.log"
+METRICS_LOG_BYTES = 1024 * 1024  # Rotate the log at this size...
+METRICS_LOG_BACKUPS = 3  # ...keeping this many old ones
+HEARTBEAT_MS = 50  # How often the Tk loop checks in, to tell a busy handler from one waiting in a dialog
+SAMPLES_KEPT = 10000  # Timings kept per operation for the percentiles
+
+_installed = None  # The app's Instrumentation, once installed; the module-level hooks do nothing without one
+_local = threading.local()  # Per thread: the measurements in progress, innermost last
+
+
+class Measurement:
+    """One call of a handler or data operation: wall time, main-thread blocking time, rows and bytes.
+
+    Blocking time is the part of the wall time during which the Tk loop could not run. A handler that opens a
+    dialog is not freezing the window while the dialog waits for the user, since the dialog runs the loop
+    itself; the heartbeat ticks that fire meanwhile (``responsive``) are what tells the two apart.
+    """
+
+    def __init__(self, name, on_main_thread):
+        self.name = name
+        self.on_main_thread = on_main_thread
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.blocked = 0.0
+        self._busy_since = self.started
+
+    def responsive(self, now):
+        # Up to one heartbeat of every gap is the loop's normal wait, not work
+        self.blocked += max(0.0, now - self._busy_since - HEARTBEAT_MS / 1000)
+        self._busy_since = now
+
+    def finish(self):
+        now = time.perf_counter()
+        self.wall = now - self.started
+        if self.on_main_thread:
+            self.blocked += now - self._busy_since
+        else:
+            self.blocked = 0.0  # Worker threads never hold up the window
+
+
+def _row_count(result):
+    """Rows an operation returned: a DataFrame or list, one row (dict), or a dict of DataFrames (reports)."""
+    if result is None or isinstance(result, (str, bool, int, float)):
+        return 0
+    if isinstance(result, dict):
+        if result and all(hasattr(value, 'columns') for value in result.values()):
+            return sum(len(value) for value in result.values())
+        return 1
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+class Instrumentation:
+    """Opt-in timing of the app's event handlers and data operations (DENTAL_METRICS=1).
+
+    Every measured call is written to a rotating log next to the data, and calls that block the window for
+    longer than ``slow_seconds`` are logged as SLOW. Timings since startup are kept per operation for the
+    diagnostics panel. When it is not installed, the hooks in the store and writer cost one global lookup.
+    """
+
+    def __init__(self, log_file=METRICS_LOG_FILE, slow_seconds=SLOW_OPERATION_SECONDS):
+        self.log_file = log_file
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()  # The background writer records its snapshots from its own thread
+        self._samples = {}  # Operation -> deque of (wall, blocked) seconds
+        self._totals = {}  # Operation -> [calls, rows, bytes, slow calls]
+        self.logger = logging.getLogger(f'dental.metrics.{id(self)}')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=METRICS_LOG_BYTES,
+                                                       backupCount=METRICS_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        self.logger.addHandler(handler)
+
+    def install(self):
+        """Make this the instance the module-level hooks (``measure``, ``add_bytes``) report to."""
+        global _installed
+        _installed = self
+
+    def start_heartbeat(self, root):
+        def tick():
+            now = time.perf_counter()
+            for measurement in _stack():
+                measurement.responsive(now)
+            root.after(HEARTBEAT_MS, tick)
+
+        root.after(HEARTBEAT_MS, tick)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        measurement = Measurement(name, threading.current_thread() is threading.main_thread())
+        stack = _stack()
+        stack.append(measurement)
+        try:
+            yield measurement
+        finally:
+            stack.pop()
+            measurement.finish()
+            if stack:
+                # Whatever a nested data operation touched, the handler that called it touched too
+                stack[-1].rows += measurement.rows
+                stack[-1].bytes += measurement.bytes
+            self.record(measurement)
+
+    def wrap(self, name, function, count_rows=False):
+        @functools.wraps(function)
+        def measured(*args, **kwargs):
+            with self.measure(name) as measurement:
+                result = function(*args, **kwargs)
+                if count_rows:
+                    measurement.rows += _row_count(result)
+                return result
+        return measured
+
+    def instrument_methods(self, obj, names):
+        """Replace the named methods on ``obj`` with measured ones. Do it before they are bound to widgets."""
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def wrap_practice(self, practice):
+        return InstrumentedPractice(practice, self)
+
+    def record(self, measurement):
+        slow = measurement.blocked > self.slow_seconds
+        with self._lock:
+            samples = self._samples.setdefault(measurement.name, deque(maxlen=SAMPLES_KEPT))
+            samples.append((measurement.wall, measurement.blocked))
+            totals = self._totals.setdefault(measurement.name, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += measurement.rows
+            totals[2] += measurement.bytes
+            totals[3] += slow
+        self.logger.log(logging.WARNING if slow else logging.INFO,
+                        "%s%s wall=%.1fms blocked=%.1fms rows=%d bytes=%d thread=%s",
+                        'SLOW ' if slow else '', measurement.name, measurement.wall * 1000,
+                        measurement.blocked * 1000, measurement.rows, measurement.bytes,
+                        threading.current_thread().name)
+
+    def summary(self):
+        """One dict per operation since startup, slowest p95 first; times in milliseconds."""
+        with self._lock:
+            snapshot = [(name, list(samples), list(self._totals[name])) for name, samples in self._samples.items()]
+        rows = []
+        for name, samples, (calls, row_total, byte_total, slow) in snapshot:
+            walls = sorted(wall for wall, _ in samples)
+            blocked = sorted(blocked for _, blocked in samples)
+            rows.append({'operation': name, 'calls': calls,
+                         'p50_ms': percentile(walls, 0.5) * 1000, 'p95_ms': percentile(walls, 0.95) * 1000,
+                         'max_ms': walls[-1] * 1000, 'blocked_p95_ms': percentile(blocked, 0.95) * 1000,
+                         'rows': row_total, 'bytes': byte_total, 'slow': slow})
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+
+class InstrumentedPractice:
+    """Stands in for a DentalPractice (or PracticeClient) and measures each method call as ``practice.<name>``,
+    counting the rows it returns. Attributes that are not methods are passed straight through."""
+
+    def __init__(self, practice, instrumentation):
+        self._practice = practice
+        self._instrumentation = instrumentation
+        self._methods = {}
+
+    def __getattr__(self, name):
+        value = getattr(self._practice, name)
+        if name.startswith('_') or not callable(value):
+            return value
+        if name not in self._methods:
+            self._methods[name] = self._instrumentation.wrap(f'practice.{name}', value, count_rows=True)
+        return self._methods[name]
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def measure(name):
+    """Measure a block as an operation of the installed Instrumentation; a no-op when none is installed."""
+    if _installed is None:
+        return contextlib.nullcontext()
+    return _installed.measure(name)
+
+
+def add_bytes(count):
+    """Count bytes written towards the operation in progress on this thread, if it is being measured."""
+    if _installed is not None:
+        stack = _stack()
+        if stack:
+            stack[-1].bytes += count
@@ -0,0 +1,125 @@
+# dental_recall.py
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# --- Recall Configuration ---
+RECALL_INTERVAL_MONTHS = 6  # A patient is due back this long after their last visit
+RECALL_GRACE_DAYS = 30  # Patients who fell due up to this many days ago, and still have nothing booked, stay listed
+LAST_DATE = '9999-12-31'  # Open end of "from today on"
+CALL_LIST_COLUMNS = ['Call', 'PatientID', 'Name', 'Phone', 'Details']
+
+
+def _latest_dates(chunks):
+    """PatientID -> latest Date over all chunks: a group-by max per chunk, then a max of the partial results.
+
+    Dates are parsed to datetime64 first; a group-by max over strings falls back to a Python loop per group.
+    """
+    partial = []
+    for chunk in chunks:
+        chunk = chunk.dropna(subset=['PatientID'])
+        dates = pd.to_datetime(chunk['Date'], format='%Y-%m-%d', errors='coerce')
+        latest = dates.groupby(chunk['PatientID'].astype('int64').to_numpy()).max().dropna()
+        if not latest.empty:
+            partial.append(latest)
+    if not partial:
+        return pd.Series(dtype='datetime64[ns]', index=pd.Index([], dtype='int64'), name='Date')
+    return pd.concat(partial).groupby(level=0).max()
+
+
+def _with_phones(store, df):
+    # Inner join, so rows of patients deleted in the meantime drop out
+    patients = store.all_patients()[['PatientID', 'Name', 'Phone']].astype({'PatientID': 'int64'})
+    return df.drop(columns=['Name'], errors='ignore').merge(patients, on='PatientID', how='inner')
+
+
+def recall_list(store, today):
+    """Patients due for their recall, most overdue first: last seen RECALL_INTERVAL_MONTHS before ``today``
+    (within RECALL_GRACE_DAYS) and nothing booked from ``today`` on.
+
+    A visit is a clinical record, as in the no-show report. Only records from the start of the window on are
+    read, since anyone seen after that is not due yet, so archived years are never touched.
+    """
+    today = pd.Timestamp(today)
+    due_until = today - pd.DateOffset(months=RECALL_INTERVAL_MONTHS)
+    due_from = due_until - pd.Timedelta(days=RECALL_GRACE_DAYS)
+    last_visits = _latest_dates(store.iter_chunks('clinical', ['PatientID', 'Date'],
+                                                  (f'{due_from:%Y-%m-%d}', f'{today:%Y-%m-%d}')))
+    due = last_visits[last_visits <= due_until]
+    booked = _latest_dates(store.iter_chunks('appointments', ['PatientID', 'Date'],
+                                             (f'{today:%Y-%m-%d}', LAST_DATE)))
+    due = due[~due.index.isin(booked.index)]
+    recall_due = pd.DatetimeIndex(due.to_numpy()) + pd.DateOffset(months=RECALL_INTERVAL_MONTHS)
+    recall = pd.DataFrame({'PatientID': due.index.to_numpy(),
+                           'Last Visit': pd.DatetimeIndex(due.to_numpy()).strftime('%Y-%m-%d'),
+                           'Recall Due': recall_due.strftime('%Y-%m-%d'),
+                           'Days Overdue': (today - recall_due).days})
+    recall = _with_phones(store, recall).sort_values(by=['Recall Due', 'PatientID'], kind='stable')
+    return recall[['PatientID', 'Name', 'Phone', 'Last Visit', 'Recall Due', 'Days Overdue']].reset_index(drop=True)
+
+
+def reminder_list(store, date):
+    """The appointments on ``date`` by time, with each patient's Name and Phone, for reminder calls."""
+    appointments = store.appointments_on(date)
+    reminders = _with_phones(store, appointments[['AppointmentID', 'PatientID', 'Date', 'Time', 'Procedure']])
+    reminders = reminders.sort_values(by=['Time', 'AppointmentID'], kind='stable')
+    return reminders[['AppointmentID', 'PatientID', 'Name', 'Phone', 'Date', 'Time', 'Procedure']].reset_index(drop=True)
+
+
+def call_lists(store, today):
+    """{'reminders': tomorrow's appointments, 'recall': patients due for recall} as of ``today`` (YYYY-MM-DD)."""
+    tomorrow = (datetime.strptime(today, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return {'reminders': reminder_list(store, tomorrow), 'recall': recall_list(store, today)}
+
+
+def call_list_frame(lists):
+    """Both lists as one call sheet (CALL_LIST_COLUMNS): reminders first, since they cannot wait."""
+    reminders, recall = lists['reminders'], lists['recall']
+    return pd.concat([
+        pd.DataFrame({'Call': 'Reminder', 'PatientID': reminders['PatientID'], 'Name': reminders['Name'],
+                      'Phone': reminders['Phone'],
+                      'Details': reminders['Date'].astype(str) + ' ' + reminders['Time'].astype(str) + ' '
+                                 + reminders['Procedure'].fillna('').astype(str)}),
+        pd.DataFrame({'Call': 'Recall', 'PatientID': recall['PatientID'], 'Name': recall['Name'],
+                      'Phone': recall['Phone'],
+                      'Details': 'Last visit ' + recall['Last Visit'].astype(str) + ', due '
+                                 + recall['Recall Due'].astype(str)}),
+    ], ignore_index=True).reindex(columns=CALL_LIST_COLUMNS)
+
+
+def write_call_list(lists, directory, today):
+    """Write the call sheet to <directory>/call_list_<today>.csv and return its path."""
+    path = os.path.join(directory, f"call_list_{today}.csv")
+    call_list_frame(lists).to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    from dental_store import open_store
+
+    parser = argparse.ArgumentParser(description="Daily call lists: tomorrow's appointment reminders and patients "
+                                                 "due for their recall, from the configured storage backend "
+                                                 "(DENTAL_STORAGE).")
+    parser.add_argument('--date', help="YYYY-MM-DD to run the lists as of (default: today)")
+    parser.add_argument('--out', help="write call_list_<date>.csv into this folder instead of printing the lists")
+    args = parser.parse_args()
+    today = args.date or datetime.now().strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(today, '%Y-%m-%d')
+    except ValueError:
+        sys.exit("Date must be in YYYY-MM-DD format.")
+
+    store = open_store(os.environ.get('DENTAL_STORAGE', 'csv'))
+    store.setup()
+    # Read-only, like the reports: closing a CSV store would compact (and so load) every table
+    results = call_lists(store, today)
+    if args.out:
+        print(f"Wrote {write_call_list(results, args.out, today)}")
+    else:
+        for title, table in (("Reminders for tomorrow", results['reminders']), ("Due for recall", results['recall'])):
+            print(f"\n{title} ({len(table)})")
+            print(table.to_string(index=False) if not table.empty else "  (none)")
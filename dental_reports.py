@@ -0,0 +1,173 @@
+# dental_reports.py
+
+import argparse
+import calendar
+import json
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from dental_journal import _json_default
+
+# --- Report Configuration ---
+REPORT_CACHE_FILE = 'dental_reports_cache.json'  # Results kept between runs until the data changes
+MEDICATION_SEPARATORS = r'[,;/\n]+'  # "Amoxicillin 500mg, Ibuprofen" counts as two medications
+NO_PROCEDURE = '(not given)'
+
+# Report name -> title shown in the app
+REPORTS = {
+    'procedures': 'Procedure Counts',
+    'visit_frequency': 'Patient Visit Frequency',
+    'no_shows': 'No-Show Rate',
+    'medications': 'Medication Frequency',
+}
+
+
+def month_range(month):
+    """'YYYY-MM' -> ('YYYY-MM-01', last day of the month); None -> None (all dates)."""
+    if month is None:
+        return None
+    first = datetime.strptime(month, '%Y-%m')
+    last_day = calendar.monthrange(first.year, first.month)[1]
+    return first.strftime('%Y-%m-01'), first.strftime(f'%Y-%m-{last_day:02d}')
+
+
+def _add_counts(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+def _count_frame(counts, label, value_label):
+    if counts is None or counts.empty:
+        return pd.DataFrame(columns=[label, value_label])
+    counts = counts.astype('int64').sort_values(ascending=False, kind='stable')
+    return counts.rename_axis(label).reset_index(name=value_label)
+
+
+class ReportEngine:
+    """Management reports computed by streaming the appointment and clinical tables in chunks.
+
+    Each report is a group-by whose partial counts are added up chunk by chunk (``store.iter_chunks``), so memory
+    depends on the chunk size and the number of distinct groups in the month, not on the size of the tables.
+    Results are cached, in memory and in REPORT_CACHE_FILE, with the store's ``data_fingerprint`` and reused until
+    the data changes.
+
+    The app records no attendance, so a past appointment counts as a no-show when the patient has no clinical
+    record dated that day.
+    """
+
+    def __init__(self, store, cache_file=REPORT_CACHE_FILE):
+        self.store = store
+        self.cache_file = cache_file
+        self._cache = None
+
+    def monthly_report(self, month=None, today=None):
+        """{report name: DataFrame} for one month ('YYYY-MM'), or for all dates if ``month`` is None."""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        key = month or 'all'
+        fingerprint = self.store.data_fingerprint(('appointments', 'clinical'))
+        cached = self._load_cache().get(key)
+        if cached and cached['fingerprint'] == fingerprint and cached['today'] == today:
+            return {name: pd.DataFrame(table['rows'], columns=table['columns'])
+                    for name, table in cached['reports'].items()}
+
+        reports = self._compute(month_range(month), today)
+        self._cache[key] = {'fingerprint': fingerprint, 'today': today,
+                            'reports': {name: {'columns': list(df.columns), 'rows': df.values.tolist()}
+                                        for name, df in reports.items()}}
+        self._save_cache()
+        return reports
+
+    def _compute(self, date_range, today):
+        # Clinical records first: medication counts, and which (patient, day) pairs were seen in the chair
+        medication_counts = None
+        attended = set()
+        for chunk in self.store.iter_chunks('clinical', ['PatientID', 'Date', 'Medications'], date_range):
+            chunk = chunk.dropna(subset=['PatientID'])
+            medications = (chunk['Medications'].fillna('').astype(str).str.split(MEDICATION_SEPARATORS)
+                           .explode().str.strip().str.capitalize())
+            medication_counts = _add_counts(medication_counts, medications[medications != ''].value_counts())
+            attended.update(zip(chunk['PatientID'].astype('int64'), chunk['Date'].astype(str)))
+
+        procedure_counts = visits = None
+        past_appointments = no_shows = 0
+        for chunk in self.store.iter_chunks('appointments', ['PatientID', 'Date', 'Procedure'], date_range):
+            chunk = chunk.dropna(subset=['PatientID'])
+            procedures = chunk['Procedure'].fillna('').astype(str).str.strip().replace('', NO_PROCEDURE)
+            procedure_counts = _add_counts(procedure_counts, procedures.value_counts())
+            patient_ids = chunk['PatientID'].astype('int64')
+            visits = _add_counts(visits, patient_ids.value_counts())
+            dates = chunk['Date'].astype(str)
+            past = dates < today
+            past_appointments += int(past.sum())
+            seen = pd.MultiIndex.from_arrays([patient_ids[past], dates[past]]).isin(attended)
+            no_shows += int((~seen).sum())
+
+        visit_frequency = visits.astype('int64').value_counts() if visits is not None else None
+        rate = round(100.0 * no_shows / past_appointments, 1) if past_appointments else 0.0
+        return {
+            'procedures': _count_frame(procedure_counts, 'Procedure', 'Appointments'),
+            'visit_frequency': _count_frame(visit_frequency, 'Visits', 'Patients').sort_values('Visits',
+                                                                                              ignore_index=True),
+            'no_shows': pd.DataFrame([[past_appointments, past_appointments - no_shows, no_shows, rate]],
+                                     columns=['Past Appointments', 'Attended', 'No-Shows', 'No-Show Rate (%)']),
+            'medications': _count_frame(medication_counts, 'Medication', 'Records'),
+        }
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_file, encoding='utf-8') as cache_file:
+                    self._cache = json.load(cache_file)
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self):
+        temp_path = self.cache_file + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(self._cache, cache_file, default=_json_default)
+            os.replace(temp_path, self.cache_file)
+        except OSError:
+            pass  # The cache is only an optimization; the results are still returned
+
+
+def export_reports(reports, directory, month=None):
+    """Write each report to <directory>/report_<name>_<month>.csv; returns the paths written."""
+    paths = []
+    for name, df in reports.items():
+        path = os.path.join(directory, f"report_{name}_{month or 'all'}.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    from dental_store import open_store
+
+    parser = argparse.ArgumentParser(description="Monthly practice reports, streamed from the configured "
+                                                 "storage backend (DENTAL_STORAGE).")
+    parser.add_argument('--month', help="YYYY-MM (default: the current month); 'all' for every date")
+    parser.add_argument('--out', help="write one CSV per report into this folder instead of printing them")
+    args = parser.parse_args()
+    month = args.month or datetime.now().strftime('%Y-%m')
+    if month == 'all':
+        month = None
+    try:
+        month_range(month)
+    except ValueError:
+        sys.exit("Month must be in YYYY-MM format.")
+
+    store = open_store(os.environ.get('DENTAL_STORAGE', 'csv'))
+    store.setup()
+    # Read-only: the store is not closed, since closing a CSV store would compact (and so load) every table
+    results = ReportEngine(store).monthly_report(month)
+    if args.out:
+        for written in export_reports(results, args.out, month):
+            print(f"Wrote {written}")
+    else:
+        for name, table in results.items():
+            print(f"\n{REPORTS[name]} ({month or 'all dates'})")
+            print(table.to_string(index=False) if not table.empty else "  (no data)")
@@ -0,0 +1,141 @@
+# dental_schedule.py
+
+import bisect
+import functools
+from datetime import datetime, timedelta
+
+# --- Scheduling Configuration ---
+DEFAULT_DURATION_MINUTES = 30
+# Chair time per procedure; matched case-insensitively against the words of the Procedure field
+PROCEDURE_DURATIONS = {
+    'checkup': 30,
+    'check-up': 30,
+    'consultation': 20,
+    'cleaning': 45,
+    'x-ray': 15,
+    'filling': 45,
+    'extraction': 60,
+    'whitening': 60,
+    'root canal': 90,
+    'crown': 90,
+    'bridge': 90,
+    'implant': 120,
+}
+CLINIC_OPENS = '09:00'
+CLINIC_CLOSES = '17:00'
+CLINIC_DAYS = (0, 1, 2, 3, 4)  # Monday to Friday
+SLOT_STEP_MINUTES = 15  # Free slots are offered on this grid
+FREE_SLOT_SEARCH_DAYS = 60  # How far ahead "next free slots" looks before giving up
+
+
+# Both are called once per appointment when the index is built, but see only a handful of distinct values
+@functools.lru_cache(maxsize=1024)
+def procedure_minutes(procedure):
+    """Chair time for a procedure; the longest listed procedure named in the text wins, else the default."""
+    text = str(procedure or '').lower()
+    matches = [minutes for name, minutes in PROCEDURE_DURATIONS.items() if name in text]
+    return max(matches) if matches else DEFAULT_DURATION_MINUTES
+
+
+@functools.lru_cache(maxsize=2048)
+def parse_minutes(time_str):
+    """'HH:MM' (or 'H:MM') -> minutes after midnight, or None if it is not a valid time."""
+    try:
+        parsed = datetime.strptime(str(time_str).strip(), '%H:%M')
+    except ValueError:
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+class SlotIndex:
+    """Booked chair time per day, for double-booking checks and free-slot search.
+
+    Each day holds its bookings as a list of (start, end, AppointmentID) sorted by start minute. Since no booking
+    is longer than the day's longest one, only bookings starting in [start - longest, end) can overlap a proposed
+    slot, so a conflict check is two bisects plus a look at those few neighbours, however many appointments
+    the practice has on file. ``add``/``remove`` keep it in step with edits.
+    """
+
+    def __init__(self):
+        self._days = {}  # date string -> sorted [(start, end, AppointmentID)]
+        self._longest = {}  # date string -> longest booking that day, in minutes (only ever grows; still correct)
+        self._bookings = {}  # AppointmentID -> (date string, (start, end, AppointmentID))
+
+    def build(self, rows):
+        """Index (AppointmentID, Date, Time, Procedure) rows in bulk; each day is sorted once at the end."""
+        for appointment_id, date, time_str, procedure in rows:
+            self._add_booking(int(appointment_id), date, time_str, procedure, list.append)
+        for bookings in self._days.values():
+            bookings.sort()
+
+    def add(self, appointment_id, date, time_str, procedure):
+        appointment_id = int(appointment_id)
+        self.remove(appointment_id)
+        self._add_booking(appointment_id, date, time_str, procedure, bisect.insort)
+
+    def _add_booking(self, appointment_id, date, time_str, procedure, insert):
+        start = parse_minutes(time_str)
+        if start is None:
+            # Free-text times from before validation cannot clash with anything
+            return
+        booking = (start, start + procedure_minutes(procedure), appointment_id)
+        date = str(date)
+        insert(self._days.setdefault(date, []), booking)
+        self._longest[date] = max(self._longest.get(date, 0), booking[1] - booking[0])
+        self._bookings[appointment_id] = (date, booking)
+
+    def remove(self, appointment_id):
+        date, booking = self._bookings.pop(int(appointment_id), (None, None))
+        if booking is None:
+            return
+        bookings = self._days[date]
+        del bookings[bisect.bisect_left(bookings, booking)]
+        if not bookings:
+            del self._days[date]
+            del self._longest[date]
+
+    def conflicts(self, date, time_str, procedure, exclude_id=None):
+        """AppointmentIDs whose booked time overlaps the proposed slot, earliest first."""
+        start = parse_minutes(time_str)
+        if start is None:
+            return []
+        end = start + procedure_minutes(procedure)
+        return [appointment_id for booked_start, booked_end, appointment_id in self._overlapping(str(date), start, end)
+                if appointment_id != exclude_id]
+
+    def _overlapping(self, date, start, end):
+        bookings = self._days.get(date, [])
+        low = bisect.bisect_left(bookings, (start - self._longest.get(date, 0), ))
+        high = bisect.bisect_left(bookings, (end, ))
+        return [booking for booking in bookings[low:high] if booking[1] > start]
+
+    def free_slots(self, date, procedure, count=5, after_time=None):
+        """The first ``count`` (date, 'HH:MM') slots on or after ``date`` where the procedure fits."""
+        duration = procedure_minutes(procedure)
+        opens, closes = parse_minutes(CLINIC_OPENS), parse_minutes(CLINIC_CLOSES)
+        day = datetime.strptime(str(date), '%Y-%m-%d').date()
+        earliest = parse_minutes(after_time) if after_time is not None else None
+        slots = []
+        for offset in range(FREE_SLOT_SEARCH_DAYS):
+            current = day + timedelta(days=offset)
+            if current.weekday() not in CLINIC_DAYS:
+                continue
+            date_str = current.strftime('%Y-%m-%d')
+            cursor = opens if offset or earliest is None else max(opens, _round_up(earliest))
+            # Walk the gaps between the day's bookings in start order
+            for booked_start, booked_end, _ in self._days.get(date_str, []) + [(closes, closes, None)]:
+                while cursor + duration <= min(booked_start, closes) and len(slots) < count:
+                    slots.append((date_str, format_minutes(cursor)))
+                    cursor += SLOT_STEP_MINUTES
+                cursor = max(cursor, _round_up(booked_end))
+                if len(slots) == count:
+                    return slots
+        return slots
+
+
+def _round_up(minutes):
+    return -(-minutes // SLOT_STEP_MINUTES) * SLOT_STEP_MINUTES
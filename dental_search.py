@@ -0,0 +1,484 @@
+# dental_search.py
+
+import bisect
+import json
+import math
+import os
+import re
+import sys
+
+# --- Search Configuration ---
+MIN_PHONE_DIGITS = 3  # Shorter digit strings are treated as IDs or name fragments, not phone numbers
+FUZZY_MIN_TOKEN_LENGTH = 3  # Shorter query words only match exactly or as a prefix
+FUZZY_MAX_CANDIDATES = 200  # Name tokens sharing the most trigrams with a misspelt word that get an edit-distance check
+
+# Scores per query token; a patient's rank is the sum over the tokens of the query
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+PHONE_SCORE = 3.0
+
+# --- Clinical Text Search Configuration ---
+TEXT_FIELDS = ('Problem', 'TreatmentPlan', 'Medications')  # Clinical record columns that are searchable
+FIELD_BREAK = '|'  # Stands between two fields in a record's token list, so a phrase never spans fields
+TEXT_INDEX_FORMAT = 1  # Bump when the saved layout or the tokenizer changes; older saved indexes are rebuilt
+# BM25 ranking: how quickly repeats of a word stop adding to the score, and how much long records are discounted
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+_QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')  # A "quoted phrase" or a bare word
+
+
+def _text(value):
+    if value is None or value != value:  # None or NaN: an empty cell
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # A phone column read back as floats
+        value = int(value)
+    return str(value)
+
+
+def name_tokens(text):
+    """Lower-cased word tokens of a name ("O'Neil-Smith" -> ['o', 'neil', 'smith'])."""
+    return _TOKEN_PATTERN.findall(_text(text).lower())
+
+
+def phone_digits(text):
+    """A phone number reduced to its digits, so '(555) 010-2000' and '555.010.2000' are the same key."""
+    return ''.join(character for character in _text(text) if character.isdigit())
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def max_typos(token):
+    """Edits tolerated in a word: one up to 7 letters ("jonh" -> "john"), two beyond."""
+    return 1 if len(token) <= 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance counting a swap of neighbouring letters as one edit; anything above ``limit`` is
+    reported as ``limit + 1`` as soon as it is certain."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    two_back, previous_row, row = None, None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous_row, row = row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], two_back[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        two_back = previous_row
+    return row[-1]
+
+
+def _prefix_range(sorted_keys, prefix):
+    start = bisect.bisect_left(sorted_keys, prefix)
+    end = bisect.bisect_left(sorted_keys, prefix + '\uffff', start)
+    return sorted_keys[start:end]
+
+
+class PatientSearchIndex:
+    """In-memory search index over patient names and phone numbers.
+
+    Name tokens live in a sorted list, so a prefix is a bisect instead of a scan. Each distinct token is also
+    indexed by its trigrams; the tokens sharing the most trigrams with a misspelt word are checked by edit
+    distance, which finds names typed with a typo ("jonh" -> "john"). Phone numbers are indexed by their
+    digits only. ``add``/``remove`` keep it current as patients change; nothing is rebuilt after the first load.
+    """
+
+    def __init__(self):
+        self._patients_by_token = {}  # name token -> set of PatientIDs
+        self._tokens = []  # distinct name tokens, sorted
+        self._tokens_by_trigram = {}  # trigram -> set of name tokens
+        self._patients_by_phone = {}  # phone digits -> set of PatientIDs
+        self._phones = []  # distinct phone digit strings, sorted
+        self._entries = {}  # PatientID -> (name tokens, phone digits), needed to undo an entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, rows):
+        """Index (PatientID, Name, Phone) rows in bulk; the sorted lists are built once at the end."""
+        for patient_id, name, phone in rows:
+            self._add_entry(int(patient_id), name, phone)
+        self._tokens = sorted(self._patients_by_token)
+        self._phones = sorted(self._patients_by_phone)
+
+    def add(self, patient_id, name, phone):
+        patient_id = int(patient_id)
+        self.remove(patient_id)
+        for token in self._add_entry(patient_id, name, phone):
+            bisect.insort(self._tokens, token)
+        digits = self._entries[patient_id][1]
+        if digits and len(self._patients_by_phone[digits]) == 1:
+            bisect.insort(self._phones, digits)
+
+    def remove(self, patient_id):
+        entry = self._entries.pop(int(patient_id), None)
+        if entry is None:
+            return
+        tokens, digits = entry
+        for token in tokens:
+            patients = self._patients_by_token[token]
+            patients.discard(int(patient_id))
+            if not patients:
+                del self._patients_by_token[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+                for trigram in trigrams(token):
+                    self._tokens_by_trigram[trigram].discard(token)
+        if digits:
+            patients = self._patients_by_phone[digits]
+            patients.discard(int(patient_id))
+            if not patients:
+                del self._patients_by_phone[digits]
+                del self._phones[bisect.bisect_left(self._phones, digits)]
+
+    def _add_entry(self, patient_id, name, phone):
+        """Record one patient in the hash maps and return the name tokens that are new to the index."""
+        # "O'Neil" is indexed as "o", "neil" and "oneil", since people type it both ways
+        tokens = set(name_tokens(name)) | set(name_tokens(_text(name).replace("'", '')))
+        digits = phone_digits(phone)
+        self._entries[patient_id] = (tokens, digits)
+        new_tokens = []
+        for token in tokens:
+            if token not in self._patients_by_token:
+                self._patients_by_token[token] = set()
+                new_tokens.append(token)
+                for trigram in trigrams(token):
+                    self._tokens_by_trigram.setdefault(trigram, set()).add(token)
+            self._patients_by_token[token].add(patient_id)
+        if digits:
+            self._patients_by_phone.setdefault(digits, set()).add(patient_id)
+        return new_tokens
+
+    def search(self, query, limit=None):
+        """PatientIDs matching ``query``, best first.
+
+        Every word of the query has to match a name token exactly, as a prefix or approximately; a query of
+        digits also matches phone numbers starting with (or ending in) those digits.
+        """
+        scores = {}
+        digits = phone_digits(query)
+        if len(digits) >= MIN_PHONE_DIGITS and not any(character.isalpha() for character in query):
+            for patient_id, score in self._match_phone(digits).items():
+                scores[patient_id] = scores.get(patient_id, 0.0) + score
+
+        query_tokens = name_tokens(query)
+        if query_tokens:
+            name_scores = None
+            for token in query_tokens:
+                token_scores = self._match_token(token)
+                if name_scores is None:
+                    name_scores = token_scores
+                else:
+                    name_scores = {patient_id: score + token_scores[patient_id]
+                                   for patient_id, score in name_scores.items() if patient_id in token_scores}
+                if not name_scores:
+                    break
+            for patient_id, score in (name_scores or {}).items():
+                scores[patient_id] = max(scores.get(patient_id, 0.0), score)
+
+        ranked = sorted(scores, key=lambda patient_id: (-scores[patient_id], patient_id))
+        return ranked[:limit] if limit is not None else ranked
+
+    def _match_phone(self, digits):
+        matches = {}
+        for number in _prefix_range(self._phones, digits):
+            for patient_id in self._patients_by_phone[number]:
+                matches[patient_id] = PHONE_SCORE if number == digits else PREFIX_SCORE
+        if not matches and len(digits) >= 4:
+            # People often give only the last digits; a suffix needs a scan of the distinct numbers
+            for number in self._phones:
+                if number.endswith(digits):
+                    for patient_id in self._patients_by_phone[number]:
+                        matches[patient_id] = PREFIX_SCORE
+        return matches
+
+    def _match_token(self, token):
+        """PatientID -> best score for one query token: exact, then prefix, then trigram similarity."""
+        matches = {}
+        for candidate in _prefix_range(self._tokens, token):
+            # Shorter completions rank higher: "jo" is closer to "jon" than to "jonathan"
+            score = EXACT_SCORE if candidate == token else PREFIX_SCORE - (len(candidate) - len(token)) / 100
+            for patient_id in self._patients_by_token[candidate]:
+                if score > matches.get(patient_id, 0.0):
+                    matches[patient_id] = score
+        if matches:
+            return matches
+
+        if len(token) < FUZZY_MIN_TOKEN_LENGTH:
+            return matches
+        limit = max_typos(token)
+        shared = {}
+        for trigram in trigrams(token):
+            for candidate in self._tokens_by_trigram.get(trigram, ()):
+                if abs(len(candidate) - len(token)) <= limit:
+                    shared[candidate] = shared.get(candidate, 0) + 1
+        for candidate in sorted(shared, key=shared.get, reverse=True)[:FUZZY_MAX_CANDIDATES]:
+            distance = edit_distance(token, candidate, limit)
+            if distance > limit:
+                continue
+            # Always below a prefix match; fewer edits and longer words rank higher
+            similarity = 1.0 - distance / max(len(token), len(candidate))
+            for patient_id in self._patients_by_token[candidate]:
+                if similarity > matches.get(patient_id, 0.0):
+                    matches[patient_id] = similarity
+        return matches
+
+
+class PatientSearchMirror:
+    """A PatientSearchIndex of its own for the search worker, kept in step with copies of the patient rows.
+
+    The store's index changes on the Tk thread with every commit, so the worker does not read it. It is given a copy
+    of the (PatientID, Name, Phone) rows taken on the Tk thread instead, and only the patients added, changed or
+    removed since the previous copy are re-indexed; the full build happens once. Matches are those of find_patients,
+    typos included. Only ever used from one thread.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.patients = None  # The rows the index is in step with
+        self._positions = None  # PatientID -> row position in ``patients``
+
+    def search(self, patients, query, cancelled=None):
+        """Rows of ``patients`` matching ``query``, best first; None once ``cancelled()`` is true (a newer query)."""
+        cancelled = cancelled or (lambda: False)
+        self._sync(patients)
+        if cancelled():
+            return None
+        patient_ids = ranked_patient_ids(self.index, query, self._positions.__contains__)
+        if cancelled():
+            return None
+        return patients.iloc[[self._positions[patient_id] for patient_id in patient_ids]]
+
+    def _sync(self, patients):
+        if patients is self.patients:
+            return
+        rows = patients[['PatientID', 'Name', 'Phone']]
+        if self.index is None:
+            self.index = PatientSearchIndex()
+            self.index.build(rows.itertuples(index=False))
+        else:
+            both = self.patients[['PatientID', 'Name', 'Phone']].merge(rows, on='PatientID', how='outer',
+                                                                     suffixes=('_old', ''), indicator=True)
+            for patient_id in both.loc[both['_merge'] == 'left_only', 'PatientID'].tolist():
+                self.index.remove(patient_id)
+            edited = ((both['Name_old'].fillna('') != both['Name'].fillna(''))
+                      | (both['Phone_old'].fillna('') != both['Phone'].fillna('')))
+            changed = both[(both['_merge'] == 'right_only') | ((both['_merge'] == 'both') & edited)]
+            for patient_id, name, phone in changed[['PatientID', 'Name', 'Phone']].itertuples(index=False):
+                self.index.add(patient_id, name, phone)
+        self.patients = patients
+        self._positions = {patient_id: position for position, patient_id in enumerate(rows['PatientID'].tolist())}
+
+
+def ranked_patient_ids(search_index, search_term, patient_exists):
+    """Search results with an exact Patient ID match, if the term is one, placed first."""
+    patient_ids = search_index.search(search_term)
+    if search_term.strip().isdigit() and patient_exists(int(search_term)):
+        patient_ids = [int(search_term)] + [patient_id for patient_id in patient_ids if patient_id != int(search_term)]
+    return patient_ids
+
+
+def text_tokens(value):
+    """Case-folded word tokens ("Amoxicillin 500mg" -> ['amoxicillin', '500mg'])."""
+    return _TOKEN_PATTERN.findall(_text(value).casefold())
+
+
+def parse_text_query(query):
+    """Query text -> clauses, each (tokens, is_prefix): "a phrase" in quotes, plain words, or a word* prefix."""
+    clauses = []
+    for phrase, word in _QUERY_PATTERN.findall(query or ''):
+        tokens = tuple(text_tokens(phrase if phrase else word))
+        if tokens:
+            clauses.append((tokens, bool(word) and word.endswith('*') and len(tokens) == 1))
+    return clauses
+
+
+class ClinicalTextIndex:
+    """Inverted index over the Problem, TreatmentPlan and Medications text of clinical records.
+
+    Each token maps to the records containing it and how often; each record keeps its token sequence (fields
+    separated by FIELD_BREAK) for phrase checks, its Date for date filters and its Version. A query's words and
+    "quoted phrases" must all match; results are ranked by BM25. ``add``/``remove`` keep it current as records
+    change. The Versions let a saved copy be brought up to date (``stale_ids``) instead of rebuilt.
+    """
+
+    def __init__(self):
+        self._postings = {}  # token -> {RecordID: occurrences}
+        self._tokens = []  # distinct tokens, sorted, for prefix queries
+        self._entries = {}  # RecordID -> (Date, Version, token tuple)
+        self._total_length = 0
+        self.dirty = False  # Changed since it was last saved
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, rows):
+        """Index (RecordID, Date, Version, Problem, TreatmentPlan, Medications) rows in bulk."""
+        known = {}  # Field text -> its tokens: medications and plans repeat across many records
+        for record_id, date, version, *fields in rows:
+            self._add_entry(int(record_id), _text(date), int(version), _record_tokens(fields, known))
+        self._tokens = sorted(self._postings)
+        self.dirty = True
+
+    def add(self, record_id, date, version, problem, treatment, medications):
+        record_id = int(record_id)
+        self.remove(record_id)
+        for token in self._add_entry(record_id, _text(date), int(version),
+                                     _record_tokens((problem, treatment, medications), {})):
+            bisect.insort(self._tokens, token)
+        self.dirty = True
+
+    def remove(self, record_id):
+        entry = self._entries.pop(int(record_id), None)
+        if entry is None:
+            return
+        self.dirty = True
+        tokens = entry[2]
+        self._total_length -= len(tokens)
+        for token in set(tokens) - {FIELD_BREAK}:
+            records = self._postings[token]
+            records.pop(int(record_id), None)
+            if not records:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _add_entry(self, record_id, date, version, tokens):
+        """Record one record in the postings and return the tokens that are new to the index."""
+        self._entries[record_id] = (date, version, tokens)
+        self._total_length += len(tokens)
+        new_tokens = []
+        for token in tokens:
+            if token == FIELD_BREAK:
+                continue
+            records = self._postings.get(token)
+            if records is None:
+                records = self._postings[token] = {}
+                new_tokens.append(token)
+            records[record_id] = records.get(record_id, 0) + 1
+        return new_tokens
+
+    def stale_ids(self, versions):
+        """Given {RecordID: Version} of the records on file, drop the records that are gone and return the IDs
+        that are missing or out of date here, which the caller re-adds."""
+        for record_id in [record_id for record_id in self._entries if record_id not in versions]:
+            self.remove(record_id)
+        return [record_id for record_id, version in versions.items()
+                if self._entries.get(record_id, (None, None))[1] != version]
+
+    def search(self, query, first_date=None, last_date=None, limit=None):
+        """(RecordID, score) pairs for the records matching every clause of ``query``, best first.
+
+        ``first_date``/``last_date`` (YYYY-MM-DD, inclusive) restrict the records considered. Ties go to the more
+        recent record.
+        """
+        clauses = parse_text_query(query)
+        if not clauses:
+            return []
+        matches = [self._match_clause(tokens, is_prefix) for tokens, is_prefix in clauses]
+        matches.sort(key=len)
+        candidates = set(matches[0])
+        for clause_matches in matches[1:]:
+            candidates.intersection_update(clause_matches)
+            if not candidates:
+                return []
+
+        total = len(self._entries)
+        average_length = self._total_length / total if total else 1.0
+        scores = {}
+        for record_id in candidates:
+            date, _, tokens = self._entries[record_id]
+            if (first_date and date < first_date) or (last_date and date > last_date):
+                continue
+            length_factor = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average_length)
+            score = 0.0
+            for clause_matches in matches:
+                idf = math.log(1 + (total - len(clause_matches) + 0.5) / (len(clause_matches) + 0.5))
+                frequency = clause_matches[record_id]
+                score += idf * frequency * (BM25_K1 + 1) / (frequency + length_factor)
+            scores[record_id] = score
+        ranked = sorted(scores, key=lambda record_id: (scores[record_id], self._entries[record_id][0], record_id),
+                        reverse=True)
+        ranked = ranked[:limit] if limit is not None else ranked
+        return [(record_id, scores[record_id]) for record_id in ranked]
+
+    def _match_clause(self, tokens, is_prefix):
+        """RecordID -> occurrences of one clause: a word, a word prefix or a phrase."""
+        if is_prefix:
+            matches = {}
+            for candidate in _prefix_range(self._tokens, tokens[0]):
+                for record_id, count in self._postings[candidate].items():
+                    matches[record_id] = matches.get(record_id, 0) + count
+            return matches
+        if len(tokens) == 1:
+            return self._postings.get(tokens[0], {})
+        # A phrase: records holding every word, then checked for the words side by side
+        postings = sorted((self._postings.get(token, {}) for token in set(tokens)), key=len)
+        matches = {}
+        for record_id in postings[0]:
+            if all(record_id in records for records in postings[1:]):
+                count = _phrase_count(self._entries[record_id][2], tokens)
+                if count:
+                    matches[record_id] = count
+        return matches
+
+    def save(self, path):
+        """Write the index to ``path`` (via a temp file, so a reader never sees half of it)."""
+        records = [[record_id, date, version, ' '.join(tokens)]
+                   for record_id, (date, version, tokens) in list(self._entries.items())]
+        self.dirty = False  # Before writing: a change made meanwhile (from another thread) marks it dirty again
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as index_file:
+                json.dump({'format': TEXT_INDEX_FORMAT, 'records': records}, index_file, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError:
+            self.dirty = True
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """The index saved at ``path``, or None if there is none (or it is unreadable or an older format)."""
+        try:
+            with open(path, encoding='utf-8') as index_file:
+                saved = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(saved, dict) or saved.get('format') != TEXT_INDEX_FORMAT:
+            return None
+        index = cls()
+        known = {}
+        for record_id, date, version, text in saved['records']:
+            tokens = known.get(text)
+            if tokens is None:
+                tokens = known[text] = tuple(sys.intern(token) for token in text.split(' ')) if text else ()
+            index._add_entry(record_id, date, version, tokens)
+        index._tokens = sorted(index._postings)
+        return index
+
+
+def _record_tokens(fields, known):
+    """A record's tokens, field after field; ``known`` caches the (interned) tokens of field texts seen before."""
+    tokens = ()
+    for field in fields:
+        field_tokens = known.get(field)
+        if field_tokens is None:
+            field_tokens = tuple(sys.intern(token) for token in text_tokens(field))
+            if isinstance(field, str):
+                known[field] = field_tokens
+        if tokens:
+            tokens += (FIELD_BREAK,)
+        tokens += field_tokens
+    return tokens
+
+
+def _phrase_count(tokens, phrase):
+    width = len(phrase)
+    return sum(1 for start in range(len(tokens) - width + 1) if tokens[start:start + width] == phrase)
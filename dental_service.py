@@ -0,0 +1,633 @@
+# dental_service.py
+
+import asyncio
+import http.client
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pandas as pd
+
+from dental_core import (DentalPractice, DoubleBookingError, NotFoundError, ValidationError, validate_date,
+                         validate_time)
+from dental_lock import ConflictError, LockTimeout
+from dental_store import ALL_TABLES, open_store
+
+# --- Service Configuration ---
+SERVICE_HOST = '127.0.0.1'  # Local connections only; the service has no authentication
+SERVICE_PORT = int(os.environ.get('DENTAL_SERVICE_PORT', 8765))
+SERVICE_URL = os.environ.get('DENTAL_SERVICE_URL', f'http://{SERVICE_HOST}:{SERVICE_PORT}')
+CHANGE_POLL_SECONDS = 2  # Pick up edits made directly on the data folder by workstations not using the service
+COMPACT_INTERVAL_SECONDS = 10 * 60
+CHANGE_LOG_LENGTH = 1000  # Changes remembered for /changes; a client further behind refreshes everything
+MAX_BODY_BYTES = 1024 * 1024
+CLIENT_TIMEOUT_SECONDS = 30
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ServiceError(OSError):
+    """The service answered with an error the client has no better exception for."""
+
+
+def _plain(value):
+    """A cell as a JSON value: numpy scalars become Python ones, NaN becomes null."""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _row(row):
+    return None if row is None else {column: _plain(value) for column, value in row.items()}
+
+
+def _frame(df):
+    """A DataFrame as {"columns": [...], "rows": [[...], ...]}; much smaller than one object per row."""
+    return {'columns': [str(column) for column in df.columns],
+            'rows': [[_plain(value) for value in row] for row in df.itertuples(index=False, name=None)]}
+
+
+class PracticeService:
+    """Local HTTP/JSON front end to one DentalPractice, shared by GUI clients, kiosks and scripts.
+
+    Requests are parsed on the asyncio loop, but every call into the practice runs on a single owner thread, so
+    writes are applied one at a time in arrival order and the in-memory tables are never read mid-change. Each
+    write is numbered; clients poll ``/changes?since=N`` to learn which tables to refresh.
+    """
+
+    ROUTES = [
+        ('GET', r'/patients', 'list_patients'),
+        ('POST', r'/patients', 'add_patient'),
+        ('GET', r'/patients/search', 'find_patients'),
+        ('GET', r'/patients/registered', 'patients_registered_between'),
+        ('GET', r'/patients/(\d+)', 'get_patient'),
+        ('PUT', r'/patients/(\d+)', 'update_patient'),
+        ('DELETE', r'/patients/(\d+)', 'delete_patient'),
+        ('GET', r'/patients/(\d+)/records', 'patient_records'),
+        ('GET', r'/appointments', 'list_appointments'),
+        ('POST', r'/appointments', 'schedule_appointment'),
+        ('GET', r'/appointments/free-slots', 'free_slots'),
+        ('GET', r'/appointments/conflicts', 'booking_conflicts'),
+        ('GET', r'/appointments/(\d+)', 'get_appointment'),
+        ('PUT', r'/appointments/(\d+)', 'update_appointment'),
+        ('DELETE', r'/appointments/(\d+)', 'delete_appointment'),
+        ('GET', r'/records', 'records_between'),
+        ('POST', r'/records', 'add_clinical_record'),
+        ('GET', r'/records/search', 'search_records'),
+        ('GET', r'/records/(\d+)', 'get_record'),
+        ('PUT', r'/records/(\d+)', 'update_clinical_record'),
+        ('DELETE', r'/records/(\d+)', 'delete_clinical_record'),
+        ('GET', r'/deleted', 'recently_deleted'),
+        ('POST', r'/deleted/(patients|appointments|clinical)/(\d+)/restore', 'restore_deleted'),
+        ('GET', r'/reports', 'monthly_report'),
+        ('GET', r'/call-lists', 'call_lists'),
+        ('GET', r'/changes', 'changes'),
+        ('POST', r'/save', 'save'),
+    ]
+
+    def __init__(self, practice, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.practice = practice
+        self.host = host
+        self.port = port
+        self.server = None
+        self.change_count = 0
+        self._change_log = deque(maxlen=CHANGE_LOG_LENGTH)  # (change number, tables)
+        self._routes = [(method, re.compile(pattern + '$'), name) for method, pattern, name in self.ROUTES]
+        # The single owner of the dataset: calls are queued to this thread, never run side by side
+        self._owner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dental-owner')
+        self._tasks = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._owner, self._open)
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # The real port when started with port 0
+        self._tasks = [loop.create_task(self._every(CHANGE_POLL_SECONDS, self._poll)),
+                       loop.create_task(self._every(COMPACT_INTERVAL_SECONDS, self._compact))]
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(self._owner, self.practice.close)
+        self._owner.shutdown()
+
+    def _open(self):
+        self.practice.setup()
+        self.practice.load()
+        self.practice.start_background_writer()
+
+    async def _every(self, seconds, job):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(seconds)
+            try:
+                await loop.run_in_executor(self._owner, job)
+            except (OSError, LockTimeout) as error:
+                print(f"Background job failed and will be retried: {error}", file=sys.stderr)
+
+    def _poll(self):
+        self._record_change(self.practice.poll_changes())
+
+    def _compact(self):
+        # One batch of expired deletes and of old history per run, so the owner thread is never tied up for long
+        self.practice.purge_deleted()
+        self.practice.archive_old_history()
+        if self.practice.pending_changes:
+            self.practice.save()
+
+    def _record_change(self, tables):
+        if tables:
+            self.change_count += 1
+            self._change_log.append((self.change_count, frozenset(tables)))
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {'error': 'Request body too large.'}
+                    body = None
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                if body is not None:
+                    status, payload = await self._dispatch(method, target, body)
+                # After a refused body the stream is out of step, so the connection has to end
+                keep_alive = (body is not None and version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                             + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        allowed = False
+        for route_method, pattern, name in self._routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            allowed = True
+            if route_method == method:
+                break
+        else:
+            return (405, {'error': f'{method} not allowed.'}) if allowed else (404, {'error': 'No such resource.'})
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {'error': 'Request body is not valid JSON.'}
+        if not isinstance(params, dict):
+            return 400, {'error': 'Request body must be a JSON object.', 'kind': 'validation'}
+        handler = getattr(self, name)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._owner, handler, match.groups(),
+                                                                       query, params)
+        except ValidationError as error:
+            return 400, {'error': str(error), 'kind': 'validation'}
+        except NotFoundError as error:
+            return 404, {'error': str(error), 'kind': 'not_found'}
+        except DoubleBookingError as error:
+            return 409, {'error': str(error), 'kind': 'double_booking', 'date': error.date, 'time': error.time,
+                         'conflicts': [_row(row) for row in error.conflicts], 'free_slots': error.free_slots}
+        except ConflictError as error:
+            return 409, {'error': str(error), 'kind': 'conflict'}
+        except LockTimeout as error:
+            return 503, {'error': str(error), 'kind': 'lock_timeout'}
+        except Exception as error:
+            # Requests are checked by each handler first, so anything else is a fault of the service itself
+            return 500, {'error': f'{type(error).__name__}: {error}'}
+        return 200, result
+
+    # --- Handlers (run on the owner thread) ---
+
+    def list_patients(self, groups, query, params):
+        if 'offset' not in query:
+            return {'count': self.practice.patient_count()}
+        return _frame(self.practice.patients_page(_integer(query['offset'], 'offset'),
+                                                  _integer(query.get('limit', 100), 'limit'),
+                                                  query.get('sort') or None, query.get('descending') == '1'))
+
+    def find_patients(self, groups, query, params):
+        return _frame(self.practice.find_patients(query.get('q', '')))
+
+    def patients_registered_between(self, groups, query, params):
+        return _frame(self.practice.patients_registered_between(*_date_range(query)))
+
+    def get_patient(self, groups, query, params):
+        return self._found(self.practice.get_patient(int(groups[0])), 'Patient', groups[0])
+
+    def add_patient(self, groups, query, params):
+        patient = self.practice.add_patient(params.get('Name'), params.get('Phone'), params.get('MedicalNotes', ''))
+        self._record_change(('patients', ))
+        return _row(patient)
+
+    def update_patient(self, groups, query, params):
+        patient = self.practice.update_patient(int(groups[0]), params.get('Name'), params.get('Phone'),
+                                               params.get('MedicalNotes', ''), _expected_version(params))
+        self._record_change(('patients', ))
+        return _row(patient)
+
+    def delete_patient(self, groups, query, params):
+        patient = self.practice.delete_patient(int(groups[0]), _expected_version(query))
+        # Their appointments and records go with them
+        self._record_change(ALL_TABLES)
+        return _row(patient)
+
+    def patient_records(self, groups, query, params):
+        return _frame(self.practice.patient_records(int(groups[0]), query.get('archive') == '1'))
+
+    def list_appointments(self, groups, query, params):
+        if 'date' in query:
+            return _frame(self.practice.appointments_on(validate_date(query['date'])))
+        return _frame(self.practice.appointments_between(*_date_range(query)))
+
+    def free_slots(self, groups, query, params):
+        after = validate_time(query['after']) if query.get('after') else None
+        return [list(slot) for slot in self.practice.free_slots(_field(query, 'date'), query.get('procedure', ''),
+                                                                _integer(query.get('count', 5), 'count'), after)]
+
+    def booking_conflicts(self, groups, query, params):
+        exclude_id = _optional_integer(query.get('exclude'), 'exclude')
+        date, time = validate_date(_field(query, 'date')), validate_time(_field(query, 'time'))
+        return [_row(row) for row in self.practice.booking_conflicts(date, time,
+                                                                     query.get('procedure', ''), exclude_id)]
+
+    def get_appointment(self, groups, query, params):
+        return self._found(self.practice.get_appointment(int(groups[0])), 'Appointment', groups[0])
+
+    def schedule_appointment(self, groups, query, params):
+        appointment = self.practice.schedule_appointment(_integer(params.get('PatientID'), 'PatientID'),
+                                                         params.get('Date'), params.get('Time'),
+                                                         params.get('Procedure', ''),
+                                                         bool(params.get('allow_double_booking')))
+        self._record_change(('appointments', ))
+        return _row(appointment)
+
+    def update_appointment(self, groups, query, params):
+        appointment = self.practice.update_appointment(int(groups[0]), params.get('Date'), params.get('Time'),
+                                                       params.get('Procedure', ''), _expected_version(params),
+                                                       bool(params.get('allow_double_booking')))
+        self._record_change(('appointments', ))
+        return _row(appointment)
+
+    def delete_appointment(self, groups, query, params):
+        appointment = self.practice.delete_appointment(int(groups[0]), _expected_version(query))
+        self._record_change(('appointments', ))
+        return _row(appointment)
+
+    def records_between(self, groups, query, params):
+        return _frame(self.practice.records_between(*_date_range(query)))
+
+    def add_clinical_record(self, groups, query, params):
+        record = self.practice.add_clinical_record(_integer(params.get('PatientID'), 'PatientID'),
+                                                   params.get('Problem'), params.get('TreatmentPlan', ''),
+                                                   params.get('Medications', ''), params.get('Date'))
+        self._record_change(('clinical', ))
+        return _row(record)
+
+    def get_record(self, groups, query, params):
+        return self._found(self.practice.get_record(int(groups[0])), 'Record', groups[0])
+
+    def update_clinical_record(self, groups, query, params):
+        record = self.practice.update_clinical_record(int(groups[0]), params.get('Problem'),
+                                                      params.get('TreatmentPlan', ''), params.get('Medications', ''),
+                                                      _expected_version(params))
+        self._record_change(('clinical', ))
+        return _row(record)
+
+    def delete_clinical_record(self, groups, query, params):
+        record = self.practice.delete_clinical_record(int(groups[0]), _expected_version(query))
+        self._record_change(('clinical', ))
+        return _row(record)
+
+    def search_records(self, groups, query, params):
+        return _frame(self.practice.search_records(query.get('q', ''), query.get('from') or None,
+                                                   query.get('to') or None))
+
+    def recently_deleted(self, groups, query, params):
+        return _frame(self.practice.recently_deleted())
+
+    def restore_deleted(self, groups, query, params):
+        restored = self.practice.restore_deleted(groups[0], int(groups[1]), bool(params.get('allow_double_booking')))
+        # Restoring a patient brings back rows in every table
+        self._record_change(ALL_TABLES)
+        return _row(restored)
+
+    def monthly_report(self, groups, query, params):
+        return {name: _frame(df) for name, df in self.practice.monthly_report(query.get('month') or None).items()}
+
+    def call_lists(self, groups, query, params):
+        return {name: _frame(df) for name, df in self.practice.call_lists(query.get('date') or None).items()}
+
+    def changes(self, groups, query, params):
+        """The tables changed after change number ``since`` (all of them if that is too far back)."""
+        since = _integer(query.get('since', self.change_count), 'since')
+        if since < self.change_count - len(self._change_log):
+            tables = set(ALL_TABLES)
+        else:
+            tables = set().union(*(changed for number, changed in self._change_log if number > since))
+        return {'change': self.change_count, 'tables': sorted(tables)}
+
+    def save(self, groups, query, params):
+        self.practice.save()
+        return {}
+
+    @staticmethod
+    def _found(row, label, row_id):
+        if row is None:
+            raise NotFoundError(f"{label} {row_id} not found.")
+        return _row(row)
+
+
+class PracticeClient:
+    """The DentalPractice interface, served by a PracticeService over HTTP.
+
+    Raises the same exceptions as DentalPractice (ValidationError, NotFoundError, DoubleBookingError,
+    ConflictError, LockTimeout), so the GUI works the same against either. Not thread-safe: one client per thread.
+    """
+
+    pending_changes = 0  # The service owns the journal and compacts it
+
+    def __init__(self, url=SERVICE_URL):
+        parts = urlsplit(url)
+        self.host = parts.hostname or SERVICE_HOST
+        self.port = parts.port or SERVICE_PORT
+        self._connection = None
+        self._change = None
+
+    # --- Lifecycle ---
+
+    def setup(self):
+        self._change = self._request('GET', '/changes')['change']
+
+    def load(self, tables=None):
+        pass
+
+    def start_background_writer(self, on_error=None):
+        pass
+
+    def save(self):
+        self._request('POST', '/save')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def poll_changes(self):
+        """Tables changed by anyone (this client included) since the last poll."""
+        result = self._request('GET', '/changes', {'since': self._change})
+        self._change = result['change']
+        return set(result['tables'])
+
+    # --- Patients ---
+
+    def get_patient(self, patient_id):
+        return self._get_or_none(f'/patients/{int(patient_id)}')
+
+    def patient_count(self):
+        return self._request('GET', '/patients')['count']
+
+    def patients_page(self, offset, limit, sort_column=None, descending=False):
+        return self._frame('/patients', {'offset': offset, 'limit': limit, 'sort': sort_column or '',
+                                         'descending': int(bool(descending))})
+
+    def all_patients(self):
+        return self.patients_page(0, self.patient_count())
+
+    def patients_registered_between(self, first_date, last_date):
+        return self._frame('/patients/registered', {'from': first_date, 'to': last_date})
+
+    def find_patients(self, search_term):
+        return self._frame('/patients/search', {'q': search_term})
+
+    def add_patient(self, name, phone, notes=''):
+        return self._request('POST', '/patients', body={'Name': name, 'Phone': phone, 'MedicalNotes': notes})
+
+    def update_patient(self, patient_id, name, phone, notes='', expected_version=None):
+        return self._request('PUT', f'/patients/{int(patient_id)}',
+                             body={'Name': name, 'Phone': phone, 'MedicalNotes': notes,
+                                   'expected_version': _plain(expected_version)})
+
+    def delete_patient(self, patient_id, expected_version=None):
+        return self._request('DELETE', f'/patients/{int(patient_id)}', _version_query(expected_version))
+
+    # --- Appointments ---
+
+    def get_appointment(self, appointment_id):
+        return self._get_or_none(f'/appointments/{int(appointment_id)}')
+
+    def appointments_on(self, date):
+        return self._frame('/appointments', {'date': date})
+
+    def appointments_between(self, first_date, last_date):
+        return self._frame('/appointments', {'from': first_date, 'to': last_date})
+
+    def free_slots(self, date, procedure, count=5, after_time=None):
+        query = {'date': date, 'procedure': procedure, 'count': count}
+        if after_time is not None:
+            query['after'] = after_time
+        return [tuple(slot) for slot in self._request('GET', '/appointments/free-slots', query)]
+
+    def booking_conflicts(self, date, time, procedure, exclude_id=None):
+        return self._request('GET', '/appointments/conflicts', {'date': date, 'time': time, 'procedure': procedure,
+                                                                 'exclude': exclude_id or ''})
+
+    def schedule_appointment(self, patient_id, date, time, procedure, allow_double_booking=False):
+        return self._request('POST', '/appointments',
+                             body={'PatientID': int(patient_id), 'Date': date, 'Time': time, 'Procedure': procedure,
+                                   'allow_double_booking': allow_double_booking})
+
+    def update_appointment(self, appointment_id, date, time, procedure, expected_version=None,
+                           allow_double_booking=False):
+        return self._request('PUT', f'/appointments/{int(appointment_id)}',
+                             body={'Date': date, 'Time': time, 'Procedure': procedure,
+                                   'expected_version': _plain(expected_version),
+                                   'allow_double_booking': allow_double_booking})
+
+    def delete_appointment(self, appointment_id, expected_version=None):
+        return self._request('DELETE', f'/appointments/{int(appointment_id)}', _version_query(expected_version))
+
+    # --- Clinical Records ---
+
+    def get_record(self, record_id):
+        return self._get_or_none(f'/records/{int(record_id)}')
+
+    def patient_records(self, patient_id, include_archive=False):
+        return self._frame(f'/patients/{int(patient_id)}/records', {'archive': int(bool(include_archive))})
+
+    def records_between(self, first_date, last_date):
+        return self._frame('/records', {'from': first_date, 'to': last_date})
+
+    def add_clinical_record(self, patient_id, problem, treatment='', medications='', date=None):
+        return self._request('POST', '/records', body={'PatientID': int(patient_id), 'Problem': problem,
+                                                       'TreatmentPlan': treatment, 'Medications': medications,
+                                                       'Date': date})
+
+    def update_clinical_record(self, record_id, problem, treatment='', medications='', expected_version=None):
+        return self._request('PUT', f'/records/{int(record_id)}',
+                             body={'Problem': problem, 'TreatmentPlan': treatment, 'Medications': medications,
+                                   'expected_version': _plain(expected_version)})
+
+    def delete_clinical_record(self, record_id, expected_version=None):
+        return self._request('DELETE', f'/records/{int(record_id)}', _version_query(expected_version))
+
+    def search_records(self, query, first_date=None, last_date=None):
+        params = {'q': query}
+        if first_date:
+            params['from'] = first_date
+        if last_date:
+            params['to'] = last_date
+        return self._frame('/records/search', params)
+
+    # --- Recently Deleted ---
+
+    def recently_deleted(self):
+        return self._frame('/deleted')
+
+    def restore_deleted(self, table, item_id, allow_double_booking=False):
+        return self._request('POST', f'/deleted/{table}/{int(item_id)}/restore',
+                             body={'allow_double_booking': allow_double_booking})
+
+    def purge_deleted(self):
+        return 0  # The service purges on its own schedule
+
+    def archive_old_history(self):
+        return 0  # And archives on it too
+
+    # --- Reports ---
+
+    def monthly_report(self, month=None):
+        reports = self._request('GET', '/reports', {'month': month} if month else None)
+        return {name: pd.DataFrame(table['rows'], columns=table['columns']) for name, table in reports.items()}
+
+    def call_lists(self, date=None):
+        lists = self._request('GET', '/call-lists', {'date': date} if date else None)
+        return {name: pd.DataFrame(table['rows'], columns=table['columns']) for name, table in lists.items()}
+
+    # --- HTTP ---
+
+    def _frame(self, path, query=None):
+        table = self._request('GET', path, query)
+        return pd.DataFrame(table['rows'], columns=table['columns'])
+
+    def _get_or_none(self, path):
+        try:
+            return self._request('GET', path)
+        except NotFoundError:
+            return None
+
+    def _request(self, method, path, query=None, body=None):
+        if query:
+            path += '?' + urlencode(query)
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        for attempt in (1, 2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=CLIENT_TIMEOUT_SECONDS)
+            try:
+                self._connection.request(method, path, body=data, headers=headers)
+                response = self._connection.getresponse()
+                payload = json.loads(response.read() or b'null')
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The service closed an idle keep-alive connection; reconnect once
+                self.close()
+                if attempt == 2:
+                    raise
+        if response.status == 200:
+            return payload
+        message, kind = payload.get('error', response.reason), payload.get('kind')
+        if response.status == 400:
+            raise ValidationError(message)
+        if response.status == 404:
+            raise NotFoundError(message)
+        if kind == 'double_booking':
+            raise DoubleBookingError(payload['date'], payload['time'], payload['conflicts'],
+                                     [tuple(slot) for slot in payload['free_slots']])
+        if kind == 'conflict':
+            raise ConflictError(message)
+        if kind == 'lock_timeout':
+            raise LockTimeout(message)
+        raise ServiceError(f"{response.status} {response.reason}: {message}")
+
+
+# --- Request Checks (a malformed request is the client's mistake: ValidationError, answered with 400) ---
+
+def _field(values, name):
+    if values.get(name) in (None, ''):
+        raise ValidationError(f"'{name}' is required.")
+    return values[name]
+
+
+def _integer(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"'{name}' must be a whole number.") from None
+
+
+def _optional_integer(value, name):
+    return None if value in (None, '') else _integer(value, name)
+
+
+def _expected_version(values):
+    """The Version a change was based on, from the query string (deletes) or the body (updates)."""
+    return _optional_integer(values.get('expected_version'), 'expected_version')
+
+
+def _date_range(query):
+    return validate_date(_field(query, 'from')), validate_date(_field(query, 'to'))
+
+
+def _version_query(expected_version):
+    return {'expected_version': int(expected_version)} if expected_version is not None else None
+
+
+if __name__ == "__main__":
+    # Usage: python dental_service.py [port]   (storage backend from DENTAL_STORAGE, as for the GUI)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else SERVICE_PORT
+    service = PracticeService(DentalPractice(open_store(os.environ.get('DENTAL_STORAGE', 'csv'))), port=port)
+    print(f"Serving the practice data on http://{SERVICE_HOST}:{port} (Ctrl+C to stop)")
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
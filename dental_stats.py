@@ -0,0 +1,178 @@
+# dental_stats.py
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# --- Dashboard Statistics Configuration ---
+OPEN_PLAN_DAYS = 365  # A treatment plan not followed by another visit within this long counts as lapsed, not open
+LAST_DATE = '9999-12-31'  # Open end of "from then on"
+STATS_TABLES = ('patients', 'appointments', 'clinical')
+
+
+def _text(value):
+    return '' if value is None or value != value else str(value)
+
+
+class DashboardStats:
+    """The dashboard's counters, kept current by deltas rather than recounted from the tables.
+
+    - appointments today and this week (Monday to Sunday), and this month's appointments by procedure
+    - patients registered this month
+    - open treatment plans: patients whose latest record (within OPEN_PLAN_DAYS) has a treatment plan
+
+    ``load`` reads only what the counters cover (this week's and month's appointments, this month's registrations,
+    the last OPEN_PLAN_DAYS of records) and runs in full at startup. After that every add, edit and delete made in
+    the app is passed in as a delta. Tables changed on another workstation are marked with ``invalidate`` (their
+    rows are not known here) and read again by the next ``figures``, as is everything once the date moves on and
+    the week or month with it.
+    """
+
+    def __init__(self, practice):
+        self.practice = practice
+        self.today = None
+        self.week = self.month = (None, None)  # (first, last) dates
+        self.plans_since = None
+        self._stale = set(STATS_TABLES)
+        self._appointments = {}  # AppointmentID -> (PatientID, Date, Procedure), this week and this month only
+        self._procedures_by_date = {}  # Date -> Counter of procedures
+        self._new_patients = set()  # PatientIDs registered this month
+        self._records = {}  # RecordID -> (PatientID, Date, has a treatment plan), since plans_since
+        self._records_by_patient = {}  # PatientID -> set of RecordIDs
+        self._open_plans = set()  # PatientIDs whose latest record has a treatment plan
+
+    # --- Full Reads ---
+
+    def load(self, tables=STATS_TABLES, today=None):
+        """Read the rows behind the counters of ``tables`` (all of them when the date has moved on)."""
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        if today != self.today:
+            self._set_today(today)
+            tables = STATS_TABLES
+        if 'appointments' in tables:
+            self._appointments, self._procedures_by_date = {}, {}
+            first, last = min(self.week[0], self.month[0]), max(self.week[1], self.month[1])
+            appointments = self.practice.appointments_between(first, last)
+            for row in appointments[['AppointmentID', 'PatientID', 'Date', 'Procedure']].itertuples(index=False):
+                self._add_appointment(int(row.AppointmentID), int(row.PatientID), str(row.Date), _text(row.Procedure))
+        if 'patients' in tables:
+            patients = self.practice.patients_registered_between(*self.month)
+            self._new_patients = set(patients['PatientID'].astype(int).tolist())
+        if 'clinical' in tables:
+            records = self.practice.records_between(self.plans_since, LAST_DATE)
+            records = pd.DataFrame({'RecordID': records['RecordID'].astype('int64'),
+                                    'PatientID': records['PatientID'].astype('int64'),
+                                    'Date': records['Date'].astype(str),
+                                    'Plan': records['TreatmentPlan'].fillna('').astype(str).str.strip() != ''})
+            # Columns to lists once, rather than a Python step per field per row
+            record_ids, patient_ids = records['RecordID'].tolist(), records['PatientID'].tolist()
+            self._records = dict(zip(record_ids, zip(patient_ids, records['Date'].tolist(), records['Plan'].tolist())))
+            self._records_by_patient = {}
+            for record_id, patient_id in zip(record_ids, patient_ids):
+                self._records_by_patient.setdefault(patient_id, set()).add(record_id)
+            # Same rule as _update_open_plan, for every patient at once: the latest record by date, then by ID
+            latest = records.sort_values(by=['Date', 'RecordID'], kind='stable').groupby('PatientID').tail(1)
+            self._open_plans = set(latest.loc[latest['Plan'], 'PatientID'].tolist())
+        self._stale.difference_update(tables)
+
+    def invalidate(self, tables):
+        """Tables changed elsewhere; their counters are read again before they are next shown."""
+        self._stale.update(tables)
+
+    def _set_today(self, today):
+        day = datetime.strptime(today, "%Y-%m-%d")
+        monday = day - timedelta(days=day.weekday())
+        first_of_month = day.replace(day=1)
+        last_of_month = (first_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        self.today = today
+        self.week = (monday.strftime("%Y-%m-%d"), (monday + timedelta(days=6)).strftime("%Y-%m-%d"))
+        self.month = (first_of_month.strftime("%Y-%m-%d"), last_of_month.strftime("%Y-%m-%d"))
+        self.plans_since = (day - timedelta(days=OPEN_PLAN_DAYS)).strftime("%Y-%m-%d")
+
+    # --- Deltas (ignored until the first load, which reads them anyway) ---
+
+    def appointment_saved(self, row):
+        """An appointment row as added or edited."""
+        appointment_id = int(row['AppointmentID'])
+        self.appointment_deleted(appointment_id)
+        self._add_appointment(appointment_id, int(row['PatientID']), str(row['Date']), _text(row['Procedure']))
+
+    def appointment_deleted(self, appointment_id):
+        entry = self._appointments.pop(int(appointment_id), None)
+        if entry is not None:
+            procedures = self._procedures_by_date[entry[1]]
+            procedures[entry[2]] -= 1
+            if procedures[entry[2]] <= 0:
+                del procedures[entry[2]]
+
+    def patient_added(self, row):
+        if self.today is not None and self.month[0] <= _text(row.get('Registered')) <= self.month[1]:
+            self._new_patients.add(int(row['PatientID']))
+
+    def patient_deleted(self, patient_id):
+        """A patient, and with them their appointments and records."""
+        patient_id = int(patient_id)
+        self._new_patients.discard(patient_id)
+        for appointment_id in [appointment_id for appointment_id, entry in self._appointments.items()
+                               if entry[0] == patient_id]:
+            self.appointment_deleted(appointment_id)
+        for record_id in self._records_by_patient.pop(patient_id, ()):
+            del self._records[record_id]
+        self._open_plans.discard(patient_id)
+
+    def record_saved(self, row):
+        """A clinical record row as added or edited."""
+        record_id, patient_id, date = int(row['RecordID']), int(row['PatientID']), str(row['Date'])
+        self.record_deleted(record_id)
+        if self.today is not None and date >= self.plans_since:
+            self._records[record_id] = (patient_id, date, bool(_text(row['TreatmentPlan']).strip()))
+            self._records_by_patient.setdefault(patient_id, set()).add(record_id)
+            self._update_open_plan(patient_id)
+
+    def record_deleted(self, record_id):
+        entry = self._records.pop(int(record_id), None)
+        if entry is not None:
+            self._records_by_patient[entry[0]].discard(int(record_id))
+            self._update_open_plan(entry[0])
+
+    def _add_appointment(self, appointment_id, patient_id, date, procedure):
+        if self.today is None:
+            return
+        if self.week[0] <= date <= self.week[1] or self.month[0] <= date <= self.month[1]:
+            self._appointments[appointment_id] = (patient_id, date, procedure)
+            self._procedures_by_date.setdefault(date, Counter())[procedure] += 1
+
+    def _update_open_plan(self, patient_id):
+        record_ids = self._records_by_patient.get(patient_id)
+        if not record_ids:
+            self._records_by_patient.pop(patient_id, None)
+            self._open_plans.discard(patient_id)
+            return
+        # The latest record: by date, and the one entered last on the same day
+        latest = max(record_ids, key=lambda record_id: (self._records[record_id][1], record_id))
+        if self._records[latest][2]:
+            self._open_plans.add(patient_id)
+        else:
+            self._open_plans.discard(patient_id)
+
+    # --- Reading ---
+
+    def figures(self):
+        """{'today', 'week', 'new_patients', 'open_plans': counts, 'procedures': [(procedure, count)], most first}.
+
+        Stale counters (another workstation's changes, or a new day) are read again first; otherwise this only
+        sums the per-day counters of one week and one month.
+        """
+        if self._stale or datetime.now().strftime("%Y-%m-%d") != self.today:
+            self.load(set(self._stale))
+        day_counts = {date: sum(procedures.values()) for date, procedures in self._procedures_by_date.items()}
+        procedures = Counter()
+        for date, counts in self._procedures_by_date.items():
+            if self.month[0] <= date <= self.month[1]:
+                procedures.update(counts)
+        return {'today': day_counts.get(self.today, 0),
+                'week': sum(count for date, count in day_counts.items() if self.week[0] <= date <= self.week[1]),
+                'new_patients': len(self._new_patients),
+                'open_plans': len(self._open_plans),
+                'procedures': [(procedure or '(none)', count) for procedure, count in procedures.most_common()]}
@@ -0,0 +1,1874 @@
+# dental_store.py
+
+import bisect
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from functools import partial
+
+import pandas as pd
+
+from dental_archive import ArchiveCache, archive_path_for
+from dental_journal import ChangeJournal, JournalOverlay
+from dental_lock import LOCK_TIMEOUT_SECONDS, ConflictError, FileLock
+from dental_schedule import SlotIndex
+from dental_search import TEXT_FIELDS, ClinicalTextIndex, PatientSearchIndex, ranked_patient_ids
+from dental_writer import BackgroundWriter, atomic_write_csv, atomic_write_feather, write_temp_csv, write_temp_feather
+
+# --- Data File Configuration ---
+PATIENTS_FILE = 'dental_patients.csv'
+APPOINTMENTS_FILE = 'dental_appointments.csv'
+CLINICAL_RECORDS_FILE = 'clinical_records.csv'
+JOURNAL_FILE = 'dental_changes.journal'
+SQLITE_FILE = 'dental_practice.db'
+SEQUENCE_FILE = 'dental_sequences.json'
+LOCK_FILE = 'dental_practice.lock'  # Held by whichever workstation is writing to the shared data folder
+TEXT_INDEX_FILE = 'clinical_text_index.json'  # Saved full-text index of the clinical records
+ARCHIVE_FILE = 'dental_archive.json'  # Which years of old rows are archived, with their ID and date ranges
+
+ALL_TABLES = ('patients', 'appointments', 'clinical')
+# Tables whose rows from before the working-set horizon move into per-year archive files (see archive_old_rows)
+ARCHIVED_TABLES = ('appointments', 'clinical')
+# A patient's delete or restore carries their appointments and clinical records with it (see cascaded)
+CASCADE_TABLES = ('appointments', 'clinical')
+
+# --- Snapshot Configuration ---
+# With pyarrow installed, compaction also writes a Feather (Arrow IPC) copy of each table next to its CSV.
+# It keeps its dtypes and loads without parsing; whichever of the two files is newer is read at startup.
+USE_BINARY_SNAPSHOTS = importlib.util.find_spec('pyarrow') is not None
+SNAPSHOT_SUFFIX = '.feather'
+
+# --- Journal Configuration ---
+JOURNAL_COMPACT_THRESHOLD = 500  # Fold the journal back into the CSVs after this many changes
+STREAM_CHUNK_ROWS = 100000  # Rows per chunk when a table is streamed (reports) instead of loaded
+TEXT_SEARCH_RESULTS = 500  # Most clinical records a full-text search returns
+PURGE_BATCH_ROWS = 5000  # Most tombstoned rows one purge pass removes, so a backlog never holds the lock for long
+ARCHIVE_BATCH_ROWS = 50000  # Most rows one archive pass moves out of the working set
+
+# Every row carries a version stamp, bumped on each update, so an edit based on a stale copy can be refused
+VERSION_COLUMN = 'Version'
+# Registered is the date a patient was added ('YYYY-MM-DD'), blank for patients added before it was kept
+PATIENT_COLUMNS = ['PatientID', 'Name', 'Phone', 'MedicalNotes', 'Registered', VERSION_COLUMN]
+# Appointments refer to their patient by PatientID only; the Name is joined on whenever rows are handed out
+APPOINTMENT_COLUMNS = ['AppointmentID', 'PatientID', 'Date', 'Time', 'Procedure', VERSION_COLUMN]
+CLINICAL_COLUMNS = ['RecordID', 'PatientID', 'Date', 'Problem', 'TreatmentPlan', 'Medications', VERSION_COLUMN]
+TEXT_FILL = {'Problem': '', 'TreatmentPlan': '', 'Medications': ''}
+# Deleted rows are only tombstoned, and stay recoverable until they are purged; in the data files a tombstoned
+# row carries its deletion time ('YYYY-MM-DD HH:MM:SS.ffffff') in this column, which is blank for every other row
+DELETED_COLUMN = 'Deleted'
+
+# --- In-Memory Model Configuration ---
+# In memory, IDs are plain int64 columns, appointment Date/Time are parsed once into datetime64/timedelta64
+# columns and Procedure is categorical. Callers, the data files and the journal still see 'YYYY-MM-DD' / 'HH:MM'.
+DATE_FORMAT = '%Y-%m-%d'
+TIME_FORMAT = '%H:%M'
+TIME_ORIGIN = pd.Timestamp('1900-01-01')  # The date strptime gives a bare time; subtracted to leave the time of day
+# Files from before dates and times were validated can hold free text ('2:30pm', '12/03/2024') that does not parse.
+# Such text is kept as is in these in-memory columns, so it is written back unchanged, and the row is left out of
+# the date and slot indexes.
+RAW_TEXT_COLUMNS = {'Date': 'RawDate', 'Time': 'RawTime'}
+
+
+# =================================================================
+# --- CSV STORE (in-memory DataFrames + change journal) ---
+# =================================================================
+
+class CsvStore:
+    """Keeps all three tables in memory and persists them as CSV files plus a change journal.
+
+    Several workstations can share one data folder. Every change is appended to the shared journal under
+    ``lock``, after first applying whatever the other workstations appended since we last looked, and
+    ``poll_changes`` follows the journal between edits. Compacting the journal into the CSVs only happens if
+    nobody has appended to it since our copies were taken.
+    """
+
+    # Journal table name -> DataFrame attribute
+    TABLE_FRAMES = {'patients': 'patients_df', 'appointments': 'appointments_df', 'clinical': 'clinical_df'}
+    # Tables with a primary key; these get an ID -> row label hash index and an ID sequence
+    PRIMARY_KEYS = {'patients': 'PatientID', 'appointments': 'AppointmentID', 'clinical': 'RecordID'}
+
+    def __init__(self, patients_file=PATIENTS_FILE, appointments_file=APPOINTMENTS_FILE,
+                 clinical_file=CLINICAL_RECORDS_FILE, journal_file=JOURNAL_FILE, sequence_file=SEQUENCE_FILE,
+                 lock_file=LOCK_FILE, text_index_file=TEXT_INDEX_FILE, archive_file=ARCHIVE_FILE):
+        self.patients_file = patients_file
+        self.appointments_file = appointments_file
+        self.clinical_file = clinical_file
+        self.sequence_file = sequence_file
+        self.text_index_file = text_index_file
+        self.archive_file = archive_file
+        self.journal = ChangeJournal(journal_file)
+        self.lock = FileLock(lock_file)
+        self.writer = None
+        self.pending_changes = 0  # Changes journaled since the last snapshot was queued
+
+        self._changed_tables = set()  # Tables changed by other workstations since poll_changes() last reported
+
+        self._loaded = set()
+        self._pending_replay = None  # Journal entries per table, held until that table is loaded
+        self._row_index = {}
+        self._sequences = {}
+        self._next_label = {}
+        self._records_by_patient = {}
+        self._appointments_by_date = {}  # Date -> sorted [(Time, AppointmentID)]: one partition per day
+        self._appointment_dates = []  # Dates that have appointments, sorted, for range lookups
+        self._search = PatientSearchIndex()
+        self._slots = SlotIndex()
+        self._text_index = None  # Clinical full-text index: loaded or built on the first search
+        self._text_index_stale = False  # The clinical table was re-read since; re-check the index on next use
+        self._tombstones = {}  # Table -> {ID: (row label, deletion time)} of deleted rows not yet purged
+        self._archive_cache = ArchiveCache()  # Archived years read so far (see _archived_frame)
+        self._archive_manifest = (None, {})  # (file stamp, manifest) as last read from archive_file
+
+        # Cached patient-list sort order, invalidated whenever the patients table changes
+        self._patients_version = 0
+        self._patient_order_key = None
+        self._patient_order = None
+
+    def start_background_writer(self, on_error=None):
+        """Move snapshot writes off the calling (Tk) thread."""
+        self.writer = BackgroundWriter(self.journal, on_error=on_error)
+        self.writer.start()
+
+    def setup(self):
+        if not os.path.exists(self.patients_file):
+            pd.DataFrame(columns=PATIENT_COLUMNS).to_csv(self.patients_file, index=False)
+        if not os.path.exists(self.appointments_file):
+            pd.DataFrame(columns=APPOINTMENT_COLUMNS).to_csv(self.appointments_file, index=False)
+        if not os.path.exists(self.clinical_file):
+            pd.DataFrame(columns=CLINICAL_COLUMNS).to_csv(self.clinical_file, index=False)
+
+    def load(self, tables=ALL_TABLES):
+        """Load the given tables now; any other table is loaded the first time something touches it."""
+        if self._pending_replay is None:
+            with self.lock:
+                self._read_journal()
+        for table in tables:
+            self.ensure_loaded(table)
+
+    def _read_journal(self):
+        # Read the journal once and hold each table's changes until that table is loaded
+        self._pending_replay = {table: [] for table in self.TABLE_FRAMES}
+        for entry in self.journal.replay():
+            for part in cascaded(entry):
+                self._pending_replay[part['table']].append(part)
+        self.pending_changes = self.journal.entry_count
+        if os.path.exists(self.sequence_file):
+            with open(self.sequence_file, encoding='utf-8') as sequence_file:
+                self._sequences = json.load(sequence_file)
+
+    def ensure_loaded(self, table):
+        if table in self._loaded:
+            return
+        if self._pending_replay is None:
+            self.load(tables=())
+        if table in ARCHIVED_TABLES and self._archive_years(table):
+            # Archived rows of deleted patients are hidden by the patients' tombstones (see _hide_deleted_patients)
+            self.ensure_loaded('patients')
+        with self.lock:
+            # The held journal entries only fit the data files if nobody has compacted the journal since
+            self._catch_up()
+            self._load_table(table)
+
+    def _load_table(self, table):
+        self._loaded.add(table)
+        df = self._read_table(table)
+        self._tombstones[table] = {}
+        if DELETED_COLUMN in df.columns:
+            # Tombstoned rows stay in the frame, but out of every index; their labels are found by _build_indexes
+            deleted = df[df[DELETED_COLUMN].notna() & (df[DELETED_COLUMN].astype(str) != '')]
+            self._tombstones[table] = {row_id: (None, str(stamp)) for row_id, stamp
+                                       in zip(deleted[self.PRIMARY_KEYS[table]].tolist(),
+                                              deleted[DELETED_COLUMN].tolist())}
+            df = df.drop(columns=[DELETED_COLUMN])
+        setattr(self, self.TABLE_FRAMES[table], df)
+        self._build_indexes(table)
+        # Replay the changes made since the CSVs were last written
+        for entry in self._pending_replay.pop(table):
+            self.apply(entry['op'], entry['table'], entry['key'], entry.get('row'))
+
+    def _read_table(self, table, csv_path=None, columns=None):
+        """A table's file (or an archived year's, ``csv_path``) in its in-memory form; optionally only ``columns``."""
+        csv_path = csv_path or self._table_files()[table]
+        snapshot_path = snapshot_path_for(csv_path)
+        if (USE_BINARY_SNAPSHOTS and os.path.exists(snapshot_path)
+                and os.path.getmtime(snapshot_path) >= os.path.getmtime(csv_path)):
+            # The snapshot already carries the right dtypes, so there is nothing to parse or coerce
+            df = pd.read_feather(snapshot_path, columns=columns)
+            if VERSION_COLUMN not in df.columns:
+                df[VERSION_COLUMN] = 1
+            # Snapshots written before the typed model still hold text; typed ones pass straight through
+            return typed_frame(table, df)
+
+        df = pd.read_csv(csv_path, usecols=columns)
+        if table == 'appointments':
+            if 'AppointmentID' not in df.columns:
+                # Files written before appointments had their own ID: number the existing rows once
+                df.insert(0, 'AppointmentID', range(1, len(df) + 1))
+        elif table == 'clinical':
+            # Fix for NaN issue: Load clinical records, filling NaN for string fields
+            df = df.fillna(TEXT_FILL)
+        # Files written before rows had version stamps start every row at version 1
+        if VERSION_COLUMN not in df.columns:
+            df[VERSION_COLUMN] = 1
+        df[VERSION_COLUMN] = pd.to_numeric(df[VERSION_COLUMN], errors='coerce').fillna(1).astype('int64')
+        # Parse IDs, dates and times once here, not on every edit or lookup
+        return typed_frame(table, df)
+
+    def _build_indexes(self, table):
+        """Build a table's ID -> row label index and seed its ID sequence. Only done at load time."""
+        df = getattr(self, self.TABLE_FRAMES[table])
+        id_column = self.PRIMARY_KEYS[table]
+        ids = df[id_column]
+        self._row_index[table] = dict(zip(ids.tolist(), ids.index))
+        # Never hand out an ID again once it has been used, even if that row was deleted
+        self._sequences[table] = max(self._sequences.get(table, 0), int(ids.max()) if not ids.empty else 0)
+
+        # Row labels stay stable across deletes, so new rows always get a fresh label
+        self._next_label[table] = len(df)
+
+        tombstones = self._tombstones.setdefault(table, {})
+        for row_id, (_, stamp) in list(tombstones.items()):
+            label = self._row_index[table].pop(row_id, None)
+            if label is None:
+                del tombstones[row_id]
+            else:
+                tombstones[row_id] = (label, stamp)
+        df = self._live_frame(table)
+
+        if table == 'patients':
+            self._search = PatientSearchIndex()
+            self._search.build((patient_id, name, phone) for patient_id, name, phone
+                               in zip(df['PatientID'], df['Name'], df['Phone']) if not pd.isna(patient_id))
+        if table == 'appointments':
+            self._appointments_by_date = {}
+            # Sorting the typed columns compares numbers, not strings; rows with unparsed text are not indexed
+            in_order = text_frame(df[df['Date'].notna() & df['Time'].notna()].sort_values(by=['Date', 'Time'],
+                                                                                         kind='stable'))
+            for date, time_str, appointment_id in zip(in_order['Date'].astype(str).tolist(),
+                                                      in_order['Time'].astype(str).tolist(),
+                                                      in_order['AppointmentID'].tolist()):
+                # A practice only has a few dozen distinct start times; share one string for each
+                self._appointments_by_date.setdefault(date, []).append((sys.intern(time_str), appointment_id))
+            self._appointment_dates = sorted(self._appointments_by_date)
+            self._slots = SlotIndex()
+            self._slots.build(zip(in_order['AppointmentID'].tolist(), in_order['Date'].tolist(),
+                                  in_order['Time'].tolist(), in_order['Procedure'].tolist()))
+        if table == 'clinical':
+            # PatientID -> that patient's (Date, RecordID) pairs, kept sorted so a chart never scans or sorts
+            self._records_by_patient = {}
+            clinical_keys = zip(df['PatientID'], df['Date'], df['RecordID'])
+            for patient_id, date, record_id in sorted((int(p), str(d), int(r)) for p, d, r in clinical_keys
+                                                      if not pd.isna(p) and not pd.isna(r)):
+                self._records_by_patient.setdefault(patient_id, []).append((date, record_id))
+            self._text_index_stale = True
+
+    def _index_record(self, patient_id, date, record_id):
+        bisect.insort(self._records_by_patient.setdefault(int(patient_id), []), (str(date), int(record_id)))
+
+    def _unindex_record(self, patient_id, date, record_id):
+        entries = self._records_by_patient.get(int(patient_id), [])
+        position = bisect.bisect_left(entries, (str(date), int(record_id)))
+        if position < len(entries) and entries[position] == (str(date), int(record_id)):
+            del entries[position]
+        if not entries:
+            self._records_by_patient.pop(int(patient_id), None)
+
+    def _index_appointment(self, date, time_str, appointment_id):
+        if not _is_slot(date, time_str):
+            return
+        date = str(date)
+        if date not in self._appointments_by_date:
+            bisect.insort(self._appointment_dates, date)
+        bisect.insort(self._appointments_by_date.setdefault(date, []),
+                      (sys.intern(str(time_str)), int(appointment_id)))
+
+    def _index_slot(self, appointment_id, date, time_str, procedure):
+        if _is_slot(date, time_str):
+            self._slots.add(appointment_id, date, time_str, procedure)
+        else:
+            self._slots.remove(appointment_id)
+
+    def _unindex_appointment(self, date, time_str, appointment_id):
+        date = str(date)
+        entries = self._appointments_by_date.get(date, [])
+        position = bisect.bisect_left(entries, (str(time_str), int(appointment_id)))
+        if position < len(entries) and entries[position] == (str(time_str), int(appointment_id)):
+            del entries[position]
+        if not entries and date in self._appointments_by_date:
+            del self._appointments_by_date[date]
+            del self._appointment_dates[bisect.bisect_left(self._appointment_dates, date)]
+
+    def save(self):
+        """Fold the change journal back into the CSV files."""
+        # A table with journaled changes has to be in memory before the journal can be truncated
+        for table in [table for table, entries in self._pending_replay.items() if entries]:
+            self.ensure_loaded(table)
+
+        # Copies taken now are immutable snapshots the writer thread can serialize while editing carries on;
+        # tables that were never loaded have not changed, so their files are left alone.
+        files = self._table_files()
+        frames = [(self._file_frame(table), files[table]) for table in ALL_TABLES if table in self._loaded]
+        sequences = dict(self._sequences)
+        # The copies hold exactly the journal up to here
+        offset, generation = self.journal.offset, self.journal.generation
+        text_index = self._text_index if self._text_index is not None and self._text_index.dirty else None
+
+        def write_snapshot():
+            # Serializing a large practice takes seconds, so it happens before taking the lock; edits on every
+            # workstation only wait for the check and the renames
+            written = self._write_temp_files(frames)
+            try:
+                with self.lock:
+                    # If another workstation has journaled changes these copies lack, a later save will include them
+                    if self.journal.is_unchanged_since(offset, generation):
+                        self._replace_files(written, sequences)
+                        written = []
+            finally:
+                _discard_temp_files(written)
+            if text_index is not None:
+                save_text_index(text_index, self.text_index_file)
+
+        self.pending_changes = 0
+        if self.writer is not None:
+            self.writer.snapshot(write_snapshot)
+        else:
+            write_snapshot()
+
+    def _write_files(self, frames, sequences):
+        """Replace the data files with the given (DataFrame, path) pairs and empty the journal. Hold the lock."""
+        self._replace_files(self._write_temp_files(frames), sequences)
+
+    def _write_temp_files(self, frames):
+        """Serialize (DataFrame, path) pairs to temp files next to their paths: [(temp path, path)]. Needs no lock."""
+        written = []
+        try:
+            for df, path in frames:
+                written.append((write_temp_csv(text_frame(df), path), path))
+                if USE_BINARY_SNAPSHOTS:
+                    # Written after the CSV so it is the newer file unless the CSV is replaced by hand
+                    written.append((write_temp_feather(df, snapshot_path_for(path)), snapshot_path_for(path)))
+        except BaseException:
+            _discard_temp_files(written)
+            raise
+        return written
+
+    def _replace_files(self, written, sequences):
+        """Rename the temp files from ``_write_temp_files`` into place and empty the journal. Hold the lock."""
+        for temp_path, path in written:
+            os.replace(temp_path, path)
+        self._save_sequences(sequences)
+        self.journal.truncate()
+
+    def bulk_insert(self, frames):
+        """Insert many new rows in one step, for imports: {table: DataFrame}, IDs numbered on from next_id().
+
+        Rather than journaling every row, the new rows are added in memory and the data files are rewritten once
+        under the lock, exactly like a compaction, so other workstations simply reload. If another workstation
+        claimed IDs after they were numbered, each block moves up past them (see shift_id_blocks). Returns the
+        frames as stored.
+        """
+        for table in ALL_TABLES:
+            self.ensure_loaded(table)
+        if self.writer is not None:
+            # A queued snapshot would only be skipped once the files are rewritten; let it finish first
+            self.writer.flush()
+        with self.lock:
+            self._catch_up()
+            frames = shift_id_blocks(frames, self._sequences)
+            for table, new_rows in frames.items():
+                df = getattr(self, self.TABLE_FRAMES[table])
+                new_rows = new_rows.assign(**{VERSION_COLUMN: 1}).reindex(columns=df.columns)
+                if table == 'clinical':
+                    new_rows = new_rows.fillna(TEXT_FILL)
+                # Row labels are renumbered, so every index of the table is rebuilt from the combined frame.
+                # Typing it again merges the Procedure categories, which concat would otherwise turn back into text.
+                combined = typed_frame(table, pd.concat([df, typed_frame(table, new_rows)], ignore_index=True))
+                setattr(self, self.TABLE_FRAMES[table], combined)
+                self._build_indexes(table)
+            self._patients_version += 1
+            files = self._table_files()
+            self._write_files([(self._file_frame(table), files[table]) for table in ALL_TABLES],
+                              dict(self._sequences))
+        self.pending_changes = 0
+        return frames
+
+    def _file_frame(self, table):
+        """A copy of a table as its files hold it: tombstoned rows included, with their deletion time."""
+        df = getattr(self, self.TABLE_FRAMES[table])
+        tombstones = self._tombstones.get(table)
+        if not tombstones:
+            return df.copy()
+        stamps = pd.Series({label: stamp for label, stamp in tombstones.values()}, dtype='str')
+        return df.assign(**{DELETED_COLUMN: stamps})
+
+    def _live_frame(self, table):
+        """A table without its tombstoned rows."""
+        df = getattr(self, self.TABLE_FRAMES[table])
+        tombstones = self._tombstones.get(table)
+        if not tombstones:
+            return df
+        return df.drop(index=[label for label, _ in tombstones.values()])
+
+    def _table_files(self):
+        return {'patients': self.patients_file, 'appointments': self.appointments_file,
+                'clinical': self.clinical_file}
+
+    def _save_sequences(self, sequences):
+        temp_path = self.sequence_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as sequence_file:
+            json.dump(sequences, sequence_file)
+        os.replace(temp_path, self.sequence_file)
+
+    def close(self):
+        """Flush on exit: write a final snapshot if anything changed and wait for the writer to finish."""
+        if self.pending_changes:
+            self.save()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self._text_index is not None and self._text_index.dirty:
+            save_text_index(self._text_index, self.text_index_file)
+        self.journal.close()
+
+    def commit(self, op, table, key, row=None, expected_version=None):
+        """Append a change to the journal and apply it in memory, instead of rewriting the CSVs.
+
+        ``expected_version`` is the row's Version when the user opened it; if another workstation has changed or
+        deleted the row since, ConflictError is raised and nothing is written. Returns the key the change was
+        stored under, since an insert whose ID was taken elsewhere in the meantime gets the next free one.
+        """
+        self.ensure_loaded(table)
+        if table == 'appointments':
+            # Appointment rows are handed out with their patient's Name, and loading takes the (non-reentrant) lock
+            self.ensure_loaded('patients')
+        with self.lock:
+            self._catch_up()
+            if op in ('update', 'delete'):
+                self._unarchive(table, key)
+            if expected_version is not None:
+                current = self._row(table, key)
+                if current is None or int(current[VERSION_COLUMN]) != int(expected_version):
+                    raise ConflictError("It was changed or deleted on another workstation after you opened it.")
+            if op == 'insert':
+                key, row = self._claim_id(table, key, row)
+            entry = self.journal.make_entry(op, table, key, row)
+            # One journal entry, even for a patient's cascade, so a failed write leaves nothing half done
+            self.journal.append_many([entry])
+            self._route(entry)
+        self.pending_changes += 1
+        if self.pending_changes >= JOURNAL_COMPACT_THRESHOLD:
+            self.save()
+        return key
+
+    def _claim_id(self, table, key, row):
+        id_column = self.PRIMARY_KEYS.get(table)
+        if id_column and row.get(id_column) is not None and int(row[id_column]) <= self._sequences[table]:
+            # Another workstation used this ID after next_id() handed it out
+            new_id = self._sequences[table] + 1
+            return {id_column: new_id}, {**row, id_column: new_id}
+        return key, row
+
+    def poll_changes(self):
+        """Apply the edits other workstations have made since the last call and return the tables they touched.
+
+        Costs one stat of the journal when nothing has changed. If another workstation is writing at the moment,
+        it returns straight away and the changes are picked up by the next call.
+        """
+        if self._pending_replay is not None and self.journal.has_changed() and self.lock.acquire(blocking=False):
+            try:
+                self._catch_up()
+            finally:
+                self.lock.release()
+        changed, self._changed_tables = self._changed_tables, set()
+        return changed
+
+    def _catch_up(self):
+        """Apply journal entries appended by other workstations. Call with the lock held."""
+        if not self.journal.has_changed():
+            return
+        entries = self.journal.read_new()
+        if entries is None:
+            self._reload()
+            return
+        for entry in entries:
+            self._changed_tables.update(self._route(entry))
+        self.pending_changes += len(entries)
+
+    def _route(self, entry):
+        """Apply a journal entry and its cascade (see ``cascaded``) to the loaded tables, and hold it for the others
+        until they are loaded; returns the tables it touches."""
+        tables = []
+        for part in cascaded(entry):
+            if part['table'] in self._loaded:
+                self.apply(part['op'], part['table'], part['key'], part.get('row'))
+            else:
+                self._pending_replay[part['table']].append(part)
+            tables.append(part['table'])
+        return tables
+
+    def _reload(self):
+        """Another workstation compacted the journal into new data files, so read those and the new journal."""
+        tables = [table for table in ALL_TABLES if table in self._loaded]
+        self._loaded = set()
+        self._sequences = {}
+        self._read_journal()
+        for table in tables:
+            self._load_table(table)
+        self._patients_version += 1
+        self._changed_tables.update(tables)
+
+    def apply(self, op, table, key, row=None):
+        """Apply one journaled change to the in-memory DataFrames. Used for both live edits and replay.
+
+        A delete carrying a row tombstones the matching rows (see ``_tombstone``); 'restore' brings rows tombstoned at
+        ``row['Deleted']`` back and 'purge' removes tombstoned rows from the frame for good. 'archive' drops rows that
+        were moved into the archive files, and 'unarchive' brings one back into the working set, keeping its Version.
+        """
+        frame_attr = self.TABLE_FRAMES[table]
+        df = getattr(self, frame_attr)
+        id_column = self.PRIMARY_KEYS.get(table)
+        row_index = self._row_index.get(table)
+        labels = [] if op in ('restore', 'purge', 'archive') else self._key_labels(table, key)
+
+        if op in ('insert', 'unarchive'):
+            if labels:
+                # Replacing any row with the same key keeps replay idempotent if we crashed mid-compaction
+                df = self._drop_labels(table, df, labels)
+            if table == 'clinical':
+                row = {**row, **{column: row.get(column) or '' for column in TEXT_FILL}}
+            if id_column and row.get(id_column) is None:
+                # Journal entries written before appointments had an ID
+                row = {**row, id_column: self._sequences[table] + 1}
+            row = {**row, VERSION_COLUMN: 1 if op == 'insert' else int(row[VERSION_COLUMN])}
+            label = self._next_label[table]
+            self._next_label[table] += 1
+            df = _append_row(df, label, typed_row(table, row))
+            if id_column:
+                row_index[int(row[id_column])] = label
+                self._sequences[table] = max(self._sequences[table], int(row[id_column]))
+            if table == 'patients':
+                self._search.add(row['PatientID'], row.get('Name'), row.get('Phone'))
+            if table == 'appointments':
+                self._index_appointment(row.get('Date'), row.get('Time'), row['AppointmentID'])
+                self._index_slot(row['AppointmentID'], row.get('Date'), row.get('Time'), row.get('Procedure'))
+            if table == 'clinical':
+                self._index_record(row['PatientID'], row['Date'], row['RecordID'])
+                if self._text_index is not None:
+                    self._text_index.add(row['RecordID'], row['Date'], row[VERSION_COLUMN],
+                                         *(row.get(column) for column in TEXT_FIELDS))
+        elif op == 'update':
+            reindex = table == 'clinical' and ('Date' in row or 'PatientID' in row)
+            if reindex:
+                for _, old in df.loc[labels, ['PatientID', 'Date', 'RecordID']].iterrows():
+                    self._unindex_record(old['PatientID'], old['Date'], old['RecordID'])
+            move_appointments = table == 'appointments' and ('Date' in row or 'Time' in row)
+            if move_appointments:
+                for _, old in text_frame(df.loc[labels, ['Date', 'Time', 'AppointmentID']]).iterrows():
+                    self._unindex_appointment(old['Date'], old['Time'], old['AppointmentID'])
+            for column, value in typed_row(table, row).items():
+                # Journal entries from before appointments dropped their Name column still carry one
+                if column in df.columns:
+                    _fit_category(df, column, value)
+                    df.loc[labels, column] = value
+            df.loc[labels, VERSION_COLUMN] = df.loc[labels, VERSION_COLUMN] + 1
+            if reindex:
+                for _, new in df.loc[labels, ['PatientID', 'Date', 'RecordID']].iterrows():
+                    self._index_record(new['PatientID'], new['Date'], new['RecordID'])
+            if table == 'clinical' and self._text_index is not None:
+                for new in df.loc[labels, ['RecordID', 'Date', VERSION_COLUMN, *TEXT_FIELDS]].itertuples(index=False):
+                    self._text_index.add(*new)
+            if table == 'patients' and ('Name' in row or 'Phone' in row):
+                for _, new in df.loc[labels, ['PatientID', 'Name', 'Phone']].iterrows():
+                    self._search.add(new['PatientID'], new['Name'], new['Phone'])
+            if move_appointments:
+                for _, new in text_frame(df.loc[labels, ['Date', 'Time', 'AppointmentID']]).iterrows():
+                    self._index_appointment(new['Date'], new['Time'], new['AppointmentID'])
+            if table == 'appointments' and {'Date', 'Time', 'Procedure'} & set(row):
+                for _, new in text_frame(df.loc[labels, ['AppointmentID', 'Date', 'Time', 'Procedure']]).iterrows():
+                    self._index_slot(new['AppointmentID'], new['Date'], new['Time'], new['Procedure'])
+        elif op == 'delete':
+            if row is None:
+                # Journal entries from before deletes were recoverable remove the rows outright
+                df = self._drop_labels(table, df, labels)
+            else:
+                self._tombstone(table, df, labels, row[DELETED_COLUMN])
+        elif op == 'restore':
+            self._restore(table, df, key, row[DELETED_COLUMN])
+        elif op == 'purge':
+            df = self._purge(table, df, key[id_column])
+        elif op == 'archive':
+            labels = [row_index[row_id] for row_id in map(int, key[id_column]) if row_id in row_index]
+            # The full-text index covers the archive too, so archived records keep their entries
+            df = self._drop_labels(table, df, labels, keep_text=True)
+
+        if table == 'patients':
+            self._patients_version += 1
+        setattr(self, frame_attr, df)
+
+    def _key_labels(self, table, key):
+        """Row labels matching a key; a primary-key lookup is a single dict hit instead of a column scan."""
+        id_column = self.PRIMARY_KEYS.get(table)
+        if id_column and list(key) == [id_column]:
+            label = self._row_index[table].get(int(key[id_column]))
+            return [label] if label is not None else []
+        df = getattr(self, self.TABLE_FRAMES[table])
+        return list(df.index[self._key_mask(df, key, table)])
+
+    def _drop_labels(self, table, df, labels, keep_text=False):
+        self._unindex_labels(table, df, labels, keep_text)
+        id_column = self.PRIMARY_KEYS.get(table)
+        if id_column:
+            for row_id in df.loc[labels, id_column].tolist():
+                self._tombstones[table].pop(int(row_id), None)
+        return df.drop(index=labels)
+
+    def _unindex_labels(self, table, df, labels, keep_text=False):
+        id_column = self.PRIMARY_KEYS.get(table)
+        if id_column:
+            for row_id in df.loc[labels, id_column]:
+                self._row_index[table].pop(int(row_id), None)
+                if table == 'patients':
+                    self._search.remove(row_id)
+                elif table == 'appointments':
+                    self._slots.remove(row_id)
+        if table == 'clinical':
+            for _, old in df.loc[labels, ['PatientID', 'Date', 'RecordID']].iterrows():
+                self._unindex_record(old['PatientID'], old['Date'], old['RecordID'])
+                if self._text_index is not None and not keep_text:
+                    self._text_index.remove(old['RecordID'])
+        if table == 'appointments':
+            for _, old in text_frame(df.loc[labels, ['Date', 'Time', 'AppointmentID']]).iterrows():
+                self._unindex_appointment(old['Date'], old['Time'], old['AppointmentID'])
+
+    def _index_labels(self, table, df, labels):
+        """The inverse of ``_unindex_labels``: make rows already in the frame visible to every lookup again."""
+        id_column = self.PRIMARY_KEYS[table]
+        for label, row_id in zip(labels, df.loc[labels, id_column].tolist()):
+            self._row_index[table][int(row_id)] = label
+        if table == 'patients':
+            for new in df.loc[labels, ['PatientID', 'Name', 'Phone']].itertuples(index=False):
+                self._search.add(*new)
+        if table == 'appointments':
+            for _, new in text_frame(df.loc[labels, ['AppointmentID', 'Date', 'Time', 'Procedure']]).iterrows():
+                self._index_appointment(new['Date'], new['Time'], new['AppointmentID'])
+                self._index_slot(new['AppointmentID'], new['Date'], new['Time'], new['Procedure'])
+        if table == 'clinical':
+            for _, new in df.loc[labels, ['PatientID', 'Date', 'RecordID']].iterrows():
+                self._index_record(new['PatientID'], new['Date'], new['RecordID'])
+            if self._text_index is not None:
+                for new in df.loc[labels, ['RecordID', 'Date', VERSION_COLUMN, *TEXT_FIELDS]].itertuples(index=False):
+                    self._text_index.add(*new)
+
+    def _tombstone(self, table, df, labels, stamp):
+        """Hide rows from every lookup in O(rows) index updates, leaving the frame itself untouched until a purge."""
+        row_index = self._row_index[table]
+        ids = df.loc[labels, self.PRIMARY_KEYS[table]].tolist()
+        # A cascade keyed by PatientID also matches rows deleted earlier on their own; those keep their deletion time
+        live = [(label, int(row_id)) for label, row_id in zip(labels, ids) if row_index.get(int(row_id)) == label]
+        self._unindex_labels(table, df, [label for label, _ in live])
+        for label, row_id in live:
+            self._tombstones[table][row_id] = (label, stamp)
+
+    def _restore(self, table, df, key, stamp):
+        tombstones = self._tombstones[table]
+        candidates = [label for label, deleted in tombstones.values() if deleted == stamp]
+        if not candidates:
+            return
+        rows = df.loc[candidates]
+        labels = list(rows.index[self._key_mask(rows, key, table)])
+        for row_id in df.loc[labels, self.PRIMARY_KEYS[table]].tolist():
+            del tombstones[int(row_id)]
+        self._index_labels(table, df, labels)
+
+    def _purge(self, table, df, ids):
+        tombstones = self._tombstones[table]
+        # Rows restored since the purge was planned are no longer tombstoned and stay
+        labels = [tombstones.pop(int(row_id))[0] for row_id in ids if int(row_id) in tombstones]
+        return df.drop(index=labels) if labels else df
+
+    @staticmethod
+    def _key_mask(df, key, table):
+        mask = pd.Series(True, index=df.index)
+        # Dates and times are matched as text, so rows holding unparsed text (RAW_TEXT_COLUMNS) match as well
+        text = df
+        if table == 'appointments' and set(RAW_TEXT_COLUMNS) & set(key):
+            text = text_frame(df[[column for column in [*RAW_TEXT_COLUMNS, *RAW_TEXT_COLUMNS.values()]
+                                  if column in df.columns]])
+        for column, value in key.items():
+            # Keys journaled before appointments had an ID also named the patient, by PatientID and Name
+            if column in df.columns:
+                mask &= (text[column] if column in RAW_TEXT_COLUMNS else df[column]) == value
+        return mask
+
+    def _row(self, table, key):
+        labels = self._key_labels(table, key)
+        if labels:
+            df = getattr(self, self.TABLE_FRAMES[table]).loc[labels[:1]]
+        else:
+            df = self._archived_row(table, key)
+            if df is None:
+                return None
+        if table == 'appointments':
+            df = self._appointment_rows(df)
+        return df.to_dict('records')[0]
+
+    def _appointment_rows(self, df):
+        """Appointment rows as callers see them: Date, Time and Procedure as text, and each patient's current Name."""
+        self.ensure_loaded('patients')
+        row_index = self._row_index['patients']
+        # Row labels are never negative, so a patient that no longer exists comes back blank
+        labels = [row_index.get(patient_id, -1) for patient_id in df['PatientID'].tolist()]
+        rows = text_frame(df)
+        rows.insert(2, 'Name', self.patients_df['Name'].reindex(labels).fillna('').to_numpy())
+        return rows
+
+    # --- Lookups ---
+
+    def next_id(self, table):
+        """The ID the next inserted row should use. O(1): read from the persisted sequence, not max() + 1."""
+        self.ensure_loaded(table)
+        return self._sequences[table] + 1
+
+    def get_patient(self, patient_id):
+        self.ensure_loaded('patients')
+        return self._row('patients', {'PatientID': patient_id})
+
+    def get_record(self, record_id):
+        self.ensure_loaded('clinical')
+        return self._row('clinical', {'RecordID': record_id})
+
+    def get_appointment(self, appointment_id):
+        self.ensure_loaded('appointments')
+        return self._row('appointments', {'AppointmentID': appointment_id})
+
+    def all_patients(self):
+        self.ensure_loaded('patients')
+        return self._live_frame('patients')
+
+    def patients_registered_between(self, first_date, last_date):
+        """Patients registered from ``first_date`` to ``last_date`` (inclusive)."""
+        patients = self.all_patients()
+        return patients[(patients['Registered'] >= first_date) & (patients['Registered'] <= last_date)]
+
+    def patient_count(self):
+        self.ensure_loaded('patients')
+        return len(self.patients_df) - len(self._tombstones['patients'])
+
+    def patients_page(self, offset, limit, sort_column=None, descending=False):
+        """One page of the patient list in the requested order. The sort order is cached until patients change."""
+        self.ensure_loaded('patients')
+        df = self.patients_df
+        if sort_column is None and not self._tombstones['patients']:
+            return df.iloc[offset:offset + limit]
+        cache_key = (sort_column, descending, self._patients_version)
+        if self._patient_order_key != cache_key:
+            live = self._live_frame('patients')
+            key = (lambda column: column.astype(str).str.lower()) if sort_column == 'Name' else None
+            self._patient_order = live.index if sort_column is None else live.sort_values(
+                by=sort_column, ascending=not descending, key=key, kind='stable').index
+            self._patient_order_key = cache_key
+        return df.loc[self._patient_order[offset:offset + limit]]
+
+    def find_patients(self, search_term):
+        """Patients matching an exact Patient ID, name words (prefix or misspelt) or a phone number, best first."""
+        self.ensure_loaded('patients')
+        patient_ids = ranked_patient_ids(self._search, search_term, self._row_index['patients'].__contains__)
+        return self.patients_df.loc[[self._row_index['patients'][patient_id] for patient_id in patient_ids]]
+
+    def booking_conflicts(self, date_str, time_str, procedure, exclude_id=None):
+        """AppointmentIDs already booked over the proposed slot (see SlotIndex)."""
+        self.ensure_loaded('appointments')
+        return self._slots.conflicts(date_str, time_str, procedure, exclude_id)
+
+    def free_slots(self, date_str, procedure, count=5, after_time=None):
+        self.ensure_loaded('appointments')
+        return self._slots.free_slots(date_str, procedure, count, after_time)
+
+    def appointments_on(self, date_str):
+        """One day's appointments by time, read from that day's partition of the date index."""
+        return self.appointments_between(date_str, date_str)
+
+    def appointments_between(self, first_date, last_date):
+        """Appointments from ``first_date`` to ``last_date`` (inclusive) by date and time; only those days are read."""
+        self.ensure_loaded('appointments')
+        start = bisect.bisect_left(self._appointment_dates, first_date)
+        end = bisect.bisect_right(self._appointment_dates, last_date)
+        labels = [self._row_index['appointments'][appointment_id]
+                  for date in self._appointment_dates[start:end]
+                  for _, appointment_id in self._appointments_by_date[date]]
+        rows = self.appointments_df.loc[labels]
+        archived = list(self._archived_between('appointments', (first_date, last_date)))
+        if archived:
+            # Older days come from their archived years, loaded the first time they are looked at
+            rows = typed_frame('appointments', pd.concat([*archived, rows], ignore_index=True))
+            rows = rows.sort_values(by=['Date', 'Time'], kind='stable')
+        return self._appointment_rows(rows)
+
+    def patient_records(self, patient_id, include_archive=False):
+        """One patient's records, newest first, straight from the per-patient index.
+
+        With ``include_archive`` their archived records follow, read from every archived year (see _archived_frame).
+        """
+        self.ensure_loaded('clinical')
+        entries = self._records_by_patient.get(int(patient_id), [])
+        labels = [self._row_index['clinical'][record_id] for _, record_id in reversed(entries)]
+        records = self.clinical_df.loc[labels]
+        if not include_archive:
+            return records
+        archived = [frame[frame['PatientID'] == int(patient_id)] for frame in self._archived_between('clinical')]
+        if not any(len(frame) for frame in archived):
+            return records
+        records = pd.concat([records, *archived], ignore_index=True)
+        return records.sort_values(by=['Date', 'RecordID'], ascending=False, kind='stable')
+
+    # --- Recently Deleted ---
+
+    def deleted_rows(self, table):
+        """A table's tombstoned rows not yet purged, as text, with their deletion time; most recently deleted first."""
+        self.ensure_loaded(table)
+        tombstones = self._tombstones[table]
+        df = getattr(self, self.TABLE_FRAMES[table]).loc[[label for label, _ in tombstones.values()]]
+        rows = text_frame(df).assign(**{DELETED_COLUMN: [stamp for _, stamp in tombstones.values()]})
+        return rows.sort_values(DELETED_COLUMN, ascending=False, kind='stable').reset_index(drop=True)
+
+    def purge_deleted(self, before, limit=PURGE_BATCH_ROWS):
+        """Remove for good up to ``limit`` rows tombstoned before ``before`` (a deletion time), oldest first.
+
+        Each table's batch is one journal entry and one drop from the frame, not a rewrite per row. Tables that are
+        not loaded yet are purged once they are. Returns how many rows were removed.
+        """
+        if self._pending_replay is None:
+            return 0
+        with self.lock:
+            self._catch_up()
+            expired = sorted((stamp, table, row_id) for table in ALL_TABLES if table in self._loaded
+                             for row_id, (_, stamp) in self._tombstones[table].items() if stamp < before)[:limit]
+            by_table = {}
+            for _, table, row_id in expired:
+                by_table.setdefault(table, []).append(row_id)
+            # Written before the purge is journaled: a crash in between leaves the patient restorable, without them
+            archived = self._drop_archived_children(by_table['patients']) if 'patients' in by_table else 0
+            entries = [self.journal.make_entry('purge', table, {self.PRIMARY_KEYS[table]: row_ids})
+                       for table, row_ids in by_table.items()]
+            if entries:
+                self.journal.append_many(entries)
+            for entry in entries:
+                self.apply(entry['op'], entry['table'], entry['key'])
+        self.pending_changes += len(entries)
+        return len(expired) + archived
+
+    def _drop_archived_children(self, patient_ids):
+        """Remove the archived appointments and records of patients being purged; returns how many. Hold the lock.
+
+        A patient's delete leaves their archived rows in place (only hidden, see _hide_deleted_patients), so this is
+        the one time the archive is searched for them.
+        """
+        manifest = {name: dict(years) for name, years in self._read_archive_manifest().items()}
+        removed = 0
+        for table in ARCHIVED_TABLES:
+            for year in self._archive_years(table):
+                archived = self._archived_frame(table, year)
+                found = archived['PatientID'].isin(patient_ids)
+                if not found.any():
+                    continue
+                if table == 'clinical' and self._text_index is not None:
+                    for record_id in archived.loc[found, 'RecordID'].tolist():
+                        self._text_index.remove(record_id)
+                self._write_archive_year(table, year, archived[~found].reset_index(drop=True), manifest)
+                removed += int(found.sum())
+        if removed:
+            self._save_archive_manifest(manifest)
+        return removed
+
+    # --- Archive ---
+
+    def archive_old_rows(self, before, limit=ARCHIVE_BATCH_ROWS):
+        """Move up to ``limit`` appointments and clinical records dated before ``before`` (YYYY-MM-DD), oldest first,
+        out of the working set and into one archive file per year. Returns how many rows were moved.
+
+        The archive files are written first and the move is then journaled as one 'archive' entry per table, so the
+        other workstations drop the same rows. A crash in between leaves rows in both places, never in neither, and
+        the next pass replaces the archived copies. Deleted rows stay in the working set until they are purged.
+        """
+        for table in ARCHIVED_TABLES:
+            self.ensure_loaded(table)
+        moved = 0
+        with self.lock:
+            self._catch_up()
+            manifest = {name: dict(years) for name, years in self._read_archive_manifest().items()}
+            entries = []
+            for table in ARCHIVED_TABLES:
+                id_column = self.PRIMARY_KEYS[table]
+                df = getattr(self, self.TABLE_FRAMES[table])
+                old = df[_dated_before(df, before)]
+                old = old[~old.index.isin([label for label, _ in self._tombstones[table].values()])]
+                old = old.sort_values(by='Date', kind='stable').head(limit - moved)
+                if old.empty:
+                    continue
+                years = text_frame(old[['Date']])['Date'].str[:4].to_numpy()
+                for year, rows in old.groupby(years, sort=True):
+                    if year in manifest.get(table, {}):
+                        archived = self._archived_frame(table, year)
+                        rows = pd.concat([archived[~archived[id_column].isin(rows[id_column])], rows],
+                                         ignore_index=True)
+                    # Typed again so Procedure categories from both frames merge instead of turning into text
+                    self._write_archive_year(table, year, typed_frame(table, rows.reset_index(drop=True)), manifest)
+                entries.append(self.journal.make_entry('archive', table, {id_column: old[id_column].tolist()}))
+                moved += len(old)
+            if entries:
+                self._save_archive_manifest(manifest)
+                self.journal.append_many(entries)
+                for entry in entries:
+                    self.apply(entry['op'], entry['table'], entry['key'])
+        self.pending_changes += len(entries)
+        return moved
+
+    def _unarchive(self, table, key):
+        """Bring the archived row an update or delete is about to touch back into the working set. Hold the lock.
+
+        Journaled before the archive files are rewritten without it, so a crash in between leaves a copy in both. A
+        patient's delete does not reach into the archive: their archived rows are hidden while the patient is
+        tombstoned and removed when it is purged (see _drop_archived_children).
+        """
+        if table not in ARCHIVED_TABLES or not self._read_archive_manifest().get(table):
+            return
+        id_column = self.PRIMARY_KEYS[table]
+        if list(key) == [id_column]:
+            row_id = int(key[id_column])
+            if row_id in self._row_index[table] or row_id in self._tombstones[table]:
+                return
+            years, column, value = self._archive_years(table, id_range=(row_id, row_id)), id_column, row_id
+        else:
+            return
+        entries, remaining = [], []
+        for year in years:
+            archived = self._archived_frame(table, year)
+            found = archived[column] == value
+            if found.any():
+                entries += [self.journal.make_entry('unarchive', table, {id_column: row[id_column]}, row)
+                            for row in text_frame(archived[found]).to_dict('records')]
+                remaining.append((year, archived[~found].reset_index(drop=True)))
+        if not entries:
+            return
+        self.journal.append_many(entries)
+        for entry in entries:
+            self.apply(entry['op'], entry['table'], entry['key'], entry['row'])
+        manifest = {name: dict(years) for name, years in self._read_archive_manifest().items()}
+        for year, archived in remaining:
+            self._write_archive_year(table, year, archived, manifest)
+        self._save_archive_manifest(manifest)
+        self.pending_changes += len(entries)
+
+    def _read_archive_manifest(self):
+        """{table: {year: extent}} of the archived years, where an extent holds the year's row count and its first
+        and last ID and date. Read again only when another workstation has rewritten the file."""
+        stamp = _file_stamp(self.archive_file)
+        if stamp != self._archive_manifest[0]:
+            manifest = {}
+            if stamp is not None:
+                with open(self.archive_file, encoding='utf-8') as archive_file:
+                    manifest = json.load(archive_file)
+            self._archive_manifest = (stamp, manifest)
+        return self._archive_manifest[1]
+
+    def _save_archive_manifest(self, manifest):
+        temp_path = self.archive_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as archive_file:
+            json.dump(manifest, archive_file)
+        os.replace(temp_path, self.archive_file)
+        self._archive_manifest = (_file_stamp(self.archive_file), manifest)
+
+    def _archive_years(self, table, date_range=None, id_range=None):
+        """The archived years of a table that can hold rows dated within ``date_range`` or with IDs in ``id_range``."""
+        return [year for year, extent in sorted(self._read_archive_manifest().get(table, {}).items())
+                if (date_range is None
+                    or (extent['first_date'] <= date_range[1] and extent['last_date'] >= date_range[0]))
+                and (id_range is None or (extent['first_id'] <= id_range[1] and extent['last_id'] >= id_range[0]))]
+
+    def _archived_frame(self, table, year):
+        """One archived year of a table, typed like the working set, from the LRU cache or else from its file."""
+        path = archive_path_for(self._table_files()[table], year)
+        return self._archive_cache.get(path, _file_stamp(path), partial(self._read_table, table, path))
+
+    def _archived_between(self, table, date_range=None, hide_deleted=True):
+        """Archived rows dated within ``date_range`` (all of them for None), one year's frame at a time; those of
+        deleted patients are left out unless ``hide_deleted`` is False."""
+        for year in self._archive_years(table, date_range):
+            rows = _in_date_range(self._archived_frame(table, year), date_range)
+            if hide_deleted:
+                rows = self._hide_deleted_patients(rows)
+            if not rows.empty:
+                yield rows
+
+    def _hide_deleted_patients(self, archived):
+        """Archived rows without those of tombstoned patients, which stay in the archive until the patient is
+        purged (see _drop_archived_children)."""
+        deleted = self._tombstones.get('patients')
+        if not deleted or archived.empty:
+            return archived
+        return archived[~archived['PatientID'].isin(list(deleted))]
+
+    def _archived_row(self, table, key):
+        """The archived row a primary-key lookup found nothing for in the working set, as a one-row frame."""
+        id_column = self.PRIMARY_KEYS[table]
+        if table not in ARCHIVED_TABLES or list(key) != [id_column]:
+            return None
+        row_id = int(key[id_column])
+        if row_id in self._tombstones[table]:
+            return None
+        for year in self._archive_years(table, id_range=(row_id, row_id)):
+            archived = self._archived_frame(table, year)
+            found = self._hide_deleted_patients(archived[archived[id_column] == row_id])
+            if not found.empty:
+                return found.iloc[:1]
+        return None
+
+    def _rows_by_id(self, table, row_ids):
+        """The rows with the given IDs, in that order, from the working set or else the archive."""
+        row_index = self._row_index[table]
+        df = getattr(self, self.TABLE_FRAMES[table])
+        archived_ids = {row_id for row_id in row_ids if row_id not in row_index}
+        if not archived_ids:
+            return df.loc[[row_index[row_id] for row_id in row_ids]]
+        id_column = self.PRIMARY_KEYS[table]
+        frames = [df.loc[[row_index[row_id] for row_id in row_ids if row_id in row_index]]]
+        for year in self._archive_years(table, id_range=(min(archived_ids), max(archived_ids))):
+            archived = self._archived_frame(table, year)
+            frames.append(archived[archived[id_column].isin(archived_ids)])
+        rows = pd.concat(frames, ignore_index=True).set_index(id_column, drop=False)
+        return rows.loc[[row_id for row_id in row_ids if row_id in rows.index]].reset_index(drop=True)
+
+    def _archived_versions(self, table):
+        """{ID: Version} of every archived row, reading only those two columns of each year's file."""
+        id_column = self.PRIMARY_KEYS[table]
+        versions = {}
+        for year in self._archive_years(table):
+            path = archive_path_for(self._table_files()[table], year)
+            df = self._read_table(table, path, columns=[id_column, VERSION_COLUMN])
+            versions.update(zip(df[id_column].tolist(), df[VERSION_COLUMN].tolist()))
+        return versions
+
+    def _write_archive_year(self, table, year, df, manifest):
+        """Replace one archived year's files with ``df`` (removing them once empty) and record it in ``manifest``."""
+        path = archive_path_for(self._table_files()[table], year)
+        self._archive_cache.discard(path)
+        if df.empty:
+            for stale_path in (path, snapshot_path_for(path)):
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+            manifest.get(table, {}).pop(year, None)
+            return
+        atomic_write_csv(text_frame(df), path)
+        if USE_BINARY_SNAPSHOTS:
+            atomic_write_feather(df, snapshot_path_for(path))
+        ids, dates = df[self.PRIMARY_KEYS[table]], text_frame(df[['Date']])['Date'].astype(str)
+        manifest.setdefault(table, {})[year] = {'rows': len(df), 'first_id': int(ids.min()), 'last_id': int(ids.max()),
+                                                'first_date': dates.min(), 'last_date': dates.max()}
+
+    # --- Streaming ---
+
+    def search_records(self, query, first_date=None, last_date=None, limit=TEXT_SEARCH_RESULTS):
+        """Clinical records matching a full-text query (see ClinicalTextIndex.search), best first, with a Score.
+
+        Archived records are searched too: the index keeps their entries, so an archived year is only read when
+        one of its records is in the results.
+        """
+        self.ensure_loaded('clinical')
+        if self._text_index is None or self._text_index_stale:
+            df = self._live_frame('clinical').dropna(subset=['RecordID'])
+            versions = self._archived_versions('clinical')
+            versions.update(zip(df['RecordID'].astype(int).tolist(), df[VERSION_COLUMN].tolist()))
+
+            def fetch_rows(record_ids):
+                if record_ids is None:
+                    # Indexed even while their patient is deleted, so a restore finds them searchable again
+                    rows = pd.concat([df, *self._archived_between('clinical', hide_deleted=False)],
+                                     ignore_index=True)
+                else:
+                    rows = self._rows_by_id('clinical', record_ids)
+                return zip(*(rows[column].tolist() for column in ['RecordID', 'Date', VERSION_COLUMN, *TEXT_FIELDS]))
+
+            self._text_index = sync_text_index(self._text_index, self.text_index_file, versions, fetch_rows)
+            self._text_index_stale = False
+        ranked = dict(self._text_index.search(query, first_date, last_date, limit))
+        records = self._hide_deleted_patients(self._rows_by_id('clinical', list(ranked)))
+        return records.assign(Score=records['RecordID'].map(ranked).to_numpy()).reset_index(drop=True)
+
+    def iter_chunks(self, table, columns, date_range=None, chunk_rows=STREAM_CHUNK_ROWS):
+        """Yield a table's rows ``chunk_rows`` at a time with only ``columns``, for reports over large tables.
+
+        A table that is already in memory is sliced. Otherwise its CSV is streamed from disk with the changes
+        still in the journal overlaid (see JournalOverlay), so it never has to be loaded whole. ``date_range``
+        (first, last) keeps only the rows dated within it.
+        """
+        if self._pending_replay is None:
+            self.load(tables=())
+        csv_file = overlay = None
+        with self.lock:
+            self._catch_up()
+            if table not in self._loaded:
+                overlay = JournalOverlay(self.PRIMARY_KEYS[table], self._pending_replay[table])
+                # Opened under the lock, so the file matches the journal entries even if it is replaced later
+                csv_file = open(self._table_files()[table], newline='', encoding='utf-8')
+        if csv_file is not None:
+            with csv_file:
+                header = list(pd.read_csv(csv_file, nrows=0).columns)
+                if overlay.complete and self.PRIMARY_KEYS[table] in header:
+                    csv_file.seek(0)
+                    yield from self._stream_csv(csv_file, header, overlay, columns, date_range, chunk_rows)
+                    yield from self._archive_chunks(table, columns, date_range, chunk_rows)
+                    return
+            # Files from before appointments had IDs, or journal entries the overlay cannot express
+            self.ensure_loaded(table)
+        df = _in_date_range(self._live_frame(table), date_range)
+        df = df[[column for column in columns if column in df.columns]]
+        for start in range(0, len(df), chunk_rows):
+            yield text_frame(df.iloc[start:start + chunk_rows]).reindex(columns=columns)
+        yield from self._archive_chunks(table, columns, date_range, chunk_rows)
+
+    def _archive_chunks(self, table, columns, date_range, chunk_rows):
+        # The archived years that overlap ``date_range``, one at a time
+        if self._archive_years(table, date_range):
+            self.ensure_loaded('patients')  # For the tombstones that hide a deleted patient's archived rows
+        for df in self._archived_between(table, date_range):
+            df = df[[column for column in columns if column in df.columns]]
+            for start in range(0, len(df), chunk_rows):
+                yield text_frame(df.iloc[start:start + chunk_rows]).reindex(columns=columns)
+
+    def _stream_csv(self, csv_file, header, overlay, columns, date_range, chunk_rows):
+        wanted = {overlay.id_column, *columns} | ({'PatientID'} if 'PatientID' in header else set())
+        if date_range is not None:
+            wanted.add('Date')
+        if DELETED_COLUMN in header:
+            wanted.add(DELETED_COLUMN)
+        reader = pd.read_csv(csv_file, usecols=[column for column in header if column in wanted],
+                             chunksize=chunk_rows)
+        for chunk in reader:
+            if DELETED_COLUMN in chunk.columns:
+                # Rows with a deletion time are tombstoned, waiting to be purged
+                chunk = chunk[chunk[DELETED_COLUMN].isna()]
+            chunk = _in_date_range(overlay.apply(chunk), date_range)
+            if not chunk.empty:
+                yield chunk.reindex(columns=columns)
+        inserted = pd.DataFrame(overlay.final_rows())
+        if not inserted.empty:
+            yield _in_date_range(inserted, date_range).reindex(columns=columns)
+
+    def data_fingerprint(self, tables=ALL_TABLES):
+        """Changes whenever any of the tables might have (their data files, the journal or the archive); only stats
+        files."""
+        files = self._table_files()
+        return ([_file_stamp(files[table]) for table in tables]
+                + [_file_stamp(self.journal.path), _file_stamp(self.archive_file)])
+
+
+# =================================================================
+# --- SQLITE STORE (indexed tables in a local database file) ---
+# =================================================================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    PatientID INTEGER PRIMARY KEY,
+    Name TEXT NOT NULL,
+    Phone TEXT,
+    MedicalNotes TEXT,
+    Registered TEXT,
+    Version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_patients_name ON patients (Name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS appointments (
+    AppointmentID INTEGER PRIMARY KEY,
+    PatientID INTEGER NOT NULL,
+    Date TEXT,
+    Time TEXT,
+    Procedure TEXT,
+    Version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (PatientID);
+CREATE INDEX IF NOT EXISTS idx_appointments_date_time ON appointments (Date, Time);
+CREATE TABLE IF NOT EXISTS clinical_records (
+    RecordID INTEGER PRIMARY KEY,
+    PatientID INTEGER NOT NULL,
+    Date TEXT,
+    Problem TEXT,
+    TreatmentPlan TEXT,
+    Medications TEXT,
+    Version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_clinical_patient_date ON clinical_records (PatientID, Date);
+CREATE TABLE IF NOT EXISTS id_sequences (
+    TableName TEXT PRIMARY KEY,
+    LastID INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO id_sequences SELECT 'patients', COALESCE(MAX(PatientID), 0) FROM patients;
+INSERT OR IGNORE INTO id_sequences SELECT 'appointments', COALESCE(MAX(AppointmentID), 0) FROM appointments;
+INSERT OR IGNORE INTO id_sequences SELECT 'clinical', COALESCE(MAX(RecordID), 0) FROM clinical_records;
+CREATE TABLE IF NOT EXISTS deleted_rows (
+    TableName TEXT NOT NULL,
+    RowID INTEGER NOT NULL,
+    PatientID INTEGER,
+    Deleted TEXT NOT NULL,
+    RowData TEXT NOT NULL,
+    PRIMARY KEY (TableName, RowID)
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_rows_deleted ON deleted_rows (Deleted);
+"""
+
+
+# Columns handed to ClinicalTextIndex.add, in its argument order
+CLINICAL_TEXT_COLUMNS = ', '.join(['RecordID', 'Date', VERSION_COLUMN, *TEXT_FIELDS])
+# Appointments as callers see them, with the patient's current Name joined on
+APPOINTMENT_SELECT = ("SELECT a.AppointmentID, a.PatientID, COALESCE(p.Name, '') AS Name, a.Date, a.Time, a.Procedure, "
+                      "a.Version FROM appointments a LEFT JOIN patients p ON p.PatientID = a.PatientID")
+
+
+class SqliteStore:
+    """Stores the tables in a local SQLite file; every lookup and edit goes through an index instead of a scan."""
+
+    TABLES = {'patients': 'patients', 'appointments': 'appointments', 'clinical': 'clinical_records'}
+    TABLE_COLUMNS = {'patients': PATIENT_COLUMNS, 'appointments': APPOINTMENT_COLUMNS, 'clinical': CLINICAL_COLUMNS}
+
+    # Edits are committed one row at a time, so there is never anything left to compact.
+    pending_changes = 0
+
+    def __init__(self, path=SQLITE_FILE, text_index_file=TEXT_INDEX_FILE):
+        self.path = path
+        self.text_index_file = text_index_file
+        self.conn = None
+        self._search = None  # Built on the first patient search, then kept current by commit()
+        self._slots = None  # Built on the first booking check, then kept current by commit()
+        self._text_index = None  # Loaded or built on the first clinical text search, then kept current by commit()
+        self._text_index_stale = False  # Another workstation (or an import) changed records since
+        self._data_version = None
+
+    def connect(self):
+        # SQLite locks the database file itself; a workstation waits this long for another one's write to finish
+        self.conn = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT_SECONDS)
+        self.conn.row_factory = sqlite3.Row
+        legacy_appointments = self._set_aside_legacy_appointments()
+        self.conn.executescript(SQLITE_SCHEMA)
+        self._add_version_columns()
+        self._add_registered_column()
+        self._drop_appointment_names()
+        if legacy_appointments:
+            # Keep the old rowids as the new AppointmentIDs
+            with self.conn:
+                self.conn.execute('INSERT INTO appointments (AppointmentID, PatientID, Date, Time, Procedure) '
+                                  'SELECT rowid, PatientID, Date, Time, Procedure FROM appointments_legacy')
+                self.conn.execute('DROP TABLE appointments_legacy')
+                max_id = self.conn.execute('SELECT COALESCE(MAX(AppointmentID), 0) FROM appointments').fetchone()[0]
+                self._bump_sequence('appointments', max_id)
+
+    def _add_version_columns(self):
+        """Databases created before rows had version stamps get the column, with every row at version 1."""
+        with self.conn:
+            for sql_table in self.TABLES.values():
+                columns = [row['name'] for row in self.conn.execute(f'PRAGMA table_info({sql_table})')]
+                if VERSION_COLUMN not in columns:
+                    self.conn.execute(f'ALTER TABLE {sql_table} ADD COLUMN {VERSION_COLUMN} INTEGER NOT NULL DEFAULT 1')
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _add_registered_column(self):
+        """Databases created before patients had a registration date get the column, blank for every patient."""
+        columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(patients)')]
+        if 'Registered' not in columns:
+            with self.conn:
+                self.conn.execute('ALTER TABLE patients ADD COLUMN Registered TEXT')
+
+    def _drop_appointment_names(self):
+        """Databases created when appointments kept a copy of the patient's Name lose the column."""
+        columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(appointments)')]
+        if 'Name' in columns:
+            try:
+                with self.conn:
+                    self.conn.execute('ALTER TABLE appointments DROP COLUMN Name')
+            except sqlite3.OperationalError:
+                pass  # SQLite before 3.35 cannot drop columns; the copies are simply never read again
+
+    def _set_aside_legacy_appointments(self):
+        """Rename an appointments table created before appointments had their own ID, so it can be rebuilt."""
+        columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(appointments)')]
+        if not columns or 'AppointmentID' in columns:
+            return False
+        with self.conn:
+            self.conn.execute('DROP INDEX IF EXISTS idx_appointments_patient')
+            self.conn.execute('DROP INDEX IF EXISTS idx_appointments_date_time')
+            self.conn.execute('ALTER TABLE appointments RENAME TO appointments_legacy')
+        return True
+
+    def start_background_writer(self, on_error=None):
+        # Each edit is already a single-row transaction, and the connection belongs to the Tk thread.
+        pass
+
+    def setup(self):
+        is_new = not os.path.exists(self.path)
+        self.connect()
+        if is_new and os.path.exists(PATIENTS_FILE):
+            # First start on the SQLite backend: bring the existing CSV data across
+            migrate_csv_to_sqlite(CsvStore(), self)
+
+    def load(self, tables=ALL_TABLES):
+        # Nothing to pull into memory; rows are read on demand.
+        pass
+
+    def save(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        if self._text_index is not None and self._text_index.dirty:
+            save_text_index(self._text_index, self.text_index_file)
+
+    def commit(self, op, table, key, row=None, expected_version=None):
+        """Same contract as CsvStore.commit: version-checked, and returns the key actually used."""
+        sql_table = self.TABLES[table]
+        id_column = CsvStore.PRIMARY_KEYS.get(table)
+        # Take the write lock up front so the version check and ID claim still hold when the change commits
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            if op == 'insert' and id_column and row.get(id_column) is not None:
+                last_id = self.next_id(table) - 1
+                if int(row[id_column]) <= last_id:
+                    # Another workstation used this ID after next_id() handed it out
+                    key, row = {id_column: last_id + 1}, {**row, id_column: last_id + 1}
+            where = ' AND '.join(f'"{column}" = ?' for column in key)
+            params = list(key.values())
+            if expected_version is not None:
+                found = self.conn.execute(f'SELECT {VERSION_COLUMN} FROM {sql_table} WHERE {where}', params).fetchone()
+                if found is None or found[0] != int(expected_version):
+                    raise ConflictError("It was changed or deleted on another workstation after you opened it.")
+
+            if op == 'insert':
+                columns = ', '.join(f'"{column}"' for column in row)
+                placeholders = ', '.join('?' for _ in row)
+                self.conn.execute(f'INSERT OR REPLACE INTO {sql_table} ({columns}) VALUES ({placeholders})',
+                                  list(row.values()))
+                if id_column:
+                    self._bump_sequence(table, row[id_column])
+            elif op == 'update':
+                assignments = ', '.join(f'"{column}" = ?' for column in row)
+                self.conn.execute(f'UPDATE {sql_table} SET {assignments}, {VERSION_COLUMN} = {VERSION_COLUMN} + 1 '
+                                  f'WHERE {where}', list(row.values()) + params)
+            elif op in ('delete', 'restore'):
+                # A patient's appointments and records go (and come back) with them, in the same transaction
+                for part in cascaded({'op': op, 'table': table, 'key': key, 'row': row}):
+                    self._remove_or_restore(part['op'], part['table'], where, params, key, row)
+            if op not in ('delete', 'restore'):
+                self._index_rows(table, where, params)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        return key
+
+    def _remove_or_restore(self, op, table, where, params, key, row):
+        if op == 'restore':
+            self._restore_rows(table, key, row[DELETED_COLUMN])
+            return
+        self._unindex_rows(table, where, params)
+        if row is not None:
+            self._trash_rows(table, where, params, row[DELETED_COLUMN])
+        self.conn.execute(f'DELETE FROM {self.TABLES[table]} WHERE {where}', params)
+
+    def _trash_rows(self, table, where, params, stamp):
+        """Keep a copy of the rows about to be deleted in deleted_rows, so they can be restored until purged."""
+        id_column = CsvStore.PRIMARY_KEYS[table]
+        found = [dict(found) for found in self.conn.execute(f'SELECT * FROM {self.TABLES[table]} WHERE {where}',
+                                                            params)]
+        self.conn.executemany('INSERT OR REPLACE INTO deleted_rows (TableName, RowID, PatientID, Deleted, RowData) '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              [(table, data[id_column], data.get('PatientID'), stamp, json.dumps(data))
+                               for data in found])
+
+    def _restore_rows(self, table, key, stamp):
+        id_column = CsvStore.PRIMARY_KEYS[table]
+        trash_columns = {id_column: 'RowID', 'PatientID': 'PatientID'}
+        where = ' AND '.join(f'{trash_columns[column]} = ?' for column in key)
+        found = self.conn.execute(f'SELECT RowID, RowData FROM deleted_rows WHERE TableName = ? AND Deleted = ? '
+                                  f'AND {where}', [table, stamp, *key.values()]).fetchall()
+        if not found:
+            return
+        row_ids = [row_id for row_id, _ in found]
+        self._insert_rows(table, pd.DataFrame([json.loads(data) for _, data in found]))
+        self.conn.executemany('DELETE FROM deleted_rows WHERE TableName = ? AND RowID = ?',
+                              [(table, row_id) for row_id in row_ids])
+        for start in range(0, len(row_ids), 500):
+            chunk = row_ids[start:start + 500]
+            self._index_rows(table, f'{id_column} IN ({", ".join("?" * len(chunk))})', chunk)
+
+    def poll_changes(self):
+        """Report every table as changed when another workstation has committed since the last call.
+
+        PRAGMA data_version only moves for other connections' commits, so this is one cheap query.
+        """
+        data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return set()
+        self._data_version = data_version
+        # The in-memory search and slot indexes are rebuilt from the database the next time they are needed
+        self._search = None
+        self._slots = None
+        self._text_index_stale = True  # Only the records that changed are re-indexed
+        return set(ALL_TABLES)
+
+    def _index_rows(self, table, where, params):
+        """Bring the in-memory search and slot indexes (if built) up to date with the rows matching ``where``."""
+        if table == 'patients' and self._search is not None:
+            for patient_id, name, phone in self.conn.execute(
+                    f'SELECT PatientID, Name, Phone FROM patients WHERE {where}', params):
+                self._search.add(patient_id, name, phone)
+        elif table == 'appointments' and self._slots is not None:
+            for appointment_id, date, time_str, procedure in self.conn.execute(
+                    f'SELECT AppointmentID, Date, Time, Procedure FROM appointments WHERE {where}', params):
+                self._slots.add(appointment_id, date, time_str, procedure)
+        elif table == 'clinical' and self._text_index is not None:
+            for row in self.conn.execute(f'SELECT {CLINICAL_TEXT_COLUMNS} FROM clinical_records WHERE {where}',
+                                         params):
+                self._text_index.add(*row)
+
+    def _unindex_rows(self, table, where, params):
+        if table == 'patients' and self._search is not None:
+            for (patient_id,) in self.conn.execute(f'SELECT PatientID FROM patients WHERE {where}', params):
+                self._search.remove(patient_id)
+        elif table == 'appointments' and self._slots is not None:
+            for (appointment_id,) in self.conn.execute(f'SELECT AppointmentID FROM appointments WHERE {where}',
+                                                       params):
+                self._slots.remove(appointment_id)
+        elif table == 'clinical' and self._text_index is not None:
+            for (record_id,) in self.conn.execute(f'SELECT RecordID FROM clinical_records WHERE {where}', params):
+                self._text_index.remove(record_id)
+
+    def insert_frame(self, table, df):
+        """Bulk insert a DataFrame in one transaction (used by the CSV migration)."""
+        with self.conn:
+            self._insert_rows(table, df)
+
+    def bulk_insert(self, frames):
+        """Same contract as CsvStore.bulk_insert: all the new rows go in with a single transaction."""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            frames = shift_id_blocks(frames, {table: self.next_id(table) - 1 for table in frames})
+            for table, new_rows in frames.items():
+                self._insert_rows(table, new_rows)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        # Rebuilt from the database the next time they are needed
+        self._search = None
+        self._slots = None
+        self._text_index_stale = True
+        return frames
+
+    def _insert_rows(self, table, df):
+        df = text_frame(df)
+        columns = [column for column in self.TABLE_COLUMNS[table] if column in df.columns]
+        rows = df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False, name=None)
+        column_sql = ', '.join(f'"{column}"' for column in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        self.conn.executemany(f'INSERT OR REPLACE INTO {self.TABLES[table]} ({column_sql}) VALUES ({placeholders})',
+                              rows)
+        if table in CsvStore.PRIMARY_KEYS and not df.empty:
+            self._bump_sequence(table, df[CsvStore.PRIMARY_KEYS[table]].max())
+
+    def _bump_sequence(self, table, row_id):
+        self.conn.execute('INSERT INTO id_sequences (TableName, LastID) VALUES (?, ?) '
+                          'ON CONFLICT (TableName) DO UPDATE SET LastID = MAX(LastID, excluded.LastID)',
+                          (table, int(row_id)))
+
+    def _query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def _query_one(self, sql, params=()):
+        row = self.conn.execute(sql, params).fetchone()
+        if row is None:
+            return None
+        return {column: ('' if row[column] is None else row[column]) for column in row.keys()}
+
+    # --- Lookups ---
+
+    def next_id(self, table):
+        row = self.conn.execute('SELECT LastID FROM id_sequences WHERE TableName = ?', (table,)).fetchone()
+        return (row[0] if row else 0) + 1
+
+    def get_patient(self, patient_id):
+        return self._query_one('SELECT * FROM patients WHERE PatientID = ?', (int(patient_id),))
+
+    def get_record(self, record_id):
+        return self._query_one('SELECT * FROM clinical_records WHERE RecordID = ?', (int(record_id),))
+
+    def get_appointment(self, appointment_id):
+        return self._query_one(f'{APPOINTMENT_SELECT} WHERE a.AppointmentID = ?', (int(appointment_id),))
+
+    def all_patients(self):
+        return self._query('SELECT * FROM patients ORDER BY PatientID')
+
+    def patients_registered_between(self, first_date, last_date):
+        return self._query('SELECT * FROM patients WHERE Registered BETWEEN ? AND ? ORDER BY PatientID',
+                           (first_date, last_date))
+
+    def patient_count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+
+    def patients_page(self, offset, limit, sort_column=None, descending=False):
+        order = sort_column if sort_column in PATIENT_COLUMNS else 'PatientID'
+        collate = ' COLLATE NOCASE' if order == 'Name' else ''
+        direction = 'DESC' if descending else 'ASC'
+        return self._query(f'SELECT * FROM patients ORDER BY "{order}"{collate} {direction} LIMIT ? OFFSET ?',
+                           (limit, offset))
+
+    def find_patients(self, search_term):
+        """Patients matching an exact Patient ID, name words (prefix or misspelt) or a phone number, best first."""
+        if self._search is None:
+            self._search = PatientSearchIndex()
+            self._search.build(self.conn.execute('SELECT PatientID, Name, Phone FROM patients'))
+        patient_ids = ranked_patient_ids(
+            self._search, search_term,
+            lambda patient_id: self.conn.execute('SELECT 1 FROM patients WHERE PatientID = ?',
+                                                 (patient_id,)).fetchone() is not None)
+        # Fetch in chunks that stay under SQLite's bound-parameter limit, then restore the ranking
+        chunks = [self._query(f'SELECT * FROM patients WHERE PatientID IN ({", ".join("?" * len(chunk))})', chunk)
+                  for chunk in (patient_ids[start:start + 500] for start in range(0, len(patient_ids), 500))]
+        if not chunks:
+            return self._query('SELECT * FROM patients WHERE 0')
+        return pd.concat(chunks).set_index('PatientID', drop=False).loc[patient_ids].reset_index(drop=True)
+
+    def _slot_index(self):
+        if self._slots is None:
+            self._slots = SlotIndex()
+            self._slots.build(self.conn.execute('SELECT AppointmentID, Date, Time, Procedure FROM appointments'))
+        return self._slots
+
+    def booking_conflicts(self, date_str, time_str, procedure, exclude_id=None):
+        """AppointmentIDs already booked over the proposed slot (see SlotIndex)."""
+        return self._slot_index().conflicts(date_str, time_str, procedure, exclude_id)
+
+    def free_slots(self, date_str, procedure, count=5, after_time=None):
+        return self._slot_index().free_slots(date_str, procedure, count, after_time)
+
+    def appointments_on(self, date_str):
+        return self._query(f'{APPOINTMENT_SELECT} WHERE a.Date = ? ORDER BY a.Time', (date_str,))
+
+    def appointments_between(self, first_date, last_date):
+        return self._query(f'{APPOINTMENT_SELECT} WHERE a.Date BETWEEN ? AND ? ORDER BY a.Date, a.Time',
+                           (first_date, last_date))
+
+    def patient_records(self, patient_id, include_archive=False):
+        # Old records are never moved out of the database, so the whole history is always included
+        return self._query('SELECT * FROM clinical_records WHERE PatientID = ? ORDER BY Date DESC',
+                           (int(patient_id),)).fillna(TEXT_FILL)
+
+    def search_records(self, query, first_date=None, last_date=None, limit=TEXT_SEARCH_RESULTS):
+        """Same contract as CsvStore.search_records."""
+        if self._text_index is None or self._text_index_stale:
+            versions = dict(self.conn.execute(f'SELECT RecordID, {VERSION_COLUMN} FROM clinical_records'))
+
+            def fetch_rows(record_ids):
+                if record_ids is None:
+                    return self.conn.execute(f'SELECT {CLINICAL_TEXT_COLUMNS} FROM clinical_records')
+                return (row for start in range(0, len(record_ids), 500) for row in self.conn.execute(
+                    f'SELECT {CLINICAL_TEXT_COLUMNS} FROM clinical_records WHERE RecordID IN '
+                    f'({", ".join("?" * len(record_ids[start:start + 500]))})', record_ids[start:start + 500]))
+
+            self._text_index = sync_text_index(self._text_index, self.text_index_file, versions, fetch_rows)
+            self._text_index_stale = False
+        ranked = self._text_index.search(query, first_date, last_date, limit)
+        if not ranked:
+            return self._query('SELECT * FROM clinical_records WHERE 0').assign(Score=[])
+        record_ids = [record_id for record_id, _ in ranked]
+        chunks = [self._query(f'SELECT * FROM clinical_records WHERE RecordID IN ({", ".join("?" * len(chunk))})',
+                              chunk)
+                  for chunk in (record_ids[start:start + 500] for start in range(0, len(record_ids), 500))]
+        records = pd.concat(chunks).set_index('RecordID', drop=False).loc[record_ids].reset_index(drop=True)
+        return records.fillna(TEXT_FILL).assign(Score=[score for _, score in ranked])
+
+    # --- Archive ---
+
+    def archive_old_rows(self, before, limit=ARCHIVE_BATCH_ROWS):
+        """Nothing to do: rows stay on disk and every lookup goes through an index, so old rows cost no memory."""
+        return 0
+
+    # --- Recently Deleted ---
+
+    def deleted_rows(self, table):
+        """Same contract as CsvStore.deleted_rows, read from the deleted_rows table."""
+        found = self.conn.execute('SELECT RowData, Deleted FROM deleted_rows WHERE TableName = ? '
+                                  'ORDER BY Deleted DESC', (table,)).fetchall()
+        return pd.DataFrame([{**json.loads(data), DELETED_COLUMN: deleted} for data, deleted in found],
+                            columns=[*self.TABLE_COLUMNS[table], DELETED_COLUMN])
+
+    def purge_deleted(self, before, limit=PURGE_BATCH_ROWS):
+        """Same contract as CsvStore.purge_deleted: one indexed DELETE of the oldest expired rows."""
+        with self.conn:
+            cursor = self.conn.execute('DELETE FROM deleted_rows WHERE rowid IN (SELECT rowid FROM deleted_rows '
+                                       'WHERE Deleted < ? ORDER BY Deleted LIMIT ?)', (before, limit))
+        return cursor.rowcount
+
+    # --- Streaming ---
+
+    def iter_chunks(self, table, columns, date_range=None, chunk_rows=STREAM_CHUNK_ROWS):
+        """Same contract as CsvStore.iter_chunks; the date filter runs in SQLite, on the Date index."""
+        column_sql = ', '.join(f'"{column}"' for column in columns if column in self.TABLE_COLUMNS[table])
+        sql, params = f'SELECT {column_sql} FROM {self.TABLES[table]}', ()
+        if date_range is not None:
+            sql, params = sql + ' WHERE Date BETWEEN ? AND ?', tuple(date_range)
+        for chunk in pd.read_sql_query(sql, self.conn, params=params, chunksize=chunk_rows):
+            yield chunk.reindex(columns=columns)
+
+    def data_fingerprint(self, tables=ALL_TABLES):
+        """Changes with every commit, by anyone: SQLite rewrites the database (or its WAL) file."""
+        return [_file_stamp(self.path), _file_stamp(self.path + '-wal')]
+
+
+def sync_text_index(index, path, versions, fetch_rows):
+    """Bring a clinical text index up to date with the records on file and return it.
+
+    ``index`` is the one in memory, or None to start from the copy saved at ``path``. ``versions`` is
+    {RecordID: Version} of every record; ``fetch_rows(record_ids)`` yields the index rows of those records (all
+    of them for None). Only records whose Version differs are re-indexed, unless most of them did.
+    """
+    if index is None:
+        index = ClinicalTextIndex.load(path)
+    stale = index.stale_ids(versions) if index is not None else None
+    if stale is None or len(stale) > len(versions) // 2:
+        # Nothing saved, or most records changed (an import): one pass over everything is quicker
+        index = ClinicalTextIndex()
+        index.build(fetch_rows(None))
+    else:
+        for row in fetch_rows(stale):
+            index.add(*row)
+    return index
+
+
+def save_text_index(index, path):
+    try:
+        index.save(path)
+    except OSError:
+        pass  # Only a head start for the next session; the index is rebuilt from the records if it is missing
+
+
+def shift_id_blocks(frames, sequences):
+    """Move each table's block of new IDs up past ``sequences`` (the last ID used per table), if they overlap.
+
+    Bulk inserts number their rows from next_id() before taking the lock; when another workstation has used some of
+    those IDs in the meantime the whole block moves, and references to patients in the moved block move with it.
+    """
+    frames = dict(frames)
+    for table, df in list(frames.items()):
+        id_column = CsvStore.PRIMARY_KEYS[table]
+        if df.empty:
+            continue
+        first_id = int(df[id_column].min())
+        shift = sequences.get(table, 0) + 1 - first_id
+        if shift <= 0:
+            continue
+        frames[table] = df.assign(**{id_column: df[id_column] + shift})
+        if table == 'patients':
+            for other in ('appointments', 'clinical'):
+                if other in frames:
+                    patient_ids = frames[other]['PatientID']
+                    frames[other] = frames[other].assign(
+                        PatientID=patient_ids.where(patient_ids < first_id, patient_ids + shift))
+    return frames
+
+
+def typed_frame(table, df):
+    """A table as read from a file (or an import) in its in-memory form: int64 IDs, text registration dates for
+    patients, and for appointments no Name column, parsed Date/Time and a categorical Procedure. Columns that are
+    already typed are left alone."""
+    id_columns = [column for column in dict.fromkeys([CsvStore.PRIMARY_KEYS[table], 'PatientID'])
+                  if column in df.columns]
+    converted = {column: pd.to_numeric(df[column], errors='coerce') for column in id_columns
+                 if df[column].dtype != 'int64'}
+    if table == 'appointments':
+        df = df.drop(columns=['Name'], errors='ignore')
+        if not pd.api.types.is_datetime64_dtype(df['Date'].dtype):
+            converted['Date'] = pd.to_datetime(df['Date'], format=DATE_FORMAT, errors='coerce')
+            converted['RawDate'] = _unparsed_text(df['Date'], converted['Date'])
+        if not pd.api.types.is_timedelta64_dtype(df['Time'].dtype):
+            converted['Time'] = pd.to_datetime(df['Time'], format=TIME_FORMAT, errors='coerce') - TIME_ORIGIN
+            converted['RawTime'] = _unparsed_text(df['Time'], converted['Time'])
+        for raw_column in RAW_TEXT_COLUMNS.values():
+            # Frames typed before the raw text was kept (old binary snapshots) get an empty column
+            if raw_column not in converted and raw_column not in df.columns:
+                converted[raw_column] = pd.Series(None, index=df.index, dtype='str')
+        if not isinstance(df['Procedure'].dtype, pd.CategoricalDtype):
+            converted['Procedure'] = df['Procedure'].astype('category')
+    if table == 'patients':
+        # Files from before registration dates were kept have no column; one of blanks reads back as floats
+        registered = df['Registered'] if 'Registered' in df.columns else pd.Series(None, index=df.index)
+        if registered.dtype != 'str':
+            converted['Registered'] = registered.astype('str')
+    if converted:
+        df = df.assign(**converted)
+    if df[id_columns].isna().any(axis=None):
+        # A row without a usable ID could never be looked up, edited or deleted
+        df = df.dropna(subset=id_columns).reset_index(drop=True)
+    return df.astype({column: 'int64' for column in id_columns})
+
+
+def cascaded(entry):
+    """A journal entry followed by the entries it implies: a patient's delete or restore, journaled once, tombstones
+    or restores their appointments and clinical records too, with the same stamp."""
+    if entry['table'] != 'patients' or entry['op'] not in ('delete', 'restore') or entry.get('row') is None:
+        return [entry]
+    return [entry, *({**entry, 'table': table} for table in CASCADE_TABLES)]
+
+
+def typed_row(table, row):
+    """One row as journaled, with its values converted to the in-memory column types (and any Date or Time text
+    that does not parse kept in its RAW_TEXT_COLUMNS column)."""
+    if table != 'appointments':
+        return row
+    typed = dict(row)
+    if 'Date' in typed:
+        typed['Date'] = pd.to_datetime(typed['Date'], format=DATE_FORMAT, errors='coerce')
+        typed['RawDate'] = _raw_text(row['Date'], typed['Date'])
+    if 'Time' in typed:
+        typed['Time'] = pd.to_datetime(typed['Time'], format=TIME_FORMAT, errors='coerce') - TIME_ORIGIN
+        typed['RawTime'] = _raw_text(row['Time'], typed['Time'])
+    return typed
+
+
+def _raw_text(text, parsed):
+    if not pd.isna(parsed) or text is None or pd.isna(text) or not str(text).strip():
+        return None
+    return str(text)
+
+
+def _unparsed_text(text, parsed):
+    """The text of the values that did not parse; missing wherever they did (or there was nothing to parse)."""
+    text = text.astype('str')
+    return text.where(parsed.isna() & text.notna() & (text.str.strip() != ''))
+
+
+def _is_slot(date, time_str):
+    """Whether an appointment's Date and Time text are in the stored formats, so it can be indexed."""
+    try:
+        datetime.strptime(f'{date} {time_str}', f'{DATE_FORMAT} {TIME_FORMAT}')
+    except ValueError:
+        return False
+    return True
+
+
+def text_frame(df):
+    """``df`` with its typed Date, Time and categorical columns turned back into the text callers and files use.
+
+    Text that never parsed comes back from its RAW_TEXT_COLUMNS column, which is then dropped.
+    """
+    converted = {}
+    for column, dtype in df.dtypes.items():
+        if pd.api.types.is_datetime64_dtype(dtype):
+            converted[column] = _format_distinct(df[column], DATE_FORMAT)
+        elif pd.api.types.is_timedelta64_dtype(dtype):
+            converted[column] = _format_distinct(df[column], TIME_FORMAT, TIME_ORIGIN)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            converted[column] = df[column].astype('str')
+    raw_columns = [raw for raw in RAW_TEXT_COLUMNS.values() if raw in df.columns]
+    for column, raw in RAW_TEXT_COLUMNS.items():
+        if column in converted and raw in df.columns:
+            converted[column] = converted[column].fillna(df[raw])
+    return df.assign(**converted).drop(columns=raw_columns)
+
+
+def _format_distinct(values, date_format, origin=None):
+    # A practice has a few thousand dates and a few dozen times, so each is formatted once rather than per row
+    codes, distinct = pd.factorize(values)
+    if origin is not None:
+        distinct = origin + distinct
+    # Code -1 (NaT) falls outside the formatted values and comes back missing
+    formatted = pd.Series(distinct.strftime(date_format)).reindex(codes)
+    return pd.Series(formatted.to_numpy(), index=values.index)
+
+
+def _fit_category(df, column, value):
+    """Make room in a categorical column for a value it has not held before (a new procedure)."""
+    if isinstance(df[column].dtype, pd.CategoricalDtype) and not pd.isna(value) \
+            and value not in df[column].cat.categories:
+        df[column] = df[column].cat.add_categories([value])
+
+
+def _append_row(df, label, row):
+    # df.loc[label] = ... would turn a categorical column back into text, so build the row with the frame's dtypes
+    for column, value in row.items():
+        if column in df.columns:
+            _fit_category(df, column, value)
+    # A bare NaT (a time that did not parse) would be taken for a datetime, so missing values go in as None
+    values = [None if row.get(column) is pd.NaT else row.get(column) for column in df.columns]
+    new_row = pd.DataFrame([values], columns=df.columns, index=[label])
+    return pd.concat([df, new_row.astype(df.dtypes.to_dict())])
+
+
+def _dated_before(df, date):
+    """Mask of the rows dated before ``date`` (YYYY-MM-DD); rows without a valid date never count as old."""
+    if pd.api.types.is_datetime64_dtype(df['Date'].dtype):
+        return df['Date'] < pd.Timestamp(date)
+    dates = df['Date'].astype(str)
+    return (dates < date) & dates.str.fullmatch(r'\d{4}-\d{2}-\d{2}')
+
+
+def _in_date_range(df, date_range):
+    if date_range is None:
+        return df
+    if pd.api.types.is_datetime64_dtype(df['Date'].dtype):
+        dates, first, last = df['Date'], pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+    else:
+        dates, (first, last) = df['Date'].astype(str), date_range
+    return df[(dates >= first) & (dates <= last)]
+
+
+def _discard_temp_files(written):
+    for temp_path, _ in written:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def snapshot_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+
+def open_store(backend='csv'):
+    """Create the configured storage backend ('csv' or 'sqlite')."""
+    if backend == 'sqlite':
+        return SqliteStore()
+    return CsvStore()
+
+
+def migrate_csv_to_sqlite(csv_store, sqlite_store):
+    """One-shot copy of the CSV files (including any un-compacted journal changes) into SQLite.
+
+    Archived appointments and records come along; rows deleted but not yet purged are left behind.
+    """
+    csv_store.setup()
+    csv_store.load()
+    frames = [pd.concat([csv_store._live_frame(table), *csv_store._archived_between(table)], ignore_index=True)
+              if table in ARCHIVED_TABLES else csv_store._live_frame(table) for table in ALL_TABLES]
+    for table, df in zip(ALL_TABLES, frames):
+        sqlite_store.insert_frame(table, df)
+    csv_store.journal.close()
+    return tuple(len(df) for df in frames)
+
+
+if __name__ == "__main__":
+    # Usage: python dental_store.py migrate [database_file]
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        sys.exit("Usage: python dental_store.py migrate [database_file]")
+    target = SqliteStore(sys.argv[2] if len(sys.argv) > 2 else SQLITE_FILE)
+    target.connect()
+    if target.conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]:
+        sys.exit(f"{target.path} already contains patients; refusing to migrate twice.")
+    counts = migrate_csv_to_sqlite(CsvStore(), target)
+    target.close()
+    print("Migrated %d patients, %d appointments and %d clinical records into %s" % (counts + (target.path,)))
@@ -0,0 +1,147 @@
+# dental_synthetic.py
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dental_store import (APPOINTMENT_COLUMNS, APPOINTMENTS_FILE, CLINICAL_COLUMNS, CLINICAL_RECORDS_FILE,
+                          JOURNAL_FILE, PATIENT_COLUMNS, PATIENTS_FILE, SEQUENCE_FILE, VERSION_COLUMN,
+                          snapshot_path_for)
+
+# --- Generator Configuration ---
+DEFAULT_SEED = 20240101  # Same seed and anchor date -> byte-identical files
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1M': 1000000}
+HISTORY_DAYS = 3 * 365  # Appointments and records go back this far from the anchor date
+FUTURE_DAYS = 90  # Appointments are booked up to this far ahead
+OPENING_SLOTS = 32  # 09:00 to 16:45 in 15-minute steps
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+               'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+               'Ahmed', 'Fatima', 'Wei', 'Mei', 'Raj', 'Priya', 'Carlos', 'Sofia', 'Olumide', 'Amara', 'Yuki',
+               'Hiroshi', 'Ivan', 'Olga', 'Lars', 'Ingrid', 'Sean', 'Aoife', 'Mateo', 'Lucia']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson',
+              'Martin', 'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis',
+              'Robinson', 'Khan', 'Patel', 'Chen', 'Wang', 'Okafor', 'Nakamura', 'Ivanova', 'Larsen', "O'Brien",
+              'Fernandez']
+MEDICAL_NOTES = ['', '', '', '', '', 'Penicillin allergy', 'Type 2 diabetes', 'On blood thinners', 'Latex allergy',
+                 'Anxious patient', 'Pregnant', 'Hypertension']
+# Procedure -> share of appointments
+PROCEDURES = {'Checkup': 0.30, 'Cleaning': 0.22, 'Filling': 0.14, 'X-ray': 0.08, 'Consultation': 0.08,
+              'Extraction': 0.06, 'Root canal': 0.04, 'Crown': 0.03, 'Whitening': 0.03, 'Implant': 0.02}
+# (Problem, TreatmentPlan) pairs for clinical records
+FINDINGS = [('Dental caries, lower left molar', 'Composite filling'),
+            ('Gingivitis', 'Scale and polish; review in 3 months'),
+            ('Irreversible pulpitis', 'Root canal treatment, then crown'),
+            ('Fractured incisor', 'Composite bonding'),
+            ('Impacted wisdom tooth', 'Surgical extraction'),
+            ('Routine examination, no findings', ''),
+            ('Tooth sensitivity', 'Desensitising toothpaste; review'),
+            ('Periodontitis', 'Deep cleaning, root planing'),
+            ('Missing premolar', 'Implant consultation'),
+            ('Discoloured teeth', 'Whitening course')]
+MEDICATIONS = ['', '', '', 'Ibuprofen 400mg', 'Amoxicillin 500mg, Ibuprofen 400mg', 'Paracetamol 500mg',
+               'Chlorhexidine mouthwash', 'Metronidazole 400mg', 'Lidocaine 2%', 'Fluoride varnish']
+
+
+def parse_size(size):
+    """'10k' / '1M' / '2500' -> number of rows."""
+    if size in SIZES:
+        return SIZES[size]
+    text = str(size).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def _dates(rng, count, anchor, first_offset, last_offset):
+    """Random weekday dates (YYYY-MM-DD) between anchor + first_offset and anchor + last_offset days."""
+    days = rng.integers(first_offset, last_offset + 1, count)
+    dates = pd.to_datetime(anchor) + pd.to_timedelta(days, unit='D')
+    # The clinic works weekdays only: weekend dates move back to a random day of the same week
+    weekend_shift = np.where(dates.dayofweek >= 5, dates.dayofweek - 4 + rng.integers(0, 5, count), 0)
+    dates = dates - pd.to_timedelta(weekend_shift, unit='D')
+    return pd.Series(dates.strftime('%Y-%m-%d'))
+
+
+def generate_tables(rows, seed=DEFAULT_SEED, anchor=None):
+    """{table: DataFrame} with ``rows`` patients, ``rows`` appointments and ``rows`` clinical records.
+
+    Dates are placed around ``anchor`` (default: today), so today's dashboard and the coming weeks look like a
+    busy practice's. Everything else depends only on ``seed``.
+    """
+    rng = np.random.default_rng(seed)
+    anchor = anchor or datetime.now().strftime('%Y-%m-%d')
+
+    patient_ids = np.arange(1, rows + 1)
+    names = (pd.Series(np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), rows)]) + ' '
+             + pd.Series(np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), rows)]))
+    phones = ('555-' + pd.Series(rng.integers(0, 1000, rows)).astype(str).str.zfill(3) + '-'
+              + pd.Series(rng.integers(0, 10000, rows)).astype(str).str.zfill(4))
+    patients = pd.DataFrame({'PatientID': patient_ids, 'Name': names, 'Phone': phones,
+                             'MedicalNotes': rng.choice(MEDICAL_NOTES, rows)})
+
+    appointment_patients = patient_ids[rng.integers(0, rows, rows)]
+    minutes = 9 * 60 + 15 * rng.integers(0, OPENING_SLOTS, rows)
+    appointments = pd.DataFrame({
+        'AppointmentID': np.arange(1, rows + 1),
+        'PatientID': appointment_patients,
+        'Date': _dates(rng, rows, anchor, -HISTORY_DAYS, FUTURE_DAYS),
+        'Time': [f'{minute // 60:02d}:{minute % 60:02d}' for minute in minutes],
+        'Procedure': rng.choice(list(PROCEDURES), rows, p=list(PROCEDURES.values())),
+    })
+
+    findings = rng.integers(0, len(FINDINGS), rows)
+    clinical = pd.DataFrame({
+        'RecordID': np.arange(1, rows + 1),
+        'PatientID': patient_ids[rng.integers(0, rows, rows)],
+        'Date': _dates(rng, rows, anchor, -HISTORY_DAYS, 0),
+        'Problem': [FINDINGS[finding][0] for finding in findings],
+        'TreatmentPlan': [FINDINGS[finding][1] for finding in findings],
+        'Medications': rng.choice(MEDICATIONS, rows),
+    })
+
+    # Drawn last, so the other columns are the same as in datasets generated before patients had this one
+    patients['Registered'] = _dates(rng, rows, anchor, -HISTORY_DAYS, 0)
+
+    tables = {'patients': patients, 'appointments': appointments, 'clinical': clinical}
+    columns = {'patients': PATIENT_COLUMNS, 'appointments': APPOINTMENT_COLUMNS, 'clinical': CLINICAL_COLUMNS}
+    return {table: df.assign(**{VERSION_COLUMN: 1})[columns[table]] for table, df in tables.items()}
+
+
+def write_dataset(directory, rows, seed=DEFAULT_SEED, anchor=None):
+    """Write a complete data folder (the three CSVs the app reads) into ``directory``; returns the file paths."""
+    os.makedirs(directory, exist_ok=True)
+    files = {'patients': PATIENTS_FILE, 'appointments': APPOINTMENTS_FILE, 'clinical': CLINICAL_RECORDS_FILE}
+    # A journal, sequences or snapshots left from an earlier dataset would be read on top of the new CSVs
+    stale = [JOURNAL_FILE, SEQUENCE_FILE] + [snapshot_path_for(name) for name in files.values()]
+    for name in stale:
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    paths = {}
+    for table, df in generate_tables(rows, seed, anchor).items():
+        paths[table] = os.path.join(directory, files[table])
+        df.to_csv(paths[table], index=False)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic practice data folder for testing and "
+                                                 "benchmarking (never point it at the real data folder).")
+    parser.add_argument('size', help="rows per table: 1k, 10k, 100k, 1M or a number")
+    parser.add_argument('--out', help="folder to write to (default: synthetic_<size>)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--anchor', help="YYYY-MM-DD the dates are placed around (default: today)")
+    args = parser.parse_args()
+    try:
+        row_count = parse_size(args.size)
+        if args.anchor:
+            datetime.strptime(args.anchor, '%Y-%m-%d')
+    except ValueError:
+        sys.exit("Size must be 1k, 10k, 100k, 1M or a number, and --anchor a YYYY-MM-DD date.")
+    out = args.out or f'synthetic_{args.size}'
+    for written in write_dataset(out, row_count, args.seed, args.anchor).values():
+        print(f"Wrote {written}")
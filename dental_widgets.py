@@ -0,0 +1,366 @@
+# dental_widgets.py
+
+import bisect
+import queue
+import threading
+import tkinter as tk
+from datetime import date, timedelta
+from tkinter import ttk
+
+OVERSCAN_ROWS = 5  # Extra rows materialized below the viewport so resizes and small scrolls never show blanks
+MONTH_CELL_LINES = 4  # Appointments listed in a month-view day before it shows "+N more"
+SEARCH_DEBOUNCE_MS = 250  # Typing pause after which a live search starts
+
+
+def _longest_increasing_run(positions):
+    """Indexes into ``positions`` forming its longest increasing subsequence (patience sorting, O(n log n))."""
+    tails, tail_indexes, previous = [], [], [None] * len(positions)
+    for index, position in enumerate(positions):
+        slot = bisect.bisect_left(tails, position)
+        if slot:
+            previous[index] = tail_indexes[slot - 1]
+        if slot == len(tails):
+            tails.append(position)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = position
+            tail_indexes[slot] = index
+    run = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        run.append(index)
+        index = previous[index]
+    return run[::-1]
+
+
+class TreeDiff:
+    """Keeps a flat Treeview in step with a list of keyed rows using as few Tk calls as possible.
+
+    ``apply(rows)`` takes (iid, values) pairs in display order and only issues the deletes, inserts, value updates
+    and moves that differ from what is already on screen. The values shown are cached here, so unchanged rows cost
+    no Tk calls at all, and selection and scroll position survive a refresh.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.shown = {}  # iid -> values currently displayed
+        self.order = []  # iids in display order
+
+    def apply(self, rows):
+        rows = [(str(iid), tuple(values)) for iid, values in rows]
+        target = {iid: position for position, (iid, _) in enumerate(rows)}
+
+        stale = [iid for iid in self.order if iid not in target]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self.shown[iid]
+
+        # Rows already on screen in the right relative order stay put; everything else is (re)placed.
+        survivors = [iid for iid in self.order if iid in target]
+        in_place = {survivors[index] for index in _longest_increasing_run([target[iid] for iid in survivors])}
+        movers = [iid for iid in survivors if iid not in in_place]
+        if movers:
+            focus, selection = self.tree.focus(), self.tree.selection()
+            self.tree.detach(*movers)
+
+        for position, (iid, values) in enumerate(rows):
+            if iid not in self.shown:
+                self.tree.insert('', position, iid=iid, values=values)
+            else:
+                if iid not in in_place:
+                    self.tree.move(iid, '', position)
+                if self.shown[iid] != values:
+                    self.tree.item(iid, values=values)
+            self.shown[iid] = values
+
+        if movers:
+            if focus and self.tree.exists(focus):
+                self.tree.focus(focus)
+            if selection:
+                self.tree.selection_set([iid for iid in selection if self.tree.exists(iid)])
+        self.order = [iid for iid, _ in rows]
+
+
+class LiveSearch:
+    """Runs a search as the user types without ever blocking the Tk thread.
+
+    ``schedule(query)`` on each keystroke restarts a ``delay_ms`` timer, so a query only starts once typing
+    pauses. It then takes ``snapshot()`` on the Tk thread and runs ``search(snapshot, query, cancelled)`` on a
+    worker thread. A newer keystroke cancels the query in flight: ``cancelled()`` turns true, so the search can
+    stop early, and any result it still produces is dropped. Results (and errors) are handed back to the Tk
+    thread through ``after`` and passed to ``on_results`` (``on_error``).
+    """
+
+    def __init__(self, widget, snapshot, search, on_results, on_error=None, delay_ms=SEARCH_DEBOUNCE_MS):
+        self.widget = widget
+        self.snapshot = snapshot
+        self.search = search
+        self.on_results = on_results
+        self.on_error = on_error
+        self.delay_ms = delay_ms
+        self._timer = None
+        self._generation = 0  # Bumped by every keystroke; a query is current while its number is the latest
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='dental-search', daemon=True)
+        self._thread.start()
+
+    def schedule(self, query):
+        self.cancel()
+        generation = self._generation
+        self._timer = self.widget.after(self.delay_ms, lambda: self._start(query, generation))
+
+    def cancel(self):
+        """Forget the pending query and the one in flight, e.g. once the search box is cleared."""
+        self._generation += 1
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+            self._timer = None
+
+    def _start(self, query, generation):
+        self._timer = None
+        self._queue.put((self.snapshot(), query, generation))
+
+    def _run(self):
+        while True:
+            snapshot, query, generation = self._queue.get()
+            cancelled = lambda generation=generation: generation != self._generation
+            if cancelled():
+                continue
+            try:
+                results = self.search(snapshot, query, cancelled)
+            except Exception as error:
+                callback, value = self.on_error, error
+            else:
+                callback, value = self.on_results, results
+            if callback is None or cancelled():
+                continue
+            try:
+                # Bound now: by the time Tk runs this the worker may already be on the next query
+                self.widget.after(0, lambda generation=generation, callback=callback, value=value:
+                                  generation != self._generation or callback(value))
+            except RuntimeError:
+                return  # The window has been closed
+
+
+class VirtualTreeview(ttk.Frame):
+    """A Treeview that only holds the rows in its viewport plus a small overscan margin.
+
+    Rows come from ``fetch_rows(offset, limit, sort_column, descending)``, which returns (iid, values) pairs,
+    and ``count_rows()``. The scrollbar is mapped onto the full row count, so the number of Treeview items stays
+    bounded however many rows the source has.
+    """
+
+    def __init__(self, master, columns, fetch_rows, count_rows, overscan=OVERSCAN_ROWS):
+        super().__init__(master)
+        self.fetch_rows = fetch_rows
+        self.count_rows = count_rows
+        self.overscan = overscan
+        self.offset = 0
+        self.total = 0
+        self.visible = 20
+        self.sort_column = None
+        self.descending = False
+        self.headings = {}
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        self.rows = TreeDiff(self.tree)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.tree.pack(side=tk.LEFT, fill='both', expand=True)
+
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll_by(3))
+        self.tree.bind('<Up>', self._on_arrow)
+        self.tree.bind('<Down>', self._on_arrow)
+        self.tree.bind('<Prior>', lambda event: self.scroll_by(-self.visible) or 'break')
+        self.tree.bind('<Next>', lambda event: self.scroll_by(self.visible) or 'break')
+
+    def heading(self, column, text):
+        """Configure a column heading; clicking it sorts the whole source, not just the rows on screen."""
+        self.headings[column] = text
+        self.tree.heading(column, text=text, command=lambda: self.sort_by(column))
+
+    def sort_by(self, column):
+        self.descending = not self.descending if self.sort_column == column else False
+        self.sort_column = column
+        for heading_column, text in self.headings.items():
+            arrow = (' ▼' if self.descending else ' ▲') if heading_column == column else ''
+            self.tree.heading(heading_column, text=text + arrow)
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the row count and re-materialize the rows in view."""
+        self.total = self.count_rows()
+        self._render()
+
+    def scroll_to(self, offset):
+        offset = max(0, min(int(offset), max(self.total - self.visible, 0)))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def _render(self):
+        self.offset = max(0, min(self.offset, max(self.total - self.visible, 0)))
+        # Scrolling by a few rows only inserts/deletes those rows at the edges of the window
+        self.rows.apply(self.fetch_rows(self.offset, self.visible + self.overscan, self.sort_column, self.descending))
+        self.tree.yview_moveto(0)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        if not self.total:
+            self.scrollbar.set(0, 1)
+            return
+        self.scrollbar.set(self.offset / self.total, min((self.offset + self.visible) / self.total, 1.0))
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(float(args[0]) * self.total)
+        elif action == 'scroll':
+            step = self.visible if args[1] == 'pages' else 1
+            self.scroll_by(int(args[0]) * step)
+
+    def _on_mousewheel(self, event):
+        self.scroll_by(-3 if event.delta > 0 else 3)
+        return 'break'
+
+    def _on_resize(self, event):
+        row_height = int(ttk.Style(self).lookup('Treeview', 'rowheight') or 20)
+        # One row's worth of height goes to the column headings
+        visible = max(1, event.height // row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def _on_arrow(self, event):
+        """Move the focus row by row, scrolling the window when the focus reaches its edge."""
+        children = self.tree.get_children()
+        if not children:
+            return 'break'
+        focus = self.tree.focus()
+        position = self.offset + (children.index(focus) if focus in children else -1)
+        target = position + (-1 if event.keysym == 'Up' else 1)
+        if target < 0 or target >= self.total:
+            return 'break'
+        if target < self.offset:
+            self.scroll_to(target)
+        elif target >= self.offset + self.visible:
+            self.scroll_to(target - self.visible + 1)
+        iid = self.tree.get_children()[target - self.offset]
+        self.tree.focus(iid)
+        self.tree.selection_set(iid)
+        return 'break'
+
+
+class CalendarView(ttk.Frame):
+    """A week or month grid of appointments.
+
+    Only the days in view are asked for: ``fetch_range(first_date, last_date)`` returns {'YYYY-MM-DD': [line, ...]}
+    for the days that have appointments. The grid's cells are built once per mode and refilled on every refresh.
+    """
+
+    def __init__(self, master, fetch_range, month_lines=MONTH_CELL_LINES):
+        super().__init__(master)
+        self.fetch_range = fetch_range
+        self.month_lines = month_lines
+        self.mode = tk.StringVar(value='week')
+        self.anchor = date.today()
+        self.cells = {}  # mode -> [(day label, listbox)] in grid order
+
+        header = ttk.Frame(self)
+        header.pack(fill='x', pady=(0, 5))
+        ttk.Button(header, text='◀', width=3, command=lambda: self.step(-1)).pack(side=tk.LEFT)
+        ttk.Button(header, text='Today', command=self.go_to_today).pack(side=tk.LEFT, padx=5)
+        ttk.Button(header, text='▶', width=3, command=lambda: self.step(1)).pack(side=tk.LEFT)
+        self.title_label = ttk.Label(header, font=('Helvetica', 12, 'bold'))
+        self.title_label.pack(side=tk.LEFT, padx=15)
+        for mode in ('month', 'week'):
+            ttk.Radiobutton(header, text=mode.title(), value=mode, variable=self.mode,
+                            command=self.refresh).pack(side=tk.RIGHT, padx=5)
+
+        self.grids = {'week': ttk.Frame(self), 'month': ttk.Frame(self)}
+
+    def first_and_last_day(self):
+        if self.mode.get() == 'week':
+            first = self.anchor - timedelta(days=self.anchor.weekday())
+            return first, first + timedelta(days=6)
+        # Whole weeks, Monday first, covering the month
+        month_start = self.anchor.replace(day=1)
+        first = month_start - timedelta(days=month_start.weekday())
+        return first, first + timedelta(days=7 * 6 - 1)
+
+    def step(self, direction):
+        if self.mode.get() == 'week':
+            self.anchor += timedelta(days=7 * direction)
+        else:
+            month_index = self.anchor.year * 12 + self.anchor.month - 1 + direction
+            self.anchor = date(month_index // 12, month_index % 12 + 1, 1)
+        self.refresh()
+
+    def go_to_today(self):
+        self.anchor = date.today()
+        self.refresh()
+
+    def show_week(self, day):
+        self.anchor = day
+        self.mode.set('week')
+        self.refresh()
+
+    def refresh(self):
+        mode = self.mode.get()
+        first, last = self.first_and_last_day()
+        lines_by_day = self.fetch_range(first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d'))
+
+        for grid_mode, grid in self.grids.items():
+            if grid_mode == mode:
+                grid.pack(fill='both', expand=True)
+            else:
+                grid.pack_forget()
+        if mode not in self.cells:
+            self.cells[mode] = self._build_cells(mode)
+
+        if mode == 'week':
+            self.title_label.config(text=f"Week of {first.strftime('%d %b %Y')}")
+        else:
+            self.title_label.config(text=self.anchor.strftime('%B %Y'))
+        for offset, (day_label, listbox) in enumerate(self.cells[mode]):
+            day = first + timedelta(days=offset)
+            lines = lines_by_day.get(day.strftime('%Y-%m-%d'), [])
+            if mode == 'week':
+                day_label.config(text=day.strftime('%a %d %b'))
+            else:
+                day_label.config(text=str(day.day), foreground='' if day.month == self.anchor.month else 'gray')
+                if len(lines) > self.month_lines:
+                    lines = lines[:self.month_lines - 1] + [f'+{len(lines) - self.month_lines + 1} more']
+            listbox.delete(0, tk.END)
+            if lines:
+                listbox.insert(tk.END, *lines)
+            day_label.day = day
+
+    def _build_cells(self, mode):
+        grid = self.grids[mode]
+        columns, rows = 7, (1 if mode == 'week' else 6)
+        cells = []
+        for row in range(rows):
+            grid.rowconfigure(row, weight=1, uniform='calendar-row')
+            for column in range(columns):
+                grid.columnconfigure(column, weight=1, uniform='calendar-column')
+                cell = ttk.Frame(grid, relief='solid', borderwidth=1)
+                cell.grid(row=row, column=column, sticky='nsew')
+                day_label = ttk.Label(cell, anchor='w')
+                day_label.pack(fill='x', padx=2)
+                listbox = tk.Listbox(cell, height=self.month_lines if mode == 'month' else 20, borderwidth=0,
+                                     highlightthickness=0, activestyle='none')
+                listbox.pack(fill='both', expand=True)
+                if mode == 'month':
+                    # Double-clicking a day opens its week with every appointment listed
+                    for widget in (cell, day_label, listbox):
+                        widget.bind('<Double-1>', lambda event, label=day_label: self.show_week(label.day))
+                cells.append((day_label, listbox))
+        return cells
@@ -0,0 +1,127 @@
+# dental_writer.py
+
+import os
+import queue
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from dental_metrics import add_bytes, measure
+
+COALESCE_DELAY_SECONDS = 0.05  # How long the writer waits for more snapshot requests before touching the disk
+
+
+def atomic_write_csv(df, path):
+    """Write a DataFrame to a temp file next to ``path`` and rename it into place, so readers never see half a file."""
+    os.replace(write_temp_csv(df, path), path)
+
+
+def atomic_write_feather(df, path):
+    """Write a binary columnar (Feather / Arrow IPC) snapshot with its dtypes, using the same temp-and-rename."""
+    os.replace(write_temp_feather(df, path), path)
+
+
+def temp_path_for(path):
+    # Unique per write: workstations sharing the folder may be serializing the same table at once
+    return f'{path}.{uuid.uuid4().hex}.tmp'
+
+
+def write_temp_csv(df, path):
+    """Write a DataFrame to a new temp file next to ``path`` and return the temp file's path, to be renamed later."""
+    temp_path = temp_path_for(path)
+    with open(temp_path, 'w', encoding='utf-8', newline='') as temp_file:
+        df.to_csv(temp_file, index=False)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+        add_bytes(os.fstat(temp_file.fileno()).st_size)
+    return temp_path
+
+
+def write_temp_feather(df, path):
+    """The Feather counterpart of ``write_temp_csv``."""
+    df = df.reset_index(drop=True)
+    for column in df.columns:
+        if df[column].dtype == object:
+            # Arrow needs one type per column; edited columns such as Phone can hold both ints and strings.
+            # Blanks stay missing, so the snapshot reads back just like the CSV would.
+            df[column] = df[column].map(lambda value: value if isinstance(value, str) or pd.isna(value)
+                                        else str(value))
+    temp_path = temp_path_for(path)
+    with open(temp_path, 'wb') as temp_file:
+        df.to_feather(temp_file)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+        add_bytes(temp_file.tell())
+    return temp_path
+
+
+class BackgroundWriter:
+    """Writes full snapshots of the CSV store on one background thread.
+
+    Journal appends stay on the calling thread, since they have to happen under the shared-folder lock and be
+    checked for conflicts first. Snapshots (rewriting whole tables) are the slow part, so the Tk thread only
+    queues a function that writes one. If several are queued before the writer gets to them, only the latest is
+    written, since it already contains everything the earlier ones did.
+    """
+
+    def __init__(self, journal, on_error=None, coalesce_delay=COALESCE_DELAY_SECONDS):
+        self.journal = journal
+        self.on_error = on_error
+        self.coalesce_delay = coalesce_delay
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='dental-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def snapshot(self, write_snapshot):
+        """Queue a function that writes a full snapshot and empties the journal."""
+        self._queue.put(('snapshot', write_snapshot))
+
+    def flush(self):
+        """Block until everything queued so far is on disk (or has failed)."""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        done.wait()
+
+    def close(self):
+        """Write out everything still queued, then stop the thread. Called when the window closes."""
+        self._queue.put(('stop', None))
+        self._thread.join()
+        self.journal.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(self.coalesce_delay)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._write_batch(batch):
+                return
+
+    def _write_batch(self, batch):
+        snapshots = [payload for kind, payload in batch if kind == 'snapshot']
+        if snapshots:
+            try:
+                with measure('background_snapshot'):
+                    snapshots[-1]()
+            except Exception as error:
+                # The journal still holds every change, so nothing is lost; report it and try again next time
+                self._report(error)
+
+        keep_running = True
+        for kind, payload in batch:
+            if kind == 'flush':
+                payload.set()
+            elif kind == 'stop':
+                keep_running = False
+        return keep_running
+
+    def _report(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
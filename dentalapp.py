@@ -1,16 +1,41 @@
 # modern_dental_app_final.py
 
+import time
+
+STARTUP_STARTED = time.perf_counter()  # Taken before any other import so the startup figure includes them
+
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, Text
-import pandas as pd
+from tkinter import ttk, messagebox, simpledialog, filedialog, Text
 from datetime import datetime
 import os
-from PIL import Image, ImageTk
+
+from dental_core import DELETED_RETENTION_DAYS, DentalPractice, DoubleBookingError, NotFoundError, ValidationError
+from dental_lock import ConflictError, LockTimeout
+from dental_search import PatientSearchMirror
+from dental_stats import DashboardStats
+from dental_widgets import CalendarView, LiveSearch, TreeDiff, VirtualTreeview
+
+# pandas (via dental_store) and Pillow are imported during staged startup, after the window is on screen
 
 # --- Configuration ---
-PATIENTS_FILE = 'dental_patients.csv'
-APPOINTMENTS_FILE = 'dental_appointments.csv'
-CLINICAL_RECORDS_FILE = 'clinical_records.csv'
+# 'csv' (files + change journal), 'sqlite', or 'service' to share a running dental_service.py (DENTAL_SERVICE_URL)
+STORAGE_BACKEND = os.environ.get('DENTAL_STORAGE', 'csv')
+JOURNAL_COMPACT_INTERVAL_MS = 10 * 60 * 1000  # Fold the journal back into the CSVs at least this often
+CHANGE_POLL_INTERVAL_MS = 2000  # How often to pick up edits made on other workstations sharing the data folder
+FREE_SLOT_SUGGESTIONS = 5  # Free slots offered by "Find Free Slot"
+METRICS_ENABLED = os.environ.get('DENTAL_METRICS') == '1'  # Opt-in timing of handlers and data operations
+# Handlers timed when METRICS_ENABLED; data operations are timed through the practice (see dental_metrics)
+INSTRUMENTED_HANDLERS = (
+    'staged_startup', 'on_tab_changed', 'poll_for_changes', 'periodic_compaction', 'on_close',
+    'add_patient', 'edit_patient', 'delete_patient', 'on_patient_search_typed', 'show_patient_search_results',
+    'view_selected_patient_records',
+    'schedule_appointment', 'edit_appointment', 'delete_appointment', 'find_free_slot',
+    'add_clinical_record', 'edit_clinical_record', 'delete_clinical_record', 'display_full_record',
+    'populate_clinical_tab', 'refresh_appointment_list', 'refresh_patient_list', 'fetch_patient_rows',
+    'fetch_calendar_range', 'run_reports', 'show_report', 'export_report', 'search_clinical_records',
+    'open_searched_record', 'show_recently_deleted', 'run_call_lists', 'load_dashboard_stats',
+    'refresh_dashboard_stats',
+)
 
 # --- UI Configuration ---
 BG_COLOR = "#f0f8ff"
@@ -23,6 +48,9 @@ HEADING_FONT = ("Helvetica", 16, "bold")
 BODY_FONT = ("Helvetica", 10)
 BUTTON_FONT = ("Helvetica", 10, "bold")
 
+# Patient list column -> data column used when sorting by that heading
+PATIENT_SORT_COLUMNS = {'ID': 'PatientID', 'Name': 'Name', 'Phone': 'Phone'}
+
 # Image files (Ensure these exist or the try/except blocks will skip them)
 # You may need to create simple placeholder files named 'dental_background.png' and 'tooth_icon.png'
 BACKGROUND_IMAGE_PATH = 'dental_background.png'
@@ -39,17 +67,58 @@ class DentalPracticeApp:
 
         self.selected_patient_id = None
         self.selected_patient_name = None
+        self.patient_filter_df = None  # Search results shown in the patient list, or None for all patients
+        self.patient_snapshot = None  # Copy of the patient rows the search worker reads, taken again after they change
+        self.patient_search_index = PatientSearchMirror()  # The search worker's own index over those rows
+        self.search_client = None  # The search worker's own PracticeClient, with the service backend
+        self.practice = None  # DentalPractice over local files, or a PracticeClient of the shared service
+        self.stats = None  # DashboardStats, read in full at startup and then kept current by each change made here
+        self.patients_loaded = False
+        self.startup_timings = {}
+        self.metrics = None
+        if METRICS_ENABLED:
+            from dental_metrics import Instrumentation
+            self.metrics = Instrumentation()
+            self.metrics.install()
+            # Before the widgets are built, so their commands and callbacks bind to the measured methods
+            self.metrics.instrument_methods(self, INSTRUMENTED_HANDLERS)
+            self.metrics.start_heartbeat(self.root)
 
         self.style = ttk.Style(self.root)
         self.setup_styles()
 
-        self.setup_data_files()
-        self.load_data()
-
         self.create_main_layout()
 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Show the window first; data and images are loaded in stages once Tk is idle
+        self.root.after_idle(self.staged_startup)
+
+    def staged_startup(self):
+        """Today's dashboard first (appointments, and the patients for their names), then the patient list; clinical
+        records wait until they are first needed."""
+        self.startup_timings['window'] = time.perf_counter() - STARTUP_STARTED
+
+        self.setup_data_files()
+        self.load_data(tables=('appointments',))
         self.refresh_appointment_list()
+        self.startup_timings['dashboard'] = time.perf_counter() - STARTUP_STARTED
+        self.root.update_idletasks()  # Paint the dashboard before filling the patient list
+
+        self.load_data(tables=('patients',))
+        self.patients_loaded = True
         self.refresh_patient_list()
+        self.startup_timings['patients'] = time.perf_counter() - STARTUP_STARTED
+
+        self.practice.start_background_writer(on_error=self.report_write_error)
+        self.root.after(JOURNAL_COMPACT_INTERVAL_MS, self.periodic_compaction)
+        self.root.after(CHANGE_POLL_INTERVAL_MS, self.poll_for_changes)
+        self.root.after_idle(self.load_images)
+        self.root.after_idle(self.load_dashboard_stats)
+
+        timings = self.startup_timings
+        summary = (f"Started in {timings['patients']:.2f} s (window {timings['window']:.2f} s, "
+                   f"dashboard {timings['dashboard']:.2f} s)")
+        self.status_label.config(text=summary)
 
     def setup_styles(self):
         self.style.theme_use('clam')
@@ -69,38 +138,109 @@ class DentalPracticeApp:
                              font=("Helvetica", 12, "bold"))
 
     def setup_data_files(self):
-        if not os.path.exists(PATIENTS_FILE):
-            pd.DataFrame(columns=['PatientID', 'Name', 'Phone', 'MedicalNotes']).to_csv(PATIENTS_FILE, index=False)
-        if not os.path.exists(APPOINTMENTS_FILE):
-            pd.DataFrame(columns=['PatientID', 'Name', 'Date', 'Time', 'Procedure']).to_csv(APPOINTMENTS_FILE,
-                                                                                            index=False)
-        if not os.path.exists(CLINICAL_RECORDS_FILE):
-            pd.DataFrame(columns=['RecordID', 'PatientID', 'Date', 'Problem', 'TreatmentPlan', 'Medications']).to_csv(
-                CLINICAL_RECORDS_FILE, index=False)
-
-    def load_data(self):
-        self.patients_df = pd.read_csv(PATIENTS_FILE)
-        self.appointments_df = pd.read_csv(APPOINTMENTS_FILE)
-        # Fix for NaN issue: Load clinical records, filling NaN for string fields
-        self.clinical_df = pd.read_csv(CLINICAL_RECORDS_FILE).fillna(
-            {'Problem': '', 'TreatmentPlan': '', 'Medications': ''})
-
-        # Ensure ID columns are treated as integers after loading
-        if not self.patients_df.empty:
-            self.patients_df['PatientID'] = pd.to_numeric(self.patients_df['PatientID'], errors='coerce').astype(
-                'Int64')
-        if not self.clinical_df.empty:
-            self.clinical_df['PatientID'] = pd.to_numeric(self.clinical_df['PatientID'], errors='coerce').astype(
-                'Int64')
-            self.clinical_df['RecordID'] = pd.to_numeric(self.clinical_df['RecordID'], errors='coerce').astype('Int64')
+        # Both pull in pandas; deferred so it does not delay the first paint
+        if STORAGE_BACKEND == 'service':
+            from dental_service import PracticeClient
+            self.practice = PracticeClient()
+            # The patient search worker gets a client of its own, since a client is only safe on one thread
+            self.search_client = PracticeClient()
+        else:
+            from dental_store import open_store
+            self.practice = DentalPractice(open_store(STORAGE_BACKEND))
+        if self.metrics is not None:
+            self.practice = self.metrics.wrap_practice(self.practice)
+        self.practice.setup()
+        self.stats = DashboardStats(self.practice)
+
+    def load_data(self, tables=('appointments', 'patients', 'clinical')):
+        self.practice.load(tables)
 
     def save_data(self):
-        self.patients_df.to_csv(PATIENTS_FILE, index=False)
-        self.appointments_df.to_csv(APPOINTMENTS_FILE, index=False)
-        self.clinical_df.to_csv(CLINICAL_RECORDS_FILE, index=False)
+        self.practice.save()
+
+    def perform(self, action, *args, **kwargs):
+        """Run one practice operation (a DentalPractice method) and tell the user if it was refused.
+
+        Returns the operation's result (the row as stored), or None if the input was invalid, another
+        workstation changed the row first, or the data could not be written.
+        """
+        try:
+            return action(*args, **kwargs)
+        except ValidationError as error:
+            messagebox.showerror("Input Error", str(error))
+            return None
+        except NotFoundError as error:
+            messagebox.showerror("Error", str(error))
+        except ConflictError as error:
+            messagebox.showwarning("Changed on Another Workstation",
+                                   f"Your change was not saved. {error}\n\nThe lists have been refreshed; "
+                                   f"please check the record and try again.")
+        except (OSError, LockTimeout) as error:
+            messagebox.showerror("Save Error", f"Your change could not be saved:\n{error}")
+        self.refresh_views(('patients', 'appointments', 'clinical'))
+        return None
+
+    def perform_booking(self, action, *args, **kwargs):
+        """Like perform, but a double booking is shown with the next free slots and can be booked anyway."""
+        try:
+            return self.perform(action, *args, **kwargs)
+        except DoubleBookingError as clash:
+            if not messagebox.askyesno("Double Booking", f"{clash}\n\nBook it anyway?"):
+                return None
+            return self.perform(action, *args, allow_double_booking=True, **kwargs)
+
+    def poll_for_changes(self):
+        """Pick up edits made on other workstations and refresh whatever they touched."""
+        try:
+            self.refresh_views(self.practice.poll_changes())
+        except OSError as error:
+            self.status_label.config(text=f"Shared data folder unavailable: {error}")
+        self.root.after(CHANGE_POLL_INTERVAL_MS, self.poll_for_changes)
+
+    def refresh_views(self, tables):
+        # Rows changed elsewhere are not known here, so their counters are read again
+        if self.stats is not None:
+            self.stats.invalidate(tables)
+            self.refresh_dashboard_stats()
+        # Appointment rows show the patient's current name, so a renamed patient redraws them too
+        if 'appointments' in tables or 'patients' in tables:
+            self.refresh_appointment_list()
+        if 'patients' in tables:
+            self.refresh_patient_list()
+        if 'clinical' in tables and self.selected_patient_id is not None:
+            self.populate_clinical_tab()
+
+    def periodic_compaction(self):
+        try:
+            # One batch of deletes past their retention period and of old history; the rest wait for the next run
+            self.practice.purge_deleted()
+            self.practice.archive_old_history()
+        except (OSError, LockTimeout) as error:
+            self.status_label.config(text=f"Could not purge or archive old rows: {error}")
+        if self.practice.pending_changes:
+            self.save_data()
+        self.root.after(JOURNAL_COMPACT_INTERVAL_MS, self.periodic_compaction)
+
+    def report_write_error(self, error):
+        """Called on the writer thread; hand the message to the Tk thread."""
+        self.root.after(0, lambda: messagebox.showerror(
+            "Save Error", f"Recent changes could not be written to disk and will be retried:\n{error}"))
+
+    def on_close(self):
+        """Compact the journal before the window closes so the data files are complete on disk."""
+        if self.practice is not None:
+            self.practice.close()
+        if self.search_client is not None:
+            self.search_client.close()
+        self.root.destroy()
+
+    def load_images(self):
+        """Decode the icon and background once the data is on screen."""
+        try:
+            from PIL import Image, ImageTk
+        except ImportError:
+            return
 
-    def create_main_layout(self):
-        # --- Set Icon and Background (Layer 0) ---
         try:
             icon_img = Image.open(ICON_IMAGE_PATH)
             self.icon_photo = ImageTk.PhotoImage(icon_img)
@@ -111,10 +251,33 @@ class DentalPracticeApp:
         try:
             bg_img = Image.open(BACKGROUND_IMAGE_PATH)
             self.bg_photo = ImageTk.PhotoImage(bg_img)
-            bg_label = tk.Label(self.root, image=self.bg_photo)
-            bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+            self.bg_label.config(image=self.bg_photo)
         except Exception:
-            self.root.configure(bg=BG_COLOR)
+            pass
+
+    def on_tab_changed(self, event):
+        # Counters are only redrawn while the dashboard is showing, so catch up on the way back to it
+        self.refresh_dashboard_stats()
+        # Clinical records are only read from disk the first time they are needed
+        if self.practice is not None and self.notebook.select() == str(self.clinical_tab):
+            self.load_data(tables=('clinical',))
+        if self.practice is not None and self.notebook.select() == str(self.calendar_tab):
+            self.calendar.refresh()
+        if self.metrics is not None and self.notebook.select() == str(self.diagnostics_tab):
+            self.refresh_diagnostics()
+
+    def create_main_layout(self):
+        # --- Background (Layer 0); the image itself is decoded later in load_images ---
+        self.root.configure(bg=BG_COLOR)
+        self.bg_label = tk.Label(self.root, bg=BG_COLOR)
+        self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+
+        # --- Menu Bar ---
+        menu_bar = tk.Menu(self.root)
+        tools_menu = tk.Menu(menu_bar, tearoff=0)
+        tools_menu.add_command(label="Daily Call Lists...", command=self.run_call_lists)
+        menu_bar.add_cascade(label="Tools", menu=tools_menu)
+        self.root.config(menu=menu_bar)
 
         # --- Main Content Frame (Layer 1) ---
         main_frame = tk.Frame(self.root, bg=BG_COLOR)
@@ -128,25 +291,55 @@ class DentalPracticeApp:
                                fg=PRIMARY_COLOR)
         title_label.pack(side=tk.TOP, fill=tk.X, pady=(10, 20))
 
+        # --- Status Line (startup time, loading progress) ---
+        self.status_label = tk.Label(main_frame, text="Loading...", font=BODY_FONT, bg=BG_COLOR, fg=TEXT_COLOR,
+                                     anchor=tk.W)
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+
         # --- Create the Notebook within the Main Frame ---
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.pack(expand=True, fill='both')
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
 
         # --- Create and Add Tabs ---
         self.dashboard_tab = ttk.Frame(self.notebook, padding=10)
         self.patients_tab = ttk.Frame(self.notebook, padding=10)
         self.clinical_tab = ttk.Frame(self.notebook, padding=10)
+        self.calendar_tab = ttk.Frame(self.notebook, padding=10)
+        self.reports_tab = ttk.Frame(self.notebook, padding=10)
 
         self.notebook.add(self.dashboard_tab, text='Appointments Dashboard')
+        self.notebook.add(self.calendar_tab, text='Calendar')
         self.notebook.add(self.patients_tab, text='Patient Management')
         self.notebook.add(self.clinical_tab, text='Clinical Records')
+        self.notebook.add(self.reports_tab, text='Reports')
+        if self.metrics is not None:
+            self.diagnostics_tab = ttk.Frame(self.notebook, padding=10)
+            self.notebook.add(self.diagnostics_tab, text='Diagnostics')
 
         # --- Populate Each Tab ---
         self.create_dashboard_widgets()
         self.create_patients_widgets()
         self.create_clinical_records_widgets()
+        self.create_calendar_widgets()
+        self.create_reports_widgets()
+        if self.metrics is not None:
+            self.create_diagnostics_widgets()
 
     def create_dashboard_widgets(self):
+        # --- Practice Statistics (read from the DashboardStats cache) ---
+        stats_frame = ttk.LabelFrame(self.dashboard_tab, text="Practice Statistics")
+        stats_frame.pack(side='top', fill='x', pady=(0, 10))
+        self.stats_labels = {}
+        for column, (key, title) in enumerate((('today', "Appointments today"), ('week', "This week"),
+                                               ('new_patients', "New patients this month"),
+                                               ('open_plans', "Open treatment plans"))):
+            ttk.Label(stats_frame, text=title).grid(row=0, column=column, padx=15, pady=(5, 0))
+            self.stats_labels[key] = ttk.Label(stats_frame, text="-", font=HEADING_FONT)
+            self.stats_labels[key].grid(row=1, column=column, padx=15, pady=(0, 5))
+        self.procedure_stats_label = ttk.Label(stats_frame, text="", wraplength=900)
+        self.procedure_stats_label.grid(row=2, column=0, columnspan=4, sticky=tk.W, padx=15, pady=(0, 5))
+
         display_frame = ttk.LabelFrame(self.dashboard_tab, text="Today's Appointments")
         display_frame.pack(side='left', fill='both', expand=True, padx=(0, 10))
 
@@ -160,6 +353,7 @@ class DentalPracticeApp:
         self.appt_tree.column('Time', width=100, anchor='center')
         self.appt_tree.column('Procedure', width=200)
         self.appt_tree.pack(fill='both', expand=True, padx=10, pady=10)
+        self.appt_rows = TreeDiff(self.appt_tree)  # Rows keyed by AppointmentID
 
         # Appointment Tree Action Buttons
         appt_actions_frame = ttk.Frame(display_frame)
@@ -182,23 +376,94 @@ class DentalPracticeApp:
             self.appt_entries[field] = entry
 
         self.appt_entries["Date (YYYY-MM-DD):"].insert(0, datetime.now().strftime("%Y-%m-%d"))
-        ttk.Button(appt_frame, text="Schedule Appointment", command=self.schedule_appointment).grid(row=len(fields),
+        ttk.Button(appt_frame, text="Find Free Slot", command=self.find_free_slot).grid(row=len(fields), column=0,
+                                                                                        columnspan=2, pady=(20, 0))
+        ttk.Button(appt_frame, text="Schedule Appointment", command=self.schedule_appointment).grid(row=len(fields) + 1,
                                                                                                     column=0,
                                                                                                     columnspan=2,
                                                                                                     pady=20)
 
+    def create_calendar_widgets(self):
+        self.calendar = CalendarView(self.calendar_tab, fetch_range=self.fetch_calendar_range)
+        self.calendar.pack(fill='both', expand=True)
+
+    def create_reports_widgets(self):
+        from dental_reports import REPORTS
+
+        controls = ttk.Frame(self.reports_tab)
+        controls.pack(fill='x', pady=(0, 10))
+        ttk.Label(controls, text="Month (YYYY-MM):").pack(side=tk.LEFT, padx=(0, 5))
+        self.report_month_entry = ttk.Entry(controls, width=10)
+        self.report_month_entry.insert(0, datetime.now().strftime("%Y-%m"))
+        self.report_month_entry.pack(side=tk.LEFT)
+        ttk.Label(controls, text="Report:").pack(side=tk.LEFT, padx=(15, 5))
+        self.report_titles = {title: name for name, title in REPORTS.items()}
+        self.report_choice = ttk.Combobox(controls, values=list(self.report_titles), state='readonly', width=28)
+        self.report_choice.current(0)
+        self.report_choice.bind('<<ComboboxSelected>>', lambda event: self.show_report())
+        self.report_choice.pack(side=tk.LEFT)
+        ttk.Button(controls, text="Run Report", command=self.run_reports).pack(side=tk.LEFT, padx=10)
+        ttk.Button(controls, text="Export CSV", command=self.export_report).pack(side=tk.LEFT)
+
+        report_frame = ttk.LabelFrame(self.reports_tab, text="Results")
+        report_frame.pack(fill='both', expand=True)
+        self.report_tree = ttk.Treeview(report_frame, show='headings')
+        self.report_tree.pack(fill='both', expand=True, padx=10, pady=10)
+        self.reports = None  # {report name: DataFrame} from the last run
+
+    def create_diagnostics_widgets(self):
+        controls = ttk.Frame(self.diagnostics_tab)
+        controls.pack(fill='x', pady=(0, 10))
+        ttk.Label(controls, text=f"Timings since startup. Calls blocking the window for over "
+                                 f"{self.metrics.slow_seconds * 1000:.0f} ms are logged as SLOW in "
+                                 f"{self.metrics.log_file}.").pack(side=tk.LEFT)
+        ttk.Button(controls, text="Refresh", command=self.refresh_diagnostics).pack(side=tk.RIGHT)
+
+        diagnostics_frame = ttk.LabelFrame(self.diagnostics_tab, text="Operations (slowest first)")
+        diagnostics_frame.pack(fill='both', expand=True)
+        columns = ('Operation', 'Calls', 'p50 ms', 'p95 ms', 'Max ms', 'Blocked p95 ms', 'Rows', 'Bytes', 'Slow')
+        self.diagnostics_tree = ttk.Treeview(diagnostics_frame, columns=columns, show='headings')
+        for column in columns:
+            self.diagnostics_tree.heading(column, text=column)
+            self.diagnostics_tree.column(column, width=90, anchor='e')
+        self.diagnostics_tree.column('Operation', width=230, anchor='w')
+        self.diagnostics_tree.pack(fill='both', expand=True, padx=10, pady=10)
+        self.diagnostics_rows = TreeDiff(self.diagnostics_tree)
+
+    def refresh_diagnostics(self):
+        self.diagnostics_rows.apply(
+            (row['operation'], (row['operation'], row['calls'], f"{row['p50_ms']:.1f}", f"{row['p95_ms']:.1f}",
+                                f"{row['max_ms']:.1f}", f"{row['blocked_p95_ms']:.1f}", row['rows'], row['bytes'],
+                                row['slow']))
+            for row in self.metrics.summary())
+
     def create_patients_widgets(self):
         patient_list_frame = ttk.LabelFrame(self.patients_tab, text="All Patients (Double-click to view records)")
         patient_list_frame.pack(side='left', fill='both', expand=True, padx=(0, 10))
 
-        self.patient_tree = ttk.Treeview(patient_list_frame, columns=('ID', 'Name', 'Phone'), show='headings')
-        self.patient_tree.heading('ID', text='Patient ID')
-        self.patient_tree.heading('Name', text='Name')
-        self.patient_tree.heading('Phone', text='Phone')
+        # Search box: the list is filtered as the user types, on a worker thread (see LiveSearch)
+        search_frame = ttk.Frame(patient_list_frame)
+        search_frame.pack(fill='x', padx=10, pady=(10, 0))
+        ttk.Label(search_frame, text="Search (Name, Phone or ID):").pack(side=tk.LEFT)
+        self.patient_search_var = tk.StringVar()
+        self.patient_search_var.trace_add('write', self.on_patient_search_typed)
+        ttk.Entry(search_frame, textvariable=self.patient_search_var, width=30).pack(side=tk.LEFT, padx=5)
+        self.patient_search_status = ttk.Label(search_frame, text="")
+        self.patient_search_status.pack(side=tk.LEFT, padx=5)
+        self.patient_search = LiveSearch(self.root, self.patient_search_snapshot, self.search_patients,
+                                         self.show_patient_search_results, self.show_patient_search_error)
+
+        # Only the rows in view are materialized; pages are fetched as the list scrolls or is re-sorted
+        self.patient_list = VirtualTreeview(patient_list_frame, columns=('ID', 'Name', 'Phone'),
+                                            fetch_rows=self.fetch_patient_rows, count_rows=self.count_patient_rows)
+        self.patient_tree = self.patient_list.tree
+        self.patient_list.heading('ID', text='Patient ID')
+        self.patient_list.heading('Name', text='Name')
+        self.patient_list.heading('Phone', text='Phone')
         self.patient_tree.column('ID', width=80, anchor='center')
         self.patient_tree.column('Name', width=200)
         self.patient_tree.column('Phone', width=150)
-        self.patient_tree.pack(fill='both', expand=True, padx=10, pady=10)
+        self.patient_list.pack(fill='both', expand=True, padx=10, pady=10)
         self.patient_tree.bind('<Double-1>',
                                self.view_selected_patient_records)  # FIX: This binding now points to the correctly implemented function
 
@@ -210,6 +475,8 @@ class DentalPracticeApp:
                                                                                                         padx=5)
         ttk.Button(patient_actions_frame, text="Delete Selected Patient", command=self.delete_patient).pack(
             side=tk.LEFT, expand=True, padx=5)
+        ttk.Button(patient_actions_frame, text="Recently Deleted", command=self.show_recently_deleted).pack(
+            side=tk.LEFT, expand=True, padx=5)
 
         patient_frame = ttk.LabelFrame(self.patients_tab, text="Patient Actions")
         patient_frame.pack(side='right', fill='y', padx=(10, 0))
@@ -224,8 +491,6 @@ class DentalPracticeApp:
 
         ttk.Button(patient_frame, text="Add New Patient", command=self.add_patient).grid(row=len(fields), column=0,
                                                                                          columnspan=2, pady=15)
-        ttk.Button(patient_frame, text="Search Patient", command=self.search_patient).grid(row=len(fields) + 1,
-                                                                                           column=0, columnspan=2)
 
     def create_clinical_records_widgets(self):
         records_view_frame = ttk.Frame(self.clinical_tab)
@@ -241,6 +506,7 @@ class DentalPracticeApp:
         self.records_tree.column('Date', width=120)
         self.records_tree.pack(fill="both", expand=True, pady=5)
         self.records_tree.bind('<Double-1>', self.display_full_record)
+        self.record_rows = TreeDiff(self.records_tree)  # Rows keyed by RecordID
 
         record_actions_frame = ttk.Frame(records_view_frame)
         record_actions_frame.pack(fill='x', pady=5)
@@ -248,6 +514,36 @@ class DentalPracticeApp:
             side=tk.LEFT, padx=5, expand=True)
         ttk.Button(record_actions_frame, text="Delete Selected Record", command=self.delete_clinical_record).pack(
             side=tk.LEFT, padx=5, expand=True)
+        # Records older than the working-set horizon are only read from the archive when asked for
+        self.show_archived_records = tk.BooleanVar(value=False)
+        ttk.Checkbutton(record_actions_frame, text="Include Archived History", variable=self.show_archived_records,
+                        command=self.populate_clinical_tab).pack(side=tk.LEFT, padx=5, expand=True)
+
+        search_frame = ttk.LabelFrame(records_view_frame, text='Search All Records (words, "a phrase", prefix*)')
+        search_frame.pack(fill="both", expand=True, pady=5)
+        search_controls = ttk.Frame(search_frame)
+        search_controls.pack(fill='x', padx=5, pady=5)
+        self.record_search_entry = ttk.Entry(search_controls, width=30)
+        self.record_search_entry.pack(side=tk.LEFT, padx=(0, 5), fill='x', expand=True)
+        self.record_search_entry.bind('<Return>', lambda event: self.search_clinical_records())
+        ttk.Label(search_controls, text="From:").pack(side=tk.LEFT)
+        self.record_search_from = ttk.Entry(search_controls, width=11)
+        self.record_search_from.pack(side=tk.LEFT, padx=(2, 5))
+        ttk.Label(search_controls, text="To:").pack(side=tk.LEFT)
+        self.record_search_to = ttk.Entry(search_controls, width=11)
+        self.record_search_to.pack(side=tk.LEFT, padx=(2, 5))
+        ttk.Button(search_controls, text="Search Records", command=self.search_clinical_records).pack(side=tk.LEFT)
+
+        self.record_search_tree = ttk.Treeview(search_frame, columns=('Date', 'Patient', 'Problem', 'Treatment'),
+                                               show='headings', height=6)
+        for col, heading, width in (('Date', 'Date', 90), ('Patient', 'Patient', 140),
+                                    ('Problem', 'Problem / Diagnosis', 200), ('Treatment', 'Treatment Plan', 200)):
+            self.record_search_tree.heading(col, text=heading)
+            self.record_search_tree.column(col, width=width)
+        self.record_search_tree.pack(fill="both", expand=True, padx=5, pady=(0, 5))
+        self.record_search_tree.bind('<Double-1>', self.open_searched_record)
+        self.record_search_rows = TreeDiff(self.record_search_tree)  # Rows keyed by RecordID, best match first
+        self.record_search_patients = {}  # RecordID -> (PatientID, Name) of the last search's results
 
         add_record_frame = ttk.LabelFrame(self.clinical_tab, text="Add New Clinical Record")
         add_record_frame.pack(side="right", fill="both", expand=True, padx=(10, 0))
@@ -294,7 +590,11 @@ class DentalPracticeApp:
             return
 
         patient_id = self.patient_tree.item(selected_item)['values'][0]
-        patient_data = self.patients_df[self.patients_df['PatientID'] == patient_id].iloc[0]
+        patient_data = self.practice.get_patient(patient_id)
+        if patient_data is None:
+            messagebox.showerror("Error", "This patient no longer exists (deleted on another workstation?).")
+            self.refresh_patient_list()
+            return
 
         class EditPatientDialog(simpledialog.Dialog):
             def body(self, master):
@@ -329,16 +629,11 @@ class DentalPracticeApp:
 
         if edit_dialog.result:
             name, phone, notes = edit_dialog.result
-            if not name or not phone:
-                messagebox.showerror("Input Error", "Name and Phone cannot be empty.")
+            if self.perform(self.practice.update_patient, patient_id, name, phone, notes,
+                            expected_version=patient_data['Version']) is None:
                 return
-
-            idx = self.patients_df[self.patients_df['PatientID'] == patient_id].index[0]
-            self.patients_df.loc[idx, 'Name'] = name
-            self.patients_df.loc[idx, 'Phone'] = phone
-            self.patients_df.loc[idx, 'MedicalNotes'] = notes
-            self.save_data()
             self.refresh_patient_list()
+            self.refresh_appointment_list()  # Appointments show the patient's current name
             messagebox.showinfo("Success", f"Patient ID {patient_id} updated.")
 
     def delete_patient(self):
@@ -349,23 +644,66 @@ class DentalPracticeApp:
 
         patient_id = self.patient_tree.item(selected_item)['values'][0]
         patient_name = self.patient_tree.item(selected_item)['values'][1]
+        patient_data = self.practice.get_patient(patient_id)
+        if patient_data is None:
+            messagebox.showerror("Error", "This patient no longer exists (deleted on another workstation?).")
+            self.refresh_patient_list()
+            return
 
         if messagebox.askyesno("Confirm Delete",
-                               f"Are you sure you want to permanently delete patient: {patient_name} (ID: {patient_id})? \n\nThis will also remove all their appointments and clinical records."):
-            # Delete patient
-            self.patients_df = self.patients_df[self.patients_df['PatientID'] != patient_id].copy()
-            # Delete associated appointments
-            self.appointments_df = self.appointments_df[self.appointments_df['PatientID'] != patient_id].copy()
-            # Delete associated clinical records
-            self.clinical_df = self.clinical_df[self.clinical_df['PatientID'] != patient_id].copy()
+                               f"Are you sure you want to delete patient: {patient_name} (ID: {patient_id})? \n\nThis will also remove all their appointments and clinical records. They can be restored from Recently Deleted for {DELETED_RETENTION_DAYS} days."):
+            # Deletes the patient's appointments and clinical records too
+            if self.perform(self.practice.delete_patient, patient_id,
+                            expected_version=patient_data['Version']) is None:
+                return
+            self.stats.patient_deleted(patient_id)
+            self.refresh_dashboard_stats()
 
-            self.save_data()
             self.refresh_patient_list()
             self.refresh_appointment_list()
             self.selected_patient_id = None  # Deselect patient
             self.populate_clinical_tab()  # Clear clinical tab
             messagebox.showinfo("Success", f"Patient {patient_name} and all associated records deleted.")
 
+    def show_recently_deleted(self):
+        """List deleted patients, appointments and records that can still be restored, and restore the chosen one."""
+        deleted = self.perform(self.practice.recently_deleted)
+        if deleted is None:
+            return
+        if deleted.empty:
+            messagebox.showinfo("Recently Deleted", "Nothing has been deleted recently.")
+            return
+
+        class RecentlyDeletedDialog(simpledialog.Dialog):
+            def body(self, master):
+                tk.Label(master, text=f"Select an item and press OK to restore it. Deleted items are removed for "
+                                      f"good after {DELETED_RETENTION_DAYS} days.").pack(anchor=tk.W)
+                self.deleted_tree = ttk.Treeview(master, columns=('Deleted', 'Description'), show='headings',
+                                                 height=15)
+                self.deleted_tree.heading('Deleted', text='Deleted')
+                self.deleted_tree.heading('Description', text='Description')
+                self.deleted_tree.column('Deleted', width=140)
+                self.deleted_tree.column('Description', width=460)
+                for row in deleted.itertuples(index=False):
+                    # Seconds are enough on screen; the full deletion time stays in the data
+                    self.deleted_tree.insert('', tk.END, iid=f"{row.Table}:{row.ID}",
+                                             values=(row.Deleted[:19], row.Description))
+                self.deleted_tree.pack(fill='both', expand=True, pady=5)
+                return self.deleted_tree
+
+            def apply(self):
+                selected = self.deleted_tree.focus()
+                self.result = selected.split(':') if selected else None
+
+        dialog = RecentlyDeletedDialog(self.root, title="Recently Deleted")
+        if not dialog.result:
+            return
+        table, item_id = dialog.result
+        if self.perform_booking(self.practice.restore_deleted, table, int(item_id)) is None:
+            return
+        self.refresh_views(('patients', 'appointments', 'clinical'))
+        messagebox.showinfo("Success", "The deleted item has been restored.")
+
     # =================================================================
     # --- APPOINTMENT DASHBOARD FUNCTIONS ---
     # =================================================================
@@ -376,23 +714,15 @@ class DentalPracticeApp:
             messagebox.showwarning("Warning", "Please select an appointment to edit.")
             return
 
-        values = self.appt_tree.item(selected_item)['values']
-        patient_id, name, time, procedure = values[0], values[1], values[2], values[3]
-
-        today_str = datetime.now().strftime("%Y-%m-%d")
-
-        appointment_row = self.appointments_df[
-            (self.appointments_df['PatientID'] == patient_id) &
-            (self.appointments_df['Date'] == today_str) &
-            (self.appointments_df['Time'] == time)
-            ]
+        appointment_id = int(selected_item)
+        appointment_row = self.practice.get_appointment(appointment_id)
 
-        if appointment_row.empty:
-            messagebox.showerror("Error", "Could not uniquely identify this appointment for editing.")
+        if appointment_row is None:
+            messagebox.showerror("Error", "Could not find this appointment for editing.")
             return
 
-        original_idx = appointment_row.index[0]
-        original_date = appointment_row.iloc[0]['Date']
+        patient_id, name = appointment_row['PatientID'], appointment_row['Name']
+        original_date, time, procedure = appointment_row['Date'], appointment_row['Time'], appointment_row['Procedure']
 
         class EditApptDialog(simpledialog.Dialog):
             def body(self, master):
@@ -424,13 +754,12 @@ class DentalPracticeApp:
 
         if edit_dialog.result:
             new_date, new_time, new_procedure = edit_dialog.result
-
-            # Update the DataFrame
-            self.appointments_df.loc[original_idx, 'Date'] = new_date
-            self.appointments_df.loc[original_idx, 'Time'] = new_time
-            self.appointments_df.loc[original_idx, 'Procedure'] = new_procedure
-
-            self.save_data()
+            appointment = self.perform_booking(self.practice.update_appointment, appointment_id, new_date, new_time,
+                                               new_procedure, expected_version=appointment_row['Version'])
+            if appointment is None:
+                return
+            self.stats.appointment_saved(appointment)
+            self.refresh_dashboard_stats()
             self.refresh_appointment_list()
             messagebox.showinfo("Success", f"Appointment for {name} updated.")
 
@@ -440,27 +769,24 @@ class DentalPracticeApp:
             messagebox.showwarning("Warning", "Please select an appointment to delete.")
             return
 
+        appointment_id = int(selected_item)
         values = self.appt_tree.item(selected_item)['values']
-        patient_id, name, time = values[0], values[1], values[2]
-        today_str = datetime.now().strftime("%Y-%m-%d")
+        name, time = values[1], values[2]
+        appointment_row = self.practice.get_appointment(appointment_id)
+        if appointment_row is None:
+            messagebox.showerror("Error", "Could not find the specific appointment in the database.")
+            self.refresh_appointment_list()
+            return
 
         if messagebox.askyesno("Confirm Delete",
                                f"Are you sure you want to delete the appointment for {name} at {time}?"):
-            # Identify the row(s) to delete
-            rows_to_delete = self.appointments_df[
-                (self.appointments_df['PatientID'] == patient_id) &
-                (self.appointments_df['Date'] == today_str) &
-                (self.appointments_df['Time'] == time)
-                ]
-
-            if not rows_to_delete.empty:
-                # Drop the row(s) by index
-                self.appointments_df = self.appointments_df.drop(rows_to_delete.index).reset_index(drop=True)
-                self.save_data()
-                self.refresh_appointment_list()
-                messagebox.showinfo("Success", f"Appointment for {name} deleted.")
-            else:
-                messagebox.showerror("Error", "Could not find the specific appointment in the database.")
+            if self.perform(self.practice.delete_appointment, appointment_id,
+                            expected_version=appointment_row['Version']) is None:
+                return
+            self.stats.appointment_deleted(appointment_id)
+            self.refresh_dashboard_stats()
+            self.refresh_appointment_list()
+            messagebox.showinfo("Success", f"Appointment for {name} deleted.")
 
     # =================================================================
     # --- CLINICAL RECORD FUNCTIONS (Fixed visibility and display) ---
@@ -469,23 +795,48 @@ class DentalPracticeApp:
     def populate_clinical_tab(self):
         if self.selected_patient_id is None:
             self.clinical_patient_label.config(text="Select a patient to view their records.")
-            for item in self.records_tree.get_children(): self.records_tree.delete(item)
+            self.record_rows.apply([])
             return
 
         self.clinical_patient_label.config(
             text=f"Records for: {self.selected_patient_name} (ID: {self.selected_patient_id})")
 
-        for item in self.records_tree.get_children():
-            self.records_tree.delete(item)
+        patient_records = self.practice.patient_records(self.selected_patient_id, self.show_archived_records.get())
+        self.record_rows.apply((row.RecordID, (row.Date, row.Problem))
+                               for row in patient_records.itertuples(index=False))
 
-        if not self.clinical_df.empty:
-            self.clinical_df['PatientID'] = pd.to_numeric(self.clinical_df['PatientID'], errors='coerce').astype(
-                'Int64')
-            patient_records = self.clinical_df[self.clinical_df['PatientID'] == self.selected_patient_id].sort_values(
-                by='Date', ascending=False)
+    def search_clinical_records(self):
+        query = self.record_search_entry.get().strip()
+        first_date = self.record_search_from.get().strip() or None
+        last_date = self.record_search_to.get().strip() or None
+        results = self.perform(self.practice.search_records, query, first_date, last_date)
+        if results is None:
+            return
+        self.record_search_patients = {row.RecordID: (row.PatientID, row.Name)
+                                       for row in results.itertuples(index=False)}
+        self.record_search_rows.apply((row.RecordID, (row.Date, row.Name, row.Problem, row.TreatmentPlan))
+                                      for row in results.itertuples(index=False))
+        if results.empty:
+            messagebox.showinfo("Search Records", "No clinical records match that search.")
+
+    def open_searched_record(self, event):
+        """Loads the matching record's patient into the tab above and shows the full record."""
+        selected_item = self.record_search_tree.focus()
+        if not selected_item: return
 
-            for _, row in patient_records.iterrows():
-                self.records_tree.insert('', tk.END, values=(row['Date'], row['Problem']), iid=str(row['RecordID']))
+        record_id = int(selected_item)
+        if record_id not in self.record_search_patients: return
+        self.selected_patient_id, self.selected_patient_name = self.record_search_patients[record_id]
+        self.populate_clinical_tab()
+        if not self.records_tree.exists(selected_item) and not self.show_archived_records.get():
+            # An archived record: show the patient's archived history as well
+            self.show_archived_records.set(True)
+            self.populate_clinical_tab()
+        if self.records_tree.exists(selected_item):
+            self.records_tree.focus(selected_item)
+            self.records_tree.selection_set(selected_item)
+            self.records_tree.see(selected_item)
+            self.display_full_record(event)
 
     def add_clinical_record(self):
         if self.selected_patient_id is None:
@@ -496,21 +847,11 @@ class DentalPracticeApp:
         treatment = self.treatment_text.get("1.0", tk.END).strip()
         meds = self.meds_text.get("1.0", tk.END).strip()
 
-        if not problem:
-            messagebox.showerror("Input Error", "The 'Problem / Diagnosis' field cannot be empty.")
+        record = self.perform(self.practice.add_clinical_record, self.selected_patient_id, problem, treatment, meds)
+        if record is None:
             return
-
-        new_id = self.clinical_df['RecordID'].max() + 1 if not self.clinical_df.empty else 1
-        today_str = datetime.now().strftime("%Y-%m-%d")
-
-        new_record = pd.DataFrame(
-            {'RecordID': [new_id], 'PatientID': [self.selected_patient_id], 'Date': [today_str], 'Problem': [problem],
-             'TreatmentPlan': [treatment], 'Medications': [meds]})
-        self.clinical_df = pd.concat([self.clinical_df, new_record], ignore_index=True).fillna(
-            {'Problem': '', 'TreatmentPlan': '', 'Medications': ''})
-        self.clinical_df['RecordID'] = pd.to_numeric(self.clinical_df['RecordID'], errors='coerce').astype('Int64')
-
-        self.save_data()
+        self.stats.record_saved(record)
+        self.refresh_dashboard_stats()
         messagebox.showinfo("Success", "Clinical record saved.")
 
         self.problem_text.delete("1.0", tk.END)
@@ -523,7 +864,11 @@ class DentalPracticeApp:
         if not selected_item: return
 
         record_id = int(selected_item)
-        record_data = self.clinical_df[self.clinical_df['RecordID'] == record_id].iloc[0]
+        record_data = self.practice.get_record(record_id)
+        if record_data is None:
+            messagebox.showerror("Error", "This record no longer exists (deleted on another workstation?).")
+            self.populate_clinical_tab()
+            return
 
         # FIX: Explicitly cast to string and strip to handle potential NaN/empty values correctly for display
         problem_str = str(record_data.get('Problem', '')).strip()
@@ -543,7 +888,11 @@ class DentalPracticeApp:
             return
 
         record_id = int(selected_item)
-        record_data = self.clinical_df[self.clinical_df['RecordID'] == record_id].iloc[0]
+        record_data = self.practice.get_record(record_id)
+        if record_data is None:
+            messagebox.showerror("Error", "This record no longer exists (deleted on another workstation?).")
+            self.populate_clinical_tab()
+            return
 
         class EditRecordDialog(simpledialog.Dialog):
             def body(self, master):
@@ -575,15 +924,12 @@ class DentalPracticeApp:
 
         if edit_dialog.result:
             problem, treatment, meds = edit_dialog.result
-            if not problem:
-                messagebox.showerror("Input Error", "The 'Problem / Diagnosis' field cannot be empty.")
+            record = self.perform(self.practice.update_clinical_record, record_id, problem, treatment, meds,
+                                  expected_version=record_data['Version'])
+            if record is None:
                 return
-
-            idx = self.clinical_df[self.clinical_df['RecordID'] == record_id].index[0]
-            self.clinical_df.loc[idx, 'Problem'] = problem
-            self.clinical_df.loc[idx, 'TreatmentPlan'] = treatment
-            self.clinical_df.loc[idx, 'Medications'] = meds
-            self.save_data()
+            self.stats.record_saved(record)
+            self.refresh_dashboard_stats()
             self.populate_clinical_tab()
             messagebox.showinfo("Success", f"Record ID {record_id} updated successfully.")
 
@@ -594,10 +940,18 @@ class DentalPracticeApp:
             return
 
         record_id = int(selected_item)
+        record_data = self.practice.get_record(record_id)
+        if record_data is None:
+            messagebox.showerror("Error", "This record no longer exists (deleted on another workstation?).")
+            self.populate_clinical_tab()
+            return
 
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete Record ID {record_id}?"):
-            self.clinical_df = self.clinical_df[self.clinical_df['RecordID'] != record_id].copy()
-            self.save_data()
+            if self.perform(self.practice.delete_clinical_record, record_id,
+                            expected_version=record_data['Version']) is None:
+                return
+            self.stats.record_deleted(record_id)
+            self.refresh_dashboard_stats()
             self.populate_clinical_tab()
             messagebox.showinfo("Success", f"Record ID {record_id} deleted.")
 
@@ -609,17 +963,12 @@ class DentalPracticeApp:
         name = self.patient_entries["Name:"].get()
         phone = self.patient_entries["Phone:"].get()
         notes = self.patient_entries["Medical Notes:"].get()
-        if not name or not phone:
-            messagebox.showerror("Input Error", "Patient Name and Phone are required.")
+        patient = self.perform(self.practice.add_patient, name, phone, notes)
+        if patient is None:
             return
-
-        new_id = self.patients_df['PatientID'].max() + 1 if not self.patients_df.empty else 1
-        new_patient = pd.DataFrame({'PatientID': [new_id], 'Name': [name], 'Phone': [phone], 'MedicalNotes': [notes]})
-        self.patients_df = pd.concat([self.patients_df, new_patient], ignore_index=True)
-        self.patients_df['PatientID'] = pd.to_numeric(self.patients_df['PatientID'], errors='coerce').astype('Int64')
-
-        self.save_data()
-        messagebox.showinfo("Success", f"Patient '{name}' added with ID: {new_id}")
+        self.stats.patient_added(patient)
+        self.refresh_dashboard_stats()
+        messagebox.showinfo("Success", f"Patient '{patient['Name']}' added with ID: {patient['PatientID']}")
         self.refresh_patient_list()
 
     def schedule_appointment(self):
@@ -632,47 +981,194 @@ class DentalPracticeApp:
         time = self.appt_entries["Time (HH:MM):"].get()
         procedure = self.appt_entries["Procedure:"].get()
 
-        patient = self.patients_df[self.patients_df['PatientID'] == patient_id]
-        if patient.empty:
-            messagebox.showerror("Error", f"Patient with ID {patient_id} not found.")
+        appointment = self.perform_booking(self.practice.schedule_appointment, patient_id, date, time, procedure)
+        if appointment is None:
             return
+        self.stats.appointment_saved(appointment)
+        self.refresh_dashboard_stats()
+        messagebox.showinfo("Success", f"Appointment for '{appointment['Name']}' scheduled successfully.")
+        self.refresh_appointment_list()
 
-        patient_name = patient.iloc[0]['Name']
-        new_appointment = pd.DataFrame(
-            {'PatientID': [patient_id], 'Name': [patient_name], 'Date': [date], 'Time': [time],
-             'Procedure': [procedure]})
-        self.appointments_df = pd.concat([self.appointments_df, new_appointment], ignore_index=True)
+    def find_free_slot(self):
+        """Fill the form with the next free slot on or after the chosen date and list the ones after it."""
+        date = self.appt_entries["Date (YYYY-MM-DD):"].get() or datetime.now().strftime("%Y-%m-%d")
+        procedure = self.appt_entries["Procedure:"].get()
+        free_slots = self.perform(self.practice.free_slots, date, procedure, FREE_SLOT_SUGGESTIONS)
+        if free_slots is None:
+            return
+        if not free_slots:
+            messagebox.showinfo("Free Slots", "No free slot found in the coming weeks.")
+            return
+        for field, value in zip(("Date (YYYY-MM-DD):", "Time (HH:MM):"), free_slots[0]):
+            self.appt_entries[field].delete(0, tk.END)
+            self.appt_entries[field].insert(0, value)
+        messagebox.showinfo("Free Slots", "Next free slots:\n" + "\n".join(f"{slot_date} {slot_time}"
+                                                                          for slot_date, slot_time in free_slots))
+
+    def run_reports(self):
+        """Compute (or fetch from the report cache) every report for the chosen month and show the selected one."""
+        month = self.report_month_entry.get().strip()
+        self.status_label.config(text="Running reports...")
+        self.root.update_idletasks()
+        started = time.perf_counter()
+        reports = self.perform(self.practice.monthly_report, month)
+        if reports is None:
+            self.status_label.config(text="")
+            return
+        self.reports = reports
+        self.status_label.config(text=f"Reports for {month} ready in {time.perf_counter() - started:.2f} s")
+        self.show_report()
 
-        self.save_data()
-        messagebox.showinfo("Success", f"Appointment for '{patient_name}' scheduled successfully.")
-        self.refresh_appointment_list()
+    def show_report(self):
+        if self.reports is None:
+            return
+        df = self.reports[self.report_titles[self.report_choice.get()]]
+        columns = [str(column) for column in df.columns]
+        self.report_tree.delete(*self.report_tree.get_children())
+        self.report_tree['columns'] = columns
+        for column in columns:
+            self.report_tree.heading(column, text=column)
+            self.report_tree.column(column, width=150)
+        for values in df.itertuples(index=False, name=None):
+            self.report_tree.insert('', tk.END, values=values)
+
+    def export_report(self):
+        if self.reports is None:
+            messagebox.showwarning("Warning", "Run the report first.")
+            return
+        name = self.report_titles[self.report_choice.get()]
+        path = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV files', '*.csv')],
+                                            initialfile=f"report_{name}_{self.report_month_entry.get().strip()}.csv")
+        if not path:
+            return
+        try:
+            self.reports[name].to_csv(path, index=False)
+        except OSError as error:
+            messagebox.showerror("Save Error", f"The report could not be saved:\n{error}")
+            return
+        messagebox.showinfo("Success", f"Report saved to {path}")
+
+    def run_call_lists(self):
+        """Tomorrow's reminder calls and today's recall calls, saved as one call sheet (see dental_recall)."""
+        self.status_label.config(text="Building call lists...")
+        self.root.update_idletasks()
+        started = time.perf_counter()
+        lists = self.perform(self.practice.call_lists)
+        if lists is None:
+            self.status_label.config(text="")
+            return
+        self.status_label.config(text=f"Call lists ready in {time.perf_counter() - started:.2f} s")
+        summary = (f"{len(lists['reminders'])} reminder call(s) for tomorrow's appointments\n"
+                   f"{len(lists['recall'])} patient(s) due for their recall")
+        if lists['reminders'].empty and lists['recall'].empty:
+            messagebox.showinfo("Call Lists", summary)
+            return
+        if not messagebox.askyesno("Call Lists", f"{summary}\n\nSave the call list?"):
+            return
+        path = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV files', '*.csv')],
+                                            initialfile=f"call_list_{datetime.now().strftime('%Y-%m-%d')}.csv")
+        if not path:
+            return
+        from dental_recall import call_list_frame
+        try:
+            call_list_frame(lists).to_csv(path, index=False)
+        except OSError as error:
+            messagebox.showerror("Save Error", f"The call list could not be saved:\n{error}")
+            return
+        messagebox.showinfo("Success", f"Call list saved to {path}")
 
     def refresh_appointment_list(self):
-        for item in self.appt_tree.get_children(): self.appt_tree.delete(item)
         today_str = datetime.now().strftime("%Y-%m-%d")
-        todays_appts = self.appointments_df[self.appointments_df['Date'] == today_str].sort_values(by='Time')
-        for _, row in todays_appts.iterrows():
-            self.appt_tree.insert('', tk.END, values=(row['PatientID'], row['Name'], row['Time'], row['Procedure']))
-
-    def refresh_patient_list(self, filter_df=None):
-        for item in self.patient_tree.get_children(): self.patient_tree.delete(item)
-        df_to_show = filter_df if filter_df is not None else self.patients_df
-        for _, row in df_to_show.iterrows():
-            self.patient_tree.insert('', tk.END, values=(row['PatientID'], row['Name'], row['Phone']))
-
-    def search_patient(self):
-        search_term = simpledialog.askstring("Search Patient", "Enter Patient Name or ID:")
-        if not search_term: return
-        try:
-            result_df = self.patients_df[self.patients_df['PatientID'] == int(search_term)]
-        except ValueError:
-            result_df = self.patients_df[self.patients_df['Name'].str.contains(search_term, case=False, na=False)]
-        if result_df.empty:
-            messagebox.showinfo("Not Found", "No patient found matching the search term.")
+        todays_appts = self.practice.appointments_on(today_str)
+        self.appt_rows.apply((row.AppointmentID, (row.PatientID, row.Name, row.Time, row.Procedure))
+                             for row in todays_appts.itertuples(index=False))
+        if self.notebook.select() == str(self.calendar_tab):
+            self.calendar.refresh()
+
+    def load_dashboard_stats(self):
+        """The one full read of the dashboard counters, as the last startup stage."""
+        self.stats.load()
+        self.refresh_dashboard_stats()
+
+    def refresh_dashboard_stats(self):
+        """Show the counters from the stats cache; skipped while the dashboard is hidden or not yet loaded."""
+        if self.stats is None or self.stats.today is None or self.notebook.select() != str(self.dashboard_tab):
+            return
+        figures = self.stats.figures()
+        for key, label in self.stats_labels.items():
+            label.config(text=str(figures[key]))
+        procedures = ", ".join(f"{procedure} {count}" for procedure, count in figures['procedures'])
+        self.procedure_stats_label.config(text=f"Procedures this month: {procedures or 'none yet'}")
+
+    def fetch_calendar_range(self, first_date, last_date):
+        """Calendar lines per day; only the days in view are read from the store."""
+        lines_by_day = {}
+        for row in self.practice.appointments_between(first_date, last_date).itertuples(index=False):
+            lines_by_day.setdefault(row.Date, []).append(f"{row.Time}  {row.Name} ({row.Procedure})")
+        return lines_by_day
+
+    def refresh_patient_list(self):
+        """Redraw the patient list after patients changed; a search in the box is run again over the new rows."""
+        self.patient_snapshot = None
+        if self.patient_search_var.get().strip():
+            self.on_patient_search_typed()
+        else:
+            self.patient_list.refresh()
+
+    def count_patient_rows(self):
+        if not self.patients_loaded:
+            return 0
+        return len(self.patient_filter_df) if self.patient_filter_df is not None else self.practice.patient_count()
+
+    def fetch_patient_rows(self, offset, limit, sort_column, descending):
+        """One page of the patient list, as (iid, values) pairs for the virtual Treeview."""
+        if not self.patients_loaded:
+            return []
+        sort_by = PATIENT_SORT_COLUMNS.get(sort_column)
+        if self.patient_filter_df is not None:
+            page = self.patient_filter_df
+            if sort_by:
+                page = page.sort_values(by=sort_by, ascending=not descending, kind='stable')
+            page = page.iloc[offset:offset + limit]
         else:
-            self.refresh_patient_list(filter_df=result_df)
-            self.notebook.select(self.patients_tab)
-            messagebox.showinfo("Search Result", f"Found {len(result_df)} patient(s).")
+            page = self.practice.patients_page(offset, limit, sort_by, descending)
+        return [(str(row.PatientID), (row.PatientID, row.Name, row.Phone)) for row in page.itertuples(index=False)]
+
+    def patient_search_snapshot(self):
+        """What the search worker searches, taken on the Tk thread: a copy of the patient rows (the store edits its
+        frames in place on every commit), or None with the service backend, which searches its own index."""
+        if self.patient_snapshot is None and STORAGE_BACKEND != 'service':
+            self.patient_snapshot = self.practice.all_patients()[['PatientID', 'Name', 'Phone']].copy()
+        return self.patient_snapshot
+
+    def search_patients(self, snapshot, query, cancelled):
+        """Runs on the search worker (see LiveSearch); same matches as find_patients, typos included."""
+        if snapshot is None:
+            # Through the worker's own client, since a client is only safe on one thread
+            return self.search_client.find_patients(query)
+        return self.patient_search_index.search(snapshot, query, cancelled)
+
+    def on_patient_search_typed(self, *args):
+        query = self.patient_search_var.get().strip()
+        if not query:
+            self.patient_search.cancel()
+            self.patient_search_status.config(text="")
+            self.show_patient_search_results(None)
+        elif self.patients_loaded:  # Otherwise the search runs once the patients are in (see staged_startup)
+            self.patient_search_status.config(text="Searching...")
+            self.patient_search.schedule(query)
+
+    def show_patient_search_results(self, result_df):
+        """Show the matches of the latest search (None: all patients), back on the Tk thread."""
+        if result_df is not None:
+            self.patient_search_status.config(text=f"{len(result_df)} patient(s) found" if not result_df.empty
+                                              else "No patient found")
+        self.patient_list.offset = 0  # A new search (or clearing one) starts back at the top
+        self.patient_filter_df = result_df
+        self.patient_list.refresh()
+
+    def show_patient_search_error(self, error):
+        self.patient_search_status.config(text=f"Search failed: {error}")
 
 
 # --- Run the application ---
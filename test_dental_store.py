@@ -0,0 +1,146 @@
+# test_dental_store.py
+
+import os
+
+import pandas as pd
+import pytest
+
+import dental_store
+from dental_store import CsvStore
+
+LEGACY_APPOINTMENTS = """AppointmentID,PatientID,Name,Date,Time,Procedure
+1,1,Ann,2024-03-12,09:00,Checkup
+2,1,Ann,12/03/2024,2:30pm,Cleaning
+3,2,Bob,2024-03-12,after lunch,Filling
+4,2,Bob,,10:00,Checkup
+"""
+
+
+def make_store(folder):
+    names = ['patients.csv', 'appointments.csv', 'clinical.csv', 'changes.journal', 'sequences.json',
+             'practice.lock', 'text_index.json', 'archive.json']
+    return CsvStore(*(os.path.join(folder, name) for name in names))
+
+
+@pytest.fixture(params=[False, True], ids=['csv', 'snapshot'])
+def legacy_folder(tmp_path, monkeypatch, request):
+    """A data folder written before dates and times were validated."""
+    if request.param and not dental_store.USE_BINARY_SNAPSHOTS:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(dental_store, 'USE_BINARY_SNAPSHOTS', request.param)
+    (tmp_path / 'patients.csv').write_text("PatientID,Name,Phone,MedicalNotes\n1,Ann,555-0101,\n2,Bob,555-0102,\n")
+    (tmp_path / 'appointments.csv').write_text(LEGACY_APPOINTMENTS)
+    (tmp_path / 'clinical.csv').write_text("RecordID,PatientID,Date,Problem,TreatmentPlan,Medications\n")
+    return str(tmp_path)
+
+
+def appointment_cells(folder):
+    store = make_store(folder)
+    store.load()
+    cells = {row['AppointmentID']: (row['Date'], row['Time'])
+             for row in (store.get_appointment(appointment_id) for appointment_id in range(1, 5))}
+    store.close()
+    return cells
+
+
+def test_unparsed_dates_and_times_survive_load_edit_and_save(legacy_folder):
+    store = make_store(legacy_folder)
+    store.load()
+    assert store.get_appointment(2)['Date'] == '12/03/2024'
+    assert store.get_appointment(3)['Time'] == 'after lunch'
+    # Only rows whose date and time parse are in the day and slot indexes
+    assert store.appointments_on('2024-03-12')['AppointmentID'].tolist() == [1]
+    assert store.booking_conflicts('2024-03-12', '09:00', 'Checkup') == [1]
+
+    store.commit('update', 'appointments', {'AppointmentID': 2}, {'Procedure': 'Filling'}, expected_version=1)
+    store.save()
+    store.close()
+
+    cells = appointment_cells(legacy_folder)
+    assert cells[2] == ('12/03/2024', '2:30pm')
+    assert cells[3] == ('2024-03-12', 'after lunch')
+    assert make_store(legacy_folder).get_appointment(2)['Procedure'] == 'Filling'
+
+
+def test_fixing_a_legacy_date_indexes_the_row(legacy_folder):
+    store = make_store(legacy_folder)
+    store.load()
+    store.commit('update', 'appointments', {'AppointmentID': 2}, {'Date': '2024-03-13', 'Time': '10:00'})
+    assert store.appointments_on('2024-03-13')['AppointmentID'].tolist() == [2]
+    store.save()
+    store.close()
+
+    assert appointment_cells(legacy_folder)[2] == ('2024-03-13', '10:00')
+
+
+def test_legacy_text_in_the_journal_is_replayed(legacy_folder):
+    store = make_store(legacy_folder)
+    store.load()
+    store.commit('insert', 'appointments', {'AppointmentID': 5},
+                 {'AppointmentID': 5, 'PatientID': 1, 'Date': 'next Tuesday', 'Time': '9am', 'Procedure': 'Checkup'})
+    # Not compacted: a second workstation reads the change from the journal
+    replayed = make_store(legacy_folder)
+    replayed.load()
+    assert (replayed.get_appointment(5)['Date'], replayed.get_appointment(5)['Time']) == ('next Tuesday', '9am')
+    store.close()
+
+
+@pytest.fixture
+def practice_folder(tmp_path, monkeypatch):
+    """Two patients, each with an old and a recent appointment and record."""
+    monkeypatch.setattr(dental_store, 'USE_BINARY_SNAPSHOTS', False)
+    (tmp_path / 'patients.csv').write_text("PatientID,Name,Phone,MedicalNotes\n1,Ann,555-0101,\n2,Bob,555-0102,\n")
+    (tmp_path / 'appointments.csv').write_text("AppointmentID,PatientID,Date,Time,Procedure\n"
+                                               "1,1,2019-05-02,09:00,Checkup\n2,1,2024-03-12,09:00,Checkup\n"
+                                               "3,2,2019-05-02,10:00,Checkup\n4,2,2024-03-12,10:00,Checkup\n")
+    (tmp_path / 'clinical.csv').write_text("RecordID,PatientID,Date,Problem,TreatmentPlan,Medications\n"
+                                           "1,1,2019-05-02,Toothache,Filling,\n2,1,2024-03-12,Sensitivity,Fluoride,\n"
+                                           "3,2,2019-05-02,Toothache,Crown,\n4,2,2024-03-12,Sensitivity,Fluoride,\n")
+    return str(tmp_path)
+
+
+def test_a_patient_delete_is_one_journal_entry_and_replays_with_its_cascade(practice_folder):
+    store = make_store(practice_folder)
+    store.load()
+    store.commit('delete', 'patients', {'PatientID': 1}, {'Deleted': '2024-03-13 09:00:00.000000'})
+    assert store.journal.entry_count == 1
+    assert store.get_appointment(2) is None and store.get_record(2) is None
+    assert store.get_appointment(4) is not None
+
+    # A second workstation expands the same entry, and loads appointments only after it has read the journal
+    replayed = make_store(practice_folder)
+    replayed.load(tables=('patients', ))
+    assert replayed.get_patient(1) is None
+    assert replayed.get_appointment(2) is None and replayed.get_record(2) is None
+    assert sorted(replayed.deleted_rows('appointments')['AppointmentID'].tolist()) == [1, 2]
+
+    store.commit('restore', 'patients', {'PatientID': 1}, {'Deleted': '2024-03-13 09:00:00.000000'})
+    assert store.get_appointment(2) is not None and store.get_record(2) is not None
+    assert replayed.poll_changes() >= {'patients', 'appointments', 'clinical'}
+    assert replayed.get_appointment(2) is not None
+    store.close()
+    replayed.close()
+
+
+def test_archived_rows_of_a_deleted_patient_are_hidden_then_purged(practice_folder):
+    store = make_store(practice_folder)
+    store.load()
+    assert store.archive_old_rows('2020-01-01') == 4
+    store.commit('delete', 'patients', {'PatientID': 1}, {'Deleted': '2024-03-13 09:00:00.000000'})
+    assert store.patient_records(1, include_archive=True).empty
+    assert store.appointments_between('2019-01-01', '2019-12-31')['AppointmentID'].tolist() == [3]
+    streamed = pd.concat(store.iter_chunks('appointments', ['AppointmentID'], ('2019-01-01', '2019-12-31')))
+    assert streamed['AppointmentID'].tolist() == [3]
+
+    # Restoring needs nothing from the archive, since the rows never left it
+    store.commit('restore', 'patients', {'PatientID': 1}, {'Deleted': '2024-03-13 09:00:00.000000'})
+    assert store.patient_records(1, include_archive=True)['RecordID'].tolist() == [2, 1]
+
+    store.commit('delete', 'patients', {'PatientID': 1}, {'Deleted': '2024-03-13 10:00:00.000000'})
+    # The patient, their recent appointment and record, and the two archived rows
+    assert store.purge_deleted('2024-03-14') == 5
+    assert store.deleted_rows('patients').empty
+    restored = make_store(practice_folder)
+    assert restored.appointments_between('2019-01-01', '2019-12-31')['AppointmentID'].tolist() == [3]
+    store.close()
+    restored.close()